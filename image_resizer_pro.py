@@ -1,13 +1,16 @@
+import time
+STARTUP_MARKS = [("start", time.perf_counter())]
 import sys
 import os
+import importlib.util
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QPushButton, QFileDialog, QComboBox, QSpinBox, QCheckBox, QGroupBox,
-    QRadioButton, QButtonGroup, QProgressBar, QTextEdit, QFrame, QGridLayout,
+    QRadioButton, QButtonGroup, QProgressBar, QTextEdit, QPlainTextEdit, QFrame, QGridLayout,
     QTabWidget, QScrollArea, QFormLayout, QSplitter, QSpacerItem, QSizePolicy,
-    QMessageBox, QInputDialog, QLineEdit, QMenuBar, QStatusBar, QListWidget,
+    QMessageBox, QInputDialog, QLineEdit, QMenuBar, QMenu, QStatusBar, QListWidget,
     QListWidgetItem, QAbstractItemView, QToolTip, QDialog, QDialogButtonBox,
-    QSlider, QGraphicsDropShadowEffect
+    QSlider, QGraphicsDropShadowEffect, QColorDialog
 )
 from PyQt6.QtCore import (
     Qt, QTranslator, QLocale, pyqtSignal, QThread, QSettings, QSize,
@@ -18,13 +21,1812 @@ from PyQt6.QtGui import (
     QIcon, QPixmap, QPalette, QColor, QFont, QPainter, QLinearGradient,
     QDesktopServices, QKeySequence, QShortcut, QBrush, QMovie,
     QValidator, QIntValidator, QClipboard, QCursor, QEnterEvent,
-    QAction
+    QAction, QImage
 )
-from PIL import Image, ExifTags
-import qdarkstyle
-import qtawesome as qta
+STARTUP_MARKS.append(("import PyQt6", time.perf_counter()))
+from PIL import Image, ExifTags, ImageColor, ImageDraw, ImageFont, features
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow built without LittleCMS
+    ImageCms = None
+STARTUP_MARKS.append(("import Pillow", time.perf_counter()))
 import datetime
 import math
+import io
+import tempfile
+import threading
+import collections
+import contextlib
+import bisect
+import functools
+import heapq
+import itertools
+import logging
+import logging.handlers
+import queue
+import multiprocessing
+import json
+import argparse
+import hashlib
+import hmac
+import cProfile
+import pstats
+import tracemalloc
+import struct
+import zlib
+import socket
+import socketserver
+import ipaddress
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import dataclasses
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+
+# numpy is optional (smart crop falls back to a centred crop). The GUI imports it just after first
+# paint, everything else up front. np stays None until load_numpy() has run; the import is explicit
+# and locked because LazyLoader breaks when several threads touch the module first.
+HAVE_NUMPY = importlib.util.find_spec("numpy") is not None
+np = None
+_numpy_lock = threading.Lock()
+
+
+def load_numpy():
+    # numpy, or None if it isn't installed
+    global np
+    with _numpy_lock:
+        if np is None and HAVE_NUMPY:
+            import numpy
+            np = numpy
+    return np
+
+
+if __name__ != "__main__":
+    # Imported as a module or started as a pool worker: no first paint to protect
+    load_numpy()
+STARTUP_MARKS.append(("import stdlib", time.perf_counter()))
+
+
+def qta_icon(*args, **kwargs):
+    # qtawesome loads its icon fonts on first use, so it's imported only when an icon is needed
+    import qtawesome as qta
+    return qta.icon(*args, **kwargs)
+
+
+OUTPUT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'TIFF': 'tif'}
+# AUTO encodes every candidate and keeps the smallest; its extension is only known after encoding
+AUTO_FORMAT = 'AUTO'
+OUTPUT_FORMATS = ['JPEG', 'PNG', 'WEBP', AUTO_FORMAT, 'TIFF']
+# Formats that can hold 16 bits per sample
+HIGH_BIT_FORMATS = ('PNG', 'TIFF')
+MAX_DIMENSION = 20000
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.tiff', '.tif', '.gif')
+# With keep_aspect: contain fits inside the box, pad fits then fills the box,
+# cover fills the box with a centred crop, smart picks the crop by edge energy
+FIT_MODES = ['contain', 'cover', 'pad', 'smart']
+# Embedded ICC profiles: dropped (as before), converted to sRGB, or copied to the output
+COLOR_MODES = ['none', 'srgb', 'embed']
+
+
+def output_extension(format_type):
+    if format_type.upper() == AUTO_FORMAT:
+        return 'auto'  # placeholder while the path is reserved; see auto_output_path
+    return OUTPUT_EXTENSIONS.get(format_type.upper(), 'jpg')
+
+
+def encode_image(img, rule, exif_data=None, icc_profile=None):
+    format_type = rule.format_type
+    # Always passed, even as None: PNG and TIFF otherwise fall back to the profile in img.info,
+    # which resize copies from the source, and a dropped profile would come back
+    save_kwargs = {'icc_profile': icc_profile}
+    if format_type == 'JPEG':
+        save_kwargs['quality'] = rule.quality
+        save_kwargs['optimize'] = True
+        if exif_data:
+            save_kwargs['exif'] = exif_data
+    elif format_type == 'WEBP':
+        save_kwargs['quality'] = rule.quality
+        save_kwargs['method'] = 6
+    elif format_type == 'PNG':
+        # optimize retries zlib until the output stops shrinking: cheap on a palette image,
+        # slow on full-colour RGB(A), which gets the default compression level instead
+        if img.mode == 'P':
+            save_kwargs['optimize'] = True
+        else:
+            save_kwargs['compress_level'] = 6
+    elif format_type == 'TIFF':
+        # Deflate needs Pillow's libtiff; without it TIFFs are written uncompressed
+        save_kwargs['compression'] = 'tiff_adobe_deflate' if features.check_codec('libtiff') else 'raw'
+        if exif_data:
+            save_kwargs['exif'] = exif_data
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=format_type, **save_kwargs)
+    return buffer.getvalue()
+
+
+def fsync_directory(folder):
+    # Make a rename durable; directories can't be opened for fsync on Windows
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def umask_file_mode():
+    # Reading the umask means briefly setting it process-wide, so this only runs once, at import
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp creates 0600 files; outputs get the usual umask-derived mode
+OUTPUT_FILE_MODE = umask_file_mode()
+
+
+# Atomic output writer: temp file in the target folder, then rename over the final path
+class OutputWriter:
+    FSYNC_MODES = ['none', 'each', 'batch']
+
+    def __init__(self, max_workers=4, fsync='none', fsync_batch=32):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="output-writer")
+        self.fsync = fsync if fsync in self.FSYNC_MODES else 'none'
+        self.fsync_batch = max(1, fsync_batch)
+        self.lock = threading.Lock()
+        self.reserved = set()
+        self.pending = []
+        self.file_mode = OUTPUT_FILE_MODE
+
+    def reserve_path(self, folder, base_name, ext, suffix='_resized'):
+        # Same-named inputs from different folders must not overwrite each other's output
+        with self.lock:
+            candidate = os.path.join(folder, f"{base_name}{suffix}.{ext}")
+            n = 2
+            while os.path.normcase(os.path.abspath(candidate)) in self.reserved:
+                candidate = os.path.join(folder, f"{base_name}{suffix}_{n}.{ext}")
+                n += 1
+            self.reserved.add(os.path.normcase(os.path.abspath(candidate)))
+            return candidate
+
+    def submit(self, data, path):
+        future = Future()
+        self.executor.submit(self._write, data, path, future)
+        return future
+
+    def write(self, data, path):
+        # Synchronous variant for single files
+        future = Future()
+        self._write(data, path, future)
+        if self.fsync == 'batch':
+            self.flush()
+        return future.result()
+
+    def _write(self, data, path, future):
+        folder = os.path.dirname(os.path.abspath(path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if self.fsync == 'each':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.chmod(tmp_path, self.file_mode)
+
+            if self.fsync == 'batch':
+                with self.lock:
+                    self.pending.append((tmp_path, path, future))
+                    batch = None
+                    if len(self.pending) >= self.fsync_batch:
+                        batch, self.pending = self.pending, []
+                if batch:
+                    self._commit(batch)
+                return
+
+            os.replace(tmp_path, path)
+            if self.fsync == 'each':
+                fsync_directory(folder)
+            future.set_result(path)
+        except BaseException as e:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            future.set_exception(e)
+
+    def _commit(self, batch):
+        # fsync the whole batch, then publish it with renames and one fsync per folder
+        folders = set()
+        for tmp_path, path, future in batch:
+            try:
+                with open(tmp_path, 'rb') as f:
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                folders.add(os.path.dirname(os.path.abspath(path)))
+                future.set_result(path)
+            except Exception as e:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                future.set_exception(e)
+        for folder in folders:
+            fsync_directory(folder)
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self._commit(batch)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.flush()
+
+
+# Job specs: immutable snapshots of batch settings, saved and loaded as recipes
+@dataclass(frozen=True)
+class OutputRule:
+    width: int
+    height: int
+    keep_aspect: bool = True
+    quality: int = 95
+    format_type: str = 'JPEG'
+    suffix: str = '_resized'
+    fit: str = 'contain'
+    pad_color: str = '#FFFFFF'
+    background: str = '#FFFFFF'
+    png_palette: bool = False
+    no_upscale: bool = False
+    target_ssim: float = 0.0
+    bit_depth: int = 8
+
+    def __post_init__(self):
+        if not (1 <= self.width <= MAX_DIMENSION and 1 <= self.height <= MAX_DIMENSION):
+            raise ValueError(f"Output size must be 1-{MAX_DIMENSION} px, got {self.width}x{self.height}")
+        if not 1 <= self.quality <= 100:
+            raise ValueError(f"Quality must be between 1 and 100, got {self.quality}")
+        if self.format_type not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported format: {self.format_type}")
+        if self.fit not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode: {self.fit}")
+        ImageColor.getrgb(self.pad_color)
+        ImageColor.getrgb(self.background)
+        if self.target_ssim and not 0.5 <= self.target_ssim < 1:
+            raise ValueError(f"Target SSIM must be between 0.5 and 1, got {self.target_ssim}")
+        if self.bit_depth not in (8, 16):
+            raise ValueError(f"Bit depth must be 8 or 16, got {self.bit_depth}")
+        if self.bit_depth == 16 and (self.format_type not in HIGH_BIT_FORMATS or self.png_palette):
+            raise ValueError("16-bit output needs PNG or TIFF without a palette")
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    rules: tuple
+    preserve_meta: bool = True
+    output_folder: str = ''
+    fsync: str = 'none'
+    workers: int = 0
+    color: str = 'none'
+    watermark: str = ''
+    watermark_text: str = ''
+    watermark_position: str = 'bottom-right'
+    watermark_opacity: float = 0.5
+    watermark_scale: float = 0.2
+
+    def __post_init__(self):
+        if not self.rules:
+            raise ValueError("A job needs at least one output rule")
+        if self.watermark and self.watermark_text:
+            raise ValueError("Use either a watermark image or watermark text, not both")
+        if self.watermark_position not in WATERMARK_POSITIONS:
+            raise ValueError(f"Unknown watermark position: {self.watermark_position}")
+        if not 0 < self.watermark_opacity <= 1:
+            raise ValueError(f"Watermark opacity must be between 0 and 1, got {self.watermark_opacity}")
+        if not 0 < self.watermark_scale <= 1:
+            raise ValueError(f"Watermark scale must be between 0 and 1, got {self.watermark_scale}")
+        if self.color not in COLOR_MODES:
+            raise ValueError(f"Unknown color mode: {self.color}")
+        if self.color == 'srgb' and ImageCms is None:
+            raise ValueError("Converting to sRGB needs Pillow with ImageCms (LittleCMS)")
+        if self.fsync not in OutputWriter.FSYNC_MODES:
+            raise ValueError(f"Unknown fsync mode: {self.fsync}")
+        if self.color == 'srgb' and any(rule.bit_depth == 16 for rule in self.rules):
+            raise ValueError("16-bit outputs can't be converted to sRGB; embed the source profile instead")
+        suffixes = [(rule.suffix, rule.format_type) for rule in self.rules]
+        if len(set(suffixes)) != len(suffixes):
+            raise ValueError("Output rules with the same format need distinct suffixes")
+        auto_suffixes = {rule.suffix for rule in self.rules if rule.format_type == AUTO_FORMAT}
+        if any(rule.suffix in auto_suffixes for rule in self.rules if rule.format_type != AUTO_FORMAT):
+            raise ValueError("An Auto format rule needs a suffix no other rule uses")
+
+    def to_dict(self):
+        data = dataclasses.asdict(self)
+        data['rules'] = [dataclasses.asdict(rule) for rule in self.rules]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        rules = data.pop('rules', None)
+        if not rules:
+            raise ValueError("Recipe has no rules")
+        try:
+            return cls(rules=tuple(OutputRule(**rule) for rule in rules), **data)
+        except TypeError as e:
+            raise ValueError(f"Invalid recipe: {e}")
+
+    def save(self, path):
+        data = self.to_dict()
+        if path.lower().endswith('.toml'):
+            text = dump_recipe_toml(data)
+        else:
+            text = json.dumps(data, indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    @classmethod
+    def load(cls, path):
+        if path.lower().endswith('.toml'):
+            if tomllib is None:
+                raise ValueError("TOML recipes need Python 3.11 or newer")
+            with open(path, 'rb') as f:
+                return cls.from_dict(tomllib.load(f))
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def output_paths(self, input_path, writer):
+        output_folder = self.output_folder or os.path.dirname(input_path)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        return [
+            writer.reserve_path(output_folder, base_name, output_extension(rule.format_type), rule.suffix)
+            for rule in self.rules
+        ]
+
+
+def dump_recipe_toml(data):
+    # tomllib only reads; recipes are flat keys plus an array of rule tables
+    def value(v):
+        if isinstance(v, bool):
+            return 'true' if v else 'false'
+        if isinstance(v, (int, float)):
+            return str(v)
+        # JSON string escapes are valid TOML, except surrogate pairs (so no ensure_ascii) and a raw DEL
+        return json.dumps(str(v), ensure_ascii=False).replace('\x7f', '\\u007f')
+
+    lines = [f"{key} = {value(v)}" for key, v in data.items() if key != 'rules']
+    for rule in data['rules']:
+        lines.append("")
+        lines.append("[[rules]]")
+        lines.extend(f"{key} = {value(v)}" for key, v in rule.items())
+    return "\n".join(lines) + "\n"
+
+
+def app_data_dir():
+    # Same folder for the GUI and for worker processes, which have no QApplication
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share'))
+    return os.path.join(base, "ImageResizerPro")
+
+
+# Resampling backends. Pillow is always available and is the fallback for everything else.
+class PillowBackend:
+    name = 'pillow'
+    modes = None  # any mode
+
+    def available(self):
+        return True
+
+    def supports(self, mode):
+        return self.modes is None or mode in self.modes
+
+    def resize(self, img, size, box=None):
+        return img.resize(size, Image.Resampling.LANCZOS, box=box)
+
+
+class PillowReduceBackend(PillowBackend):
+    name = 'pillow-reduce'
+
+    def resize(self, img, size, box=None):
+        # Integer box reduction first, Lanczos only for the remaining factor (< 2x)
+        return img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=2.0)
+
+
+class OpenCVBackend(PillowBackend):
+    name = 'opencv'
+    modes = ('L', 'RGB', 'RGBA')
+
+    def available(self):
+        return load_numpy() is not None and importlib.util.find_spec('cv2') is not None
+
+    def resize(self, img, size, box=None):
+        import cv2
+        pixels = np.asarray(img)
+        if box is not None:
+            left, top, right, bottom = (int(round(v)) for v in box)
+            pixels = pixels[top:bottom, left:right]
+        # INTER_AREA is OpenCV's antialiased downscale; Lanczos only when enlarging
+        shrinking = size[0] < pixels.shape[1] or size[1] < pixels.shape[0]
+        out = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4)
+        return Image.fromarray(out, img.mode)
+
+
+class VipsBackend(PillowBackend):
+    name = 'pyvips'
+    modes = ('L', 'RGB', 'RGBA')
+
+    def available(self):
+        if load_numpy() is None or importlib.util.find_spec('pyvips') is None:
+            return False
+        try:
+            import pyvips  # needs the libvips shared library too
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def resize(self, img, size, box=None):
+        import pyvips
+        if box is not None:
+            img = img.crop(tuple(int(round(v)) for v in box))
+        bands = len(img.getbands())
+        source = pyvips.Image.new_from_memory(img.tobytes(), img.width, img.height, bands, 'uchar')
+        out = source.resize(size[0] / img.width, vscale=size[1] / img.height, kernel='lanczos3')
+        if (out.width, out.height) != size:
+            raise ValueError(f"pyvips produced {out.width}x{out.height}, wanted {size[0]}x{size[1]}")
+        pixels = np.frombuffer(out.write_to_memory(), dtype=np.uint8).reshape(out.height, out.width, bands)
+        return Image.fromarray(pixels if bands > 1 else pixels[..., 0], img.mode)
+
+
+RESAMPLE_BACKENDS = {}
+
+
+def register_backend(backend):
+    RESAMPLE_BACKENDS[backend.name] = backend
+
+
+for _backend in (PillowBackend(), PillowReduceBackend(), OpenCVBackend(), VipsBackend()):
+    register_backend(_backend)
+
+# Calibration buckets by scale factor (output / input width)
+SCALE_BUCKETS = [(0.0, 0.25, '<0.25'), (0.25, 0.5, '0.25-0.5'), (0.5, 1.0, '0.5-1'), (1.0, float('inf'), '>=1')]
+CALIBRATION_MODES = ['RGB', 'RGBA', 'L']
+_calibration = None
+
+
+def calibration_path():
+    return os.path.join(app_data_dir(), "resample_calibration.json")
+
+
+def scale_bucket(scale):
+    for low, high, name in SCALE_BUCKETS:
+        if low <= scale < high:
+            return name
+    return SCALE_BUCKETS[-1][2]
+
+
+def choose_backend(mode, scale):
+    # Fastest calibrated backend for (mode, scale range); loaded once per process
+    global _calibration
+    if _calibration is None:
+        try:
+            with open(calibration_path(), encoding='utf-8') as f:
+                _calibration = json.load(f).get('choices', {})
+        except (OSError, ValueError):
+            _calibration = {}
+    backend = RESAMPLE_BACKENDS.get(_calibration.get(f"{mode}|{scale_bucket(scale)}"))
+    if backend is None or not backend.supports(mode) or not backend.available():
+        return RESAMPLE_BACKENDS['pillow']
+    return backend
+
+
+def resample(img, size, box=None, backend=None):
+    if backend is None:
+        source_width = box[2] - box[0] if box is not None else img.width
+        backend = choose_backend(img.mode, size[0] / source_width)
+    if backend.name != 'pillow':
+        try:
+            out = backend.resize(img, size, box)
+            if out.size == size and out.mode == img.mode:
+                return out
+        except Exception:
+            pass  # anything unexpected: Pillow below is the guaranteed path
+    return RESAMPLE_BACKENDS['pillow'].resize(img, size, box)
+
+
+def edge_energy(img, proxy_size=256):
+    # Saliency on a small proxy: cost depends on proxy_size, not on the source resolution
+    proxy = img if img.mode in ('L', 'RGB', 'RGBA') else img.convert('RGBA')
+    factor = max(1, max(img.size) // proxy_size)
+    if factor > 1:
+        proxy = proxy.reduce(factor)
+    gray = np.asarray(proxy.convert('L'), dtype=np.float32)
+    energy = np.zeros_like(gray)
+    energy[:, 1:] += np.abs(np.diff(gray, axis=1))
+    energy[1:, :] += np.abs(np.diff(gray, axis=0))
+    return energy
+
+
+def best_window(profile, window):
+    # Start of the window with the most energy, via prefix sums; ties break towards the centre
+    sums = np.concatenate(([0.0], np.cumsum(profile, dtype=np.float64)))
+    scores = sums[window:] - sums[:-window]
+    centre = (len(scores) - 1) / 2
+    scores -= np.abs(np.arange(len(scores)) - centre) * (scores.max() * 1e-6)
+    return int(np.argmax(scores))
+
+
+def crop_box(src_size, dst_size, energy=None):
+    # Source-space box with the target aspect ratio, centred unless an energy map says otherwise
+    src_w, src_h = src_size
+    dst_w, dst_h = dst_size
+    scale = max(dst_w / src_w, dst_h / src_h)
+    box_w, box_h = min(src_w, dst_w / scale), min(src_h, dst_h / scale)
+    left, top = (src_w - box_w) / 2, (src_h - box_h) / 2
+
+    if energy is not None:
+        energy_h, energy_w = energy.shape
+        if box_w < src_w:
+            window = max(1, min(energy_w, round(box_w * energy_w / src_w)))
+            start = best_window(energy.sum(axis=0), window)
+            left = min(src_w - box_w, start * src_w / energy_w)
+        elif box_h < src_h:
+            window = max(1, min(energy_h, round(box_h * energy_h / src_h)))
+            start = best_window(energy.sum(axis=1), window)
+            top = min(src_h - box_h, start * src_h / energy_h)
+
+    return (left, top, left + box_w, top + box_h)
+
+
+def pad_image(img, size, color):
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+    canvas = Image.new(img.mode, size, ImageColor.getcolor(color, img.mode))
+    canvas.paste(img, ((size[0] - img.width) // 2, (size[1] - img.height) // 2))
+    return canvas
+
+
+def target_size(src_size, rule):
+    # Resampled size; cover, smart and stretch produce the exact box unless upscaling is disallowed
+    original_width, original_height = src_size
+    if not rule.keep_aspect:
+        if rule.no_upscale:
+            return min(rule.width, original_width), min(rule.height, original_height)
+        return rule.width, rule.height
+    if rule.fit in ('cover', 'smart'):
+        scale = max(rule.width / original_width, rule.height / original_height)
+        if rule.no_upscale and scale > 1:
+            # Same crop aspect, at the source's own resolution
+            return max(1, round(rule.width / scale)), max(1, round(rule.height / scale))
+        return rule.width, rule.height
+    if rule.no_upscale and original_width <= rule.width and original_height <= rule.height:
+        return src_size
+    # The limiting side gets the requested size exactly; rounding the other side
+    # (instead of truncating) keeps 1366x768 -> 1280x720 from coming out 1280x719
+    if rule.width / original_width <= rule.height / original_height:
+        return rule.width, max(1, min(rule.height, round(original_height * rule.width / original_width)))
+    return max(1, min(rule.width, round(original_width * rule.height / original_height))), rule.height
+
+
+def normalize_mode(img):
+    # Pillow resamples P and 1 with NEAREST, so these get a real colour mode before resizing
+    if img.mode in ('P', 'PA'):
+        return img.convert('RGBA' if img.mode == 'PA' or 'transparency' in img.info else 'RGB')
+    if img.mode == '1':
+        return img.convert('L')
+    return img
+
+
+def has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'RGBa', 'La', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def flatten_alpha(img, color):
+    # A single alpha_composite over the resized raster; grayscale stays grayscale
+    grayscale = img.mode in ('LA', 'La')
+    background = Image.new('RGBA', img.size, ImageColor.getcolor(color, 'RGBA'))
+    flat = Image.alpha_composite(background, img.convert('RGBA')).convert('RGB')
+    return flat.convert('L') if grayscale else flat
+
+
+def prepare_for_format(img, rule):
+    # Output-mode stage, run after downscaling so it only touches output pixels
+    if rule.format_type == 'JPEG':
+        if has_alpha(img):
+            return flatten_alpha(img, rule.background)
+        if img.mode not in ('L', 'RGB', 'CMYK'):
+            return img.convert('RGB')
+        return img
+
+    if img.mode == 'CMYK':
+        img = img.convert('RGB')
+    elif img.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    if rule.format_type == 'PNG' and rule.png_palette and img.mode in ('RGB', 'RGBA'):
+        # Fast octree quantization keeps alpha and is much cheaper than libimagequant
+        return img.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.FLOYDSTEINBERG)
+    return img
+
+
+def resize_image(img, rule, analysis=None, backend=None):
+    # analysis: per-image cache shared by all rules, so the energy map is built once;
+    # backend pins a resampler (calibration, verification), otherwise the calibrated choice is used
+    size = target_size(img.size, rule)
+    if not rule.keep_aspect:
+        return img if size == img.size else resample(img, size, backend=backend)
+
+    if rule.fit in ('cover', 'smart'):
+        energy = None
+        if rule.fit == 'smart' and load_numpy() is not None:
+            if analysis is None:
+                analysis = {}
+            if 'energy' not in analysis:
+                analysis['energy'] = edge_energy(img)
+            energy = analysis['energy']
+        box = crop_box(img.size, size, energy)
+        if size == img.size and box == (0, 0, img.width, img.height):
+            return img
+        # box= resamples just the crop window instead of scaling the whole frame first
+        return resample(img, size, box, backend)
+
+    resized = img if size == img.size else resample(img, size, backend=backend)
+
+    if rule.fit == 'pad':
+        return pad_image(resized, (rule.width, rule.height), rule.pad_color)
+    return resized
+
+
+# ICC transforms are cached per process, so a batch of same-camera images builds one transform
+_srgb_profile = None
+_transform_cache = {}
+_transform_lock = threading.Lock()
+
+
+def srgb_transform(icc_profile, mode):
+    global _srgb_profile
+    key = (hashlib.sha1(icc_profile).digest(), 'sRGB', mode)
+    with _transform_lock:
+        if key in _transform_cache:
+            return _transform_cache[key]
+        if _srgb_profile is None:
+            _srgb_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB'))
+
+    try:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        if 'srgb' in ImageCms.getProfileDescription(source).lower():
+            transform = None  # already sRGB: nothing to convert
+        else:
+            transform = ImageCms.buildTransform(source, _srgb_profile, mode, 'RGBA' if mode == 'RGBA' else 'RGB')
+    except (ImageCms.PyCMSError, OSError):
+        transform = None  # unreadable profile: leave pixels as they are
+
+    with _transform_lock:
+        _transform_cache[key] = transform
+    return transform
+
+
+def convert_to_srgb(img, icc_profile):
+    # Called on the resized raster, so the conversion touches output pixels only
+    if img.mode not in ('RGB', 'RGBA', 'CMYK'):
+        return img
+    transform = srgb_transform(icc_profile, img.mode)
+    if transform is None:
+        return img
+    converted = ImageCms.applyTransform(img, transform)
+    # resize() copies info, and PNG would otherwise re-embed the source profile
+    converted.info.pop('icc_profile', None)
+    return converted
+
+
+# Pass-through: outputs that would only re-encode the source at its own size reuse the file bytes
+STD_LUMINANCE_QT = [
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+]
+JPEG_QUALITY_SLACK = 2
+
+
+class PassThrough(bytes):
+    # Output that skipped decode and encode; how is 'copy' or 'lossless' (header segments stripped)
+    how = 'copy'
+
+
+def jpeg_quality(img):
+    # libjpeg quality setting estimated from the luminance quantization table
+    tables = getattr(img, 'quantization', None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / sum(STD_LUMINANCE_QT)
+    return max(1, min(100, round((200 - scale) / 2 if scale <= 100 else 5000 / scale)))
+
+
+def strip_jpeg_segments(data, drop):
+    # Lossless rewrite: header segments before the scan are filtered, the entropy-coded data is untouched
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("Not a JPEG file")
+    out = bytearray(data[:2])
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG header")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0xDA:
+            out += data[pos:]
+            return bytes(out)
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if not drop(marker, data[pos + 4:end]):
+            out += data[pos:end]
+        pos = end
+    raise ValueError("JPEG has no scan data")
+
+
+def passthrough_drop(img, rule, spec):
+    # None when the rule needs a real render. Otherwise the source bytes can be reused as they are,
+    # and the result says which JPEG header segments to drop on the way (nothing for a plain copy).
+    if spec.watermark or spec.watermark_text:
+        return None
+    if img.format != rule.format_type or target_size(img.size, rule) != img.size or rule.bit_depth != 8:
+        return None
+    if rule.fit == 'pad' and rule.keep_aspect and img.size != (rule.width, rule.height):
+        return None
+    # The copy must be what a render would write: the same mode, at 8 bits per sample
+    if rule.format_type == 'PNG' and rule.png_palette:
+        modes = ('P',)
+    else:
+        modes = ('L', 'RGB', 'CMYK') if rule.format_type == 'JPEG' else ('L', 'LA', 'RGB', 'RGBA')
+    if img.mode not in modes or tile_rawmode(img) in HIGH_BIT_RAWMODES:
+        return None
+    if rule.format_type == 'JPEG':
+        quality = jpeg_quality(img)
+        if quality is None or quality > rule.quality + JPEG_QUALITY_SLACK:
+            return None  # a lower quality was asked for: re-encoding actually saves bytes
+
+    icc_profile = img.info.get('icc_profile')
+    if icc_profile and spec.color == 'srgb' and (ImageCms is None or srgb_transform(icc_profile, img.mode)):
+        return None
+    strip_meta = not spec.preserve_meta
+    strip_icc = bool(icc_profile) and spec.color == 'none'
+    if rule.format_type != 'JPEG':
+        # No lossless rewrite for these: copy only when there is nothing to remove
+        if strip_icc or (strip_meta and any(key in img.info for key in ('exif', 'xmp', 'XML:com.adobe.xmp'))):
+            return None
+
+    def drop(marker, payload):
+        if strip_meta and marker in (0xE1, 0xED, 0xFE):  # EXIF/XMP, IPTC, comments
+            return True
+        return strip_icc and marker == 0xE2 and payload.startswith(b'ICC_PROFILE\0')
+    return drop
+
+
+def read_source(input_path):
+    if hasattr(input_path, 'read'):
+        input_path.seek(0)
+        return input_path.read()
+    with open(input_path, 'rb') as f:
+        return f.read()
+
+
+# Uncompressed BMP/PPM/TIFF: pixels are read through a numpy memmap, so worker processes share the
+# source through the page cache instead of each decoding a private full-size copy
+RAW_LAYOUTS = {
+    # rawmode: (bytes per pixel, channel order into the Pillow mode, Pillow mode)
+    'L': (1, [0], 'L'),
+    'RGB': (3, [0, 1, 2], 'RGB'),
+    'BGR': (3, [2, 1, 0], 'RGB'),
+    'RGBX': (4, [0, 1, 2], 'RGB'),
+    'BGRX': (4, [2, 1, 0], 'RGB'),
+    'RGBA': (4, [0, 1, 2, 3], 'RGBA'),
+    'BGRA': (4, [2, 1, 0, 3], 'RGBA'),
+}
+MMAP_BAND_BYTES = 32 * 1024 * 1024
+
+
+def tile_rawmode(img):
+    # How the decoder unpacks the file's samples, e.g. 'RGB;16B' for a 16-bit PNG opened as 8-bit RGB
+    if not img.tile:
+        return None
+    args = img.tile[0][3]
+    rawmode = args if isinstance(args, str) else args[0] if args else None
+    # GIF and some other decoders pass a bit depth here rather than a rawmode
+    return rawmode if isinstance(rawmode, str) else None
+
+
+def raw_rows(path, img, bpp):
+    # (height, stride) byte memmap of an uncompressed raster stored as one block, or None. A
+    # prefetched file is viewed in place instead, so the result is the same either way.
+    if load_numpy() is None or not isinstance(path, (str, os.PathLike, io.BytesIO)) or not img.tile:
+        return None
+    tiles = sorted(img.tile, key=lambda tile: tile[1][1])
+    args = tiles[0][3]
+    rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+    width, height = img.size
+    stride = stride or width * bpp
+    # TIFF strips are separate tiles; they only form one block if they sit back to back
+    offset = tiles[0][2]
+    for tile in tiles:
+        codec, (left, top, right, bottom), tile_offset, tile_args = tile[:4]
+        if codec != 'raw' or tile_args != args or (left, right) != (0, width):
+            return None
+        if tile_offset != offset + top * stride:
+            return None
+    if tiles[-1][1][3] != height or len(tiles) > 1 and ystep != 1:
+        return None
+
+    if isinstance(path, io.BytesIO):
+        rows = np.frombuffer(path.getbuffer(), np.uint8, height * stride, offset).reshape(height, stride)
+        rows.flags.writeable = False
+    else:
+        rows = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(height, stride))
+    return rows[::-1] if ystep < 0 else rows  # bottom-up BMP
+
+
+def map_pixels(path, img):
+    # ((height, width, bytes per pixel) memmap view, channel order) of an uncompressed image, or None
+    # if the layout is anything else. The view is the file's own bytes; reorder only after slicing,
+    # since indexing the whole view with the order would copy the image into memory.
+    rawmode = tile_rawmode(img)
+    if rawmode not in RAW_LAYOUTS or RAW_LAYOUTS[rawmode][2] != img.mode:
+        return None
+    bpp, order, _ = RAW_LAYOUTS[rawmode]
+    rows = raw_rows(path, img, bpp)
+    if rows is None:
+        return None
+    width, height = img.size
+    return rows[:, :width * bpp].reshape(height, width, bpp), order
+
+
+def prereduce_factor(src_size, rules):
+    # Integer box reduction that still leaves every rule at least 2x of Lanczos downscaling,
+    # the same split Pillow's reducing_gap=2.0 uses
+    ratio = min(min(src_size[0] / w, src_size[1] / h) for w, h in (target_size(src_size, rule) for rule in rules))
+    return int(ratio // 2)
+
+
+def load_mapped(path, img, rules):
+    # Copy of a mapped source, box-reduced when every rule allows it, built band by band so only one
+    # band is resident at a time
+    mapped = map_pixels(path, img)
+    if mapped is None:
+        return None
+    pixels, order = mapped
+    factor = max(1, prereduce_factor(img.size, rules))
+    height, width, bpp = pixels.shape
+    mode = img.mode
+    band = max(factor, MMAP_BAND_BYTES // (width * bpp * factor) * factor)
+    reduced = Image.new(mode, ((width + factor - 1) // factor, (height + factor - 1) // factor))
+    for top in range(0, height, band):
+        # Indexing with the channel order copies just this band, already in the image's channel order
+        chunk = np.ascontiguousarray(pixels[top:top + band][..., order])
+        if len(order) == 1:
+            chunk = chunk[..., 0]
+        chunk = Image.fromarray(chunk, mode)
+        reduced.paste(chunk.reduce(factor) if factor > 1 else chunk, (0, top // factor))
+    reduced.info = dict(img.info)
+    return reduced
+
+
+# Seconds this process spent in each pipeline stage; timed_render reports it from batch workers
+stage_times = collections.Counter()
+
+
+@contextlib.contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_times[name] += time.perf_counter() - start
+
+
+def render_outputs(input_path, spec):
+    # One decode, one encoded buffer per output rule. Runs in worker processes,
+    # so it must stay a picklable module-level function.
+    img = Image.open(input_path)
+    drops = [passthrough_drop(img, rule, spec) for rule in spec.rules]
+    outputs = [None] * len(spec.rules)
+    if any(drop is not None for drop in drops):
+        with timed_stage('decode'):
+            data = read_source(input_path)
+        for index, drop in enumerate(drops):
+            if drop is None:
+                continue
+            stripped = strip_jpeg_segments(data, drop) if img.format == 'JPEG' else data
+            outputs[index] = PassThrough(stripped)
+            outputs[index].how = 'copy' if len(stripped) == len(data) else 'lossless'
+
+    remaining = tuple(rule for rule, drop in zip(spec.rules, drops) if drop is None)
+    if remaining:
+        with timed_stage('decode'):
+            source = high_bit_pixels(input_path, img)
+            if source is None and any(rule.bit_depth == 16 for rule in remaining):
+                if (tile_rawmode(img) or '').endswith(('16B', '16L', '16N')):
+                    # Only the high bytes are readable here; don't pass 8-bit samples off as 16-bit
+                    raise ValueError(f"16-bit output needs OpenCV to read this {img.format} at full depth")
+                img = load_mapped(input_path, img, remaining) or img
+                source = (pixel_array(normalize_mode(img)), 255)
+            if source is None:
+                img = load_mapped(input_path, img, remaining) or img
+                img.load()
+        if source is not None:
+            rendered = iter(render_high_bit(*source, img, dataclasses.replace(spec, rules=remaining)))
+        else:
+            rendered = iter(render_image(img, dataclasses.replace(spec, rules=remaining)))
+        outputs = [output if output is not None else next(rendered) for output in outputs]
+    return outputs
+
+
+# Adaptive quality: the lowest JPEG/WebP quality whose encode still meets the rule's target SSIM
+SSIM_TARGETS = [0.0, 0.99, 0.98, 0.95]
+SSIM_QUALITY_FLOOR = 30
+SSIM_MAX_ATTEMPTS = 7
+
+
+class TunedOutput(bytes):
+    # Output of the adaptive search, with the quality it settled on and that encode's SSIM
+    quality = None
+    score = None
+    attempts = 0
+
+
+def luma_plane(img):
+    if has_alpha(img):
+        # Lossy WebP rewrites the colour under fully transparent pixels; only what is visible counts
+        img = flatten_alpha(img, '#808080')
+    return luminance(img if img.mode == 'L' else img.convert('RGB'))
+
+
+def encode_for_ssim(img, rule, exif_data=None, icc_profile=None):
+    # Binary search between the floor and the rule's quality, which acts as the cap.
+    # Every encode is kept, so the winner is never encoded twice.
+    reference = luma_plane(img)
+    encodes = {}
+
+    def score(quality):
+        if quality not in encodes:
+            data = encode_image(img, dataclasses.replace(rule, quality=quality), exif_data, icc_profile)
+            encodes[quality] = (data, ssim(reference, luma_plane(Image.open(io.BytesIO(data)))))
+        return encodes[quality][1]
+
+    low, high = min(SSIM_QUALITY_FLOOR, rule.quality), rule.quality
+    best = None
+    while low <= high and len(encodes) < SSIM_MAX_ATTEMPTS:
+        quality = (low + high) // 2
+        if score(quality) >= rule.target_ssim:
+            best, high = quality, quality - 1
+        else:
+            low = quality + 1
+    if best is None:
+        best = rule.quality
+        score(best)
+
+    output = TunedOutput(encodes[best][0])
+    output.quality, output.score, output.attempts = best, encodes[best][1], len(encodes)
+    return output
+
+
+def quality_note(data, path):
+    return (f"Quality: {os.path.basename(path)} q={data.quality} SSIM={data.score:.4f} "
+            f"({data.attempts} encodes)")
+
+
+# Auto (smallest): the resized raster is encoded in every candidate format at once and the smallest wins
+AUTO_CANDIDATES = ['JPEG', 'WEBP', 'PNG']
+_encode_pool = None
+_encode_pool_lock = threading.Lock()
+
+
+class AutoOutput(bytes):
+    # Winning candidate of the Auto format; tuned is its TunedOutput when adaptive quality was on
+    format_type = None
+    tuned = None
+
+
+def encode_pool():
+    # Per process; Pillow's encoders release the GIL, so candidate encodes overlap on threads.
+    # numpy is loaded before the fan-out so adaptive candidates never race its first import.
+    global _encode_pool
+    load_numpy()
+    with _encode_pool_lock:
+        if _encode_pool is None:
+            _encode_pool = ThreadPoolExecutor(max_workers=len(AUTO_CANDIDATES), thread_name_prefix="encode")
+        return _encode_pool
+
+
+def encode_format(img, rule, exif_data=None, icc_profile=None):
+    img = prepare_for_format(img, rule)
+    if rule.target_ssim and rule.format_type in ('JPEG', 'WEBP') and load_numpy() is not None:
+        return encode_for_ssim(img, rule, exif_data, icc_profile)
+    return encode_image(img, rule, exif_data, icc_profile)
+
+
+def encode_output(img, rule, exif_data=None, icc_profile=None):
+    if rule.format_type != AUTO_FORMAT:
+        return encode_format(img, rule, exif_data, icc_profile)
+
+    # JPEG would flatten transparency, so it only competes for opaque images
+    candidates = [fmt for fmt in AUTO_CANDIDATES if fmt != 'JPEG' or not has_alpha(img)]
+    # Image.save keeps its options on the image object, so concurrent candidates each get a copy
+    futures = {fmt: encode_pool().submit(encode_format, img.copy(), dataclasses.replace(rule, format_type=fmt),
+                                         exif_data, icc_profile)
+               for fmt in candidates}
+    results = {fmt: future.result() for fmt, future in futures.items()}
+    # An adaptive encode that could not reach the target SSIM only wins if nothing else qualifies
+    qualified = {fmt: data for fmt, data in results.items()
+                 if not isinstance(data, TunedOutput) or data.score >= rule.target_ssim} or results
+    winner = min(qualified, key=lambda fmt: len(qualified[fmt]))
+    output = AutoOutput(qualified[winner])
+    output.format_type = winner
+    output.tuned = qualified[winner] if isinstance(qualified[winner], TunedOutput) else None
+    return output
+
+
+def auto_output_path(path, format_type):
+    return f"{os.path.splitext(path)[0]}.{output_extension(format_type)}"
+
+
+def output_report(data, path):
+    # Final path, the format Auto chose (None otherwise) and log notes for one encoded output
+    format_type, tuned = None, data if isinstance(data, TunedOutput) else None
+    if isinstance(data, AutoOutput):
+        format_type, tuned = data.format_type, data.tuned
+        path = auto_output_path(path, format_type)
+    notes = [quality_note(tuned, path)] if tuned is not None else []
+    return path, format_type, notes
+
+
+# Watermarks: the scaled overlay and its opacity mask are built once per output size and mode, then
+# reused by every same-size output, so watermarking an image is a single masked paste
+WATERMARK_POSITIONS = ['bottom-right', 'bottom-left', 'top-right', 'top-left', 'center']
+OVERLAY_CACHE_ENTRIES = 64
+_overlay_sources = {}
+_overlay_cache = collections.OrderedDict()
+_overlay_lock = threading.Lock()
+
+
+def watermark_font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def text_overlay(text, width):
+    # Font size is picked so the rendered text is about `width` pixels wide
+    probe = watermark_font(100).getbbox(text)
+    font_size = max(6, round(100 * width / max(1, probe[2] - probe[0])))
+    font = watermark_font(font_size)
+    stroke = max(1, font_size // 24)
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke)
+    overlay = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (255, 255, 255, 0))
+    ImageDraw.Draw(overlay).text((-left, -top), text, font=font, fill=(255, 255, 255, 255),
+                                 stroke_width=stroke, stroke_fill=(0, 0, 0, 255))
+    return overlay
+
+
+def overlay_source(path):
+    with _overlay_lock:
+        source = _overlay_sources.get(path)
+    if source is None:
+        with Image.open(path) as f:
+            source = f.convert('RGBA')
+        with _overlay_lock:
+            _overlay_sources[path] = source
+    return source
+
+
+def watermark_overlay(spec, size, mode):
+    # (overlay in the output's mode, opacity mask, paste position) for one output size
+    key = (spec.watermark, spec.watermark_text, spec.watermark_position,
+           spec.watermark_opacity, spec.watermark_scale, size, mode)
+    with _overlay_lock:
+        if key in _overlay_cache:
+            _overlay_cache.move_to_end(key)
+            return _overlay_cache[key]
+
+    width, height = size
+    margin = min(size) // 50
+    target = max(1, round(width * spec.watermark_scale))
+    if spec.watermark:
+        source = overlay_source(spec.watermark)
+        overlay = source.resize((target, max(1, round(source.height * target / source.width))),
+                                Image.Resampling.LANCZOS)
+    else:
+        overlay = text_overlay(spec.watermark_text, target)
+    room = (max(1, width - 2 * margin), max(1, height - 2 * margin))
+    if overlay.width > room[0] or overlay.height > room[1]:
+        fit = min(room[0] / overlay.width, room[1] / overlay.height)
+        overlay = overlay.resize((max(1, int(overlay.width * fit)), max(1, int(overlay.height * fit))),
+                                 Image.Resampling.LANCZOS)
+
+    mask = overlay.getchannel('A')
+    if spec.watermark_opacity < 1:
+        mask = mask.point(lambda a: round(a * spec.watermark_opacity))
+    # Converted through opaque RGB so pasting into RGBA/LA outputs adds coverage instead of punching holes
+    colour = overlay.convert('RGB').convert(mode)
+    if spec.watermark_position == 'center':
+        box = ((width - overlay.width) // 2, (height - overlay.height) // 2)
+    else:
+        vertical, horizontal = spec.watermark_position.split('-')
+        box = (margin if horizontal == 'left' else width - overlay.width - margin,
+               margin if vertical == 'top' else height - overlay.height - margin)
+
+    entry = (colour, mask, box)
+    with _overlay_lock:
+        _overlay_cache[key] = entry
+        while len(_overlay_cache) > OVERLAY_CACHE_ENTRIES:
+            _overlay_cache.popitem(last=False)
+    return entry
+
+
+def apply_watermark(img, spec):
+    # Pastes in place: callers pass an image they own
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA', 'CMYK'):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    colour, mask, box = watermark_overlay(spec, img.size, img.mode)
+    img.paste(colour, box, mask)
+    return img
+
+
+def finish_output(resized, rule, spec, exif_data, icc_profile, source=None):
+    # Colour conversion, watermark and encode for one 8-bit rendition
+    if icc_profile and spec.color == 'srgb':
+        resized = convert_to_srgb(resized, icc_profile)
+    if spec.watermark or spec.watermark_text:
+        # A same-size output is the decoded source itself, which other rules still read
+        resized = apply_watermark(resized.copy() if resized is source else resized, spec)
+    embed = icc_profile if spec.color == 'embed' else None
+    return encode_output(resized, rule, exif_data, embed)
+
+
+def render_image(img, spec):
+    if spec.preserve_meta:
+        exif_data = img.info.get('exif')
+    else:
+        exif_data = None
+
+    icc_profile = img.info.get('icc_profile') if spec.color != 'none' else None
+
+    img = normalize_mode(img)
+    analysis = {}
+    outputs = []
+    for rule in spec.rules:
+        with timed_stage('resize'):
+            resized = resize_image(img, rule, analysis)
+        with timed_stage('encode'):
+            outputs.append(finish_output(resized, rule, spec, exif_data, icc_profile, img))
+    return outputs
+
+
+# High-bit-depth sources (16-bit PNG/TIFF, float TIFF) are resampled as float32 with a separable
+# Lanczos in numpy. 16-bit rules are written as 16-bit PNG/TIFF; 8-bit rules are dithered at the end.
+HIGH_BIT_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F')
+HIGH_BIT_RAWMODES = {
+    # 16-bit colour rawmodes Pillow can only unpack to 8 bits: rawmode -> (numpy dtype, channels)
+    'RGB;16L': ('<u2', 3), 'RGB;16B': ('>u2', 3), 'RGB;16N': ('=u2', 3),
+    'RGBA;16L': ('<u2', 4), 'RGBA;16B': ('>u2', 4), 'RGBA;16N': ('=u2', 4),
+}
+LANCZOS_LOBES = 3
+CHANNEL_MODES = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+
+
+def pixel_array(img):
+    # (height, width, channels) view of an 8-bit image
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    pixels = np.asarray(img)
+    return pixels[..., None] if pixels.ndim == 2 else pixels
+
+
+def high_bit_pixels(path, img):
+    # (samples, full-scale value) for sources with more than 8 bits per sample, else None.
+    # 16-bit colour TIFFs are memory-mapped (uncompressed) or inflated here (Deflate) and 16-bit
+    # RGB/RGBA PNGs are decoded twice by Pillow; other 16-bit colour files need OpenCV.
+    if load_numpy() is None:
+        return None
+    if img.mode in HIGH_BIT_MODES:
+        pixels = np.asarray(img)
+        return pixels[..., None], 1.0 if img.mode == 'F' else 65535.0
+    rawmode = tile_rawmode(img)
+    if rawmode in HIGH_BIT_RAWMODES:
+        dtype, channels = HIGH_BIT_RAWMODES[rawmode]
+        dtype = np.dtype(dtype)
+        rows = raw_rows(path, img, dtype.itemsize * channels)
+        if rows is not None:
+            width, height = img.size
+            return rows[:, :width * dtype.itemsize * channels].view(dtype).reshape(height, width, channels), 65535.0
+        if img.format == 'TIFF':
+            pixels = tiff_deflate_pixels(path, img, dtype, channels)
+        else:
+            pixels = png16_pixels(path, img) if img.format == 'PNG' else None
+        if pixels is not None:
+            return pixels, 65535.0
+    if rawmode and rawmode.endswith(('16B', '16L', '16N')) and importlib.util.find_spec('cv2') is not None:
+        import cv2
+        if isinstance(path, io.BytesIO):
+            pixels = cv2.imdecode(np.frombuffer(path.getbuffer(), np.uint8), cv2.IMREAD_UNCHANGED)
+        else:
+            pixels = cv2.imread(os.fspath(path), cv2.IMREAD_UNCHANGED)
+        if pixels is not None and pixels.dtype == np.uint16:
+            if pixels.ndim == 2:
+                return pixels[..., None], 65535.0
+            order = [2, 1, 0, 3][:pixels.shape[2]]  # OpenCV is BGR(A)
+            return pixels[..., order], 65535.0
+    return None
+
+
+# Pillow unfilters 16-bit PNG rows but keeps only the high byte of each sample. Decoding again with
+# the little-endian rawmode keeps the low bytes; the filter stride is the same, so the halves line up.
+PNG16_SWAPPED = {'RGB;16B': 'RGB;16L', 'RGBA;16B': 'RGBA;16L'}
+
+
+def png16_pixels(path, img):
+    rawmode = tile_rawmode(img)
+    if rawmode not in PNG16_SWAPPED or len(img.tile) != 1:
+        return None
+    codec, extents, offset = img.tile[0][:3]
+    halves = []
+    for mode in (rawmode, PNG16_SWAPPED[rawmode]):
+        source = io.BytesIO(path.getbuffer()) if isinstance(path, io.BytesIO) else path
+        with Image.open(source) as part:
+            part.tile = [(codec, extents, offset, mode)]
+            part.load()
+            halves.append(np.asarray(part, dtype=np.uint16))
+    high, low = halves
+    high <<= 8
+    high |= low
+    return high
+
+
+def tiff_deflate_pixels(path, img, dtype, channels):
+    # Deflate-compressed, chunky 16-bit TIFF strips, with or without horizontal differencing
+    tags = getattr(img, 'tag_v2', None)
+    if tags is None or 273 not in tags:
+        return None
+    if tags.get(259) not in (8, 32946) or tags.get(284, 1) != 1 or tags.get(317, 1) not in (1, 2):
+        return None
+    width, height = img.size
+    rows_per_strip = min(tags.get(278, height), height)
+    offsets, counts = tags[273], tags[279]
+    if isinstance(offsets, int):
+        offsets, counts = (offsets,), (counts,)
+    pixels = np.empty((height, width, channels), np.uint16)
+    with io.BytesIO(path.getbuffer()) if isinstance(path, io.BytesIO) else open(path, 'rb') as f:
+        for index, (offset, count) in enumerate(zip(offsets, counts)):
+            top = index * rows_per_strip
+            rows = min(rows_per_strip, height - top)
+            if rows <= 0:
+                break
+            f.seek(offset)
+            strip = np.frombuffer(zlib.decompress(f.read(count)), dtype)
+            pixels[top:top + rows] = strip[:rows * width * channels].reshape(rows, width, channels)
+    if tags.get(317, 1) == 2:
+        np.cumsum(pixels, axis=1, dtype=np.uint16, out=pixels)  # wraps modulo 2**16, like the encoder
+    return pixels
+
+
+def lanczos_taps(in_size, out_size, start, end):
+    # Source index and weight per output sample and tap, with Pillow's LANCZOS kernel and support
+    scale = (end - start) / out_size
+    stretch = max(scale, 1.0)
+    support = LANCZOS_LOBES * stretch
+    centers = start + (np.arange(out_size) + 0.5) * scale
+    index = np.floor(centers - support + 0.5).astype(np.int64)[:, None] + np.arange(int(math.ceil(support)) * 2 + 1)
+    x = (index + 0.5 - centers[:, None]) / stretch
+    weights = np.sinc(x) * np.sinc(x / LANCZOS_LOBES)
+    weights[(np.abs(x) >= LANCZOS_LOBES) | (index < 0) | (index >= in_size)] = 0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(index, 0, in_size - 1), weights.astype(np.float32)
+
+
+def resample_axis(pixels, index, weights, axis):
+    # One tap at a time: a gather and a multiply-add over the whole output plane
+    shape = list(pixels.shape)
+    shape[axis] = index.shape[0]
+    out = np.zeros(shape, np.float32)
+    broadcast = [1] * pixels.ndim
+    broadcast[axis] = -1
+    for tap in range(index.shape[1]):
+        if weights[:, tap].any():
+            out += np.take(pixels, index[:, tap], axis=axis) * weights[:, tap].reshape(broadcast)
+    return out
+
+
+def resample_float(pixels, size, box=None, scale=1.0):
+    # Separable Lanczos of (height, width, channels) samples whose full intensity is `scale`,
+    # returned as float32 in 0..1 (not clipped). Alpha is premultiplied while filtering, as Pillow does.
+    height, width, channels = pixels.shape
+    left, top, right, bottom = box or (0, 0, width, height)
+    if (size, (left, top, right, bottom)) == ((width, height), (0, 0, width, height)):
+        return pixels.astype(np.float32) / scale
+    alpha = channels in (2, 4)
+    if alpha:
+        pixels = pixels.astype(np.float32) / scale
+        pixels[..., :-1] *= pixels[..., -1:]
+    rows, row_weights = lanczos_taps(height, size[1], top, bottom)
+    columns, column_weights = lanczos_taps(width, size[0], left, right)
+    # Only the source rows the vertical pass reads go through the horizontal pass
+    first, last = rows.min(), rows.max() + 1
+    out = resample_axis(pixels[first:last], columns, column_weights, 1)
+    out = resample_axis(out, rows - first, row_weights, 0)
+    if alpha:
+        coverage = out[..., -1:]
+        out[..., :-1] = np.where(coverage > 0, out[..., :-1] / np.maximum(coverage, 1e-12), 0)
+    else:
+        out /= scale
+    return out
+
+
+def pad_pixels(pixels, size, color):
+    height, width, channels = pixels.shape
+    canvas = np.empty((size[1], size[0], channels), np.float32)
+    canvas[...] = np.asarray(ImageColor.getcolor(color, CHANNEL_MODES[channels]), np.float32) / 255
+    left, top = (size[0] - width) // 2, (size[1] - height) // 2
+    canvas[top:top + height, left:left + width] = pixels
+    return canvas
+
+
+def float_to_image(pixels, dither=True):
+    # 0..1 samples to an 8-bit image. Triangular dither of +-1 LSB on the colour channels keeps smooth
+    # 16-bit gradients from banding; it is seeded, so the same input gives the same output.
+    values = pixels * 255
+    if dither:
+        colour = values.shape[2] - (values.shape[2] in (2, 4))
+        rng = np.random.default_rng(0)
+        noise = rng.random(values.shape[:2] + (colour,), np.float32) - rng.random(values.shape[:2] + (colour,), np.float32)
+        values[..., :colour] += noise
+    data = np.clip(np.rint(values), 0, 255).astype(np.uint8)
+    return Image.fromarray(data[..., 0] if data.shape[2] == 1 else data)
+
+
+def watermark_pixels(pixels, spec):
+    height, width, channels = pixels.shape
+    colour, mask, (left, top) = watermark_overlay(spec, (width, height), CHANNEL_MODES[channels])
+    colour = np.asarray(colour, np.float32).reshape(colour.height, colour.width, -1) / 255
+    mask = np.asarray(mask, np.float32)[..., None] / 255
+    region = pixels[top:top + colour.shape[0], left:left + colour.shape[1]]
+    region *= 1 - mask
+    region += colour * mask
+    return pixels
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png16(samples, icc_profile=None):
+    # Pillow has no 48/64-bit modes, so 16-bit PNGs are assembled here; every row uses the Up filter
+    height, width, channels = samples.shape
+    rows = samples.astype('>u2').reshape(height, width * channels).view(np.uint8)
+    filtered = np.empty((height, rows.shape[1] + 1), np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    chunks = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 16, color_type, 0, 0, 0))]
+    if icc_profile:
+        chunks.append(png_chunk(b'iCCP', b'ICC Profile\0\0' + zlib.compress(icc_profile)))
+    chunks.append(png_chunk(b'IDAT', zlib.compress(filtered.tobytes(), 6)))
+    chunks.append(png_chunk(b'IEND', b''))
+    return b'\x89PNG\r\n\x1a\n' + b''.join(chunks)
+
+
+def encode_tiff16(samples, icc_profile=None):
+    # Little-endian baseline TIFF, one Deflate strip with horizontal differencing (predictor 2)
+    height, width, channels = samples.shape
+    diffs = samples.astype('<u2')
+    diffs[:, 1:] = samples[:, 1:] - samples[:, :-1]
+    strip = zlib.compress(diffs.tobytes(), 6)
+    extra = b''
+    entries = []  # (tag, type, count, the entry's 4 value bytes)
+
+    def out_of_line(data):
+        nonlocal extra
+        offset = 8 + len(extra)
+        extra += data + b'\0' * (len(data) % 2)
+        return offset
+
+    def field(tag, kind, values):
+        # kind 3 is SHORT, 4 LONG, 7 UNDEFINED (bytes). Values of up to 4 bytes must sit in the
+        # entry itself, left-justified; only longer ones are stored out of line at an offset.
+        data = values if kind == 7 else struct.pack(f'<{len(values)}{"H" if kind == 3 else "I"}', *values)
+        value = data.ljust(4, b'\0') if len(data) <= 4 else struct.pack('<I', out_of_line(data))
+        entries.append((tag, kind, len(values), value))
+
+    strip_offset = out_of_line(strip)
+    field(256, 4, [width])
+    field(257, 4, [height])
+    field(258, 3, [16] * channels)
+    field(259, 3, [8])  # Adobe Deflate
+    field(262, 3, [2 if channels >= 3 else 1])  # RGB or min-is-black
+    field(273, 4, [strip_offset])
+    field(277, 3, [channels])
+    field(278, 4, [height])
+    field(279, 4, [len(strip)])
+    field(284, 3, [1])
+    field(317, 3, [2])
+    if channels in (2, 4):
+        field(338, 3, [2])  # unassociated alpha
+    if icc_profile:
+        field(34675, 7, icc_profile)
+
+    ifd = struct.pack('<H', len(entries))
+    for tag, kind, count, value in entries:
+        ifd += struct.pack('<HHI', tag, kind, count) + value
+    ifd += struct.pack('<I', 0)
+    return b'II*\0' + struct.pack('<I', 8 + len(extra)) + extra + ifd
+
+
+def resize_pixels(pixels, scale, rule, analysis=None):
+    # Float counterpart of resize_image: 0..1 samples at the rule's output size
+    src_size = (pixels.shape[1], pixels.shape[0])
+    size = target_size(src_size, rule)
+    box = None
+    if rule.keep_aspect and rule.fit in ('cover', 'smart'):
+        energy = None
+        if rule.fit == 'smart':
+            if analysis is None:
+                analysis = {}
+            if 'energy' not in analysis:
+                proxy = tuple(max(1, side * 512 // max(src_size)) for side in src_size)
+                analysis['energy'] = edge_energy(float_to_image(
+                    np.clip(resample_float(pixels, proxy, scale=scale), 0, 1), dither=False))
+            energy = analysis['energy']
+        box = crop_box(src_size, size, energy)
+    out = resample_float(pixels, size, box, scale)
+    if rule.keep_aspect and rule.fit == 'pad':
+        out = pad_pixels(out, (rule.width, rule.height), rule.pad_color)
+    return np.clip(out, 0, 1, out=out)
+
+
+def render_high_bit(pixels, scale, img, spec):
+    # pixels: (height, width, channels) source samples; scale: the sample value of full intensity
+    exif_data = img.info.get('exif') if spec.preserve_meta else None
+    icc_profile = img.info.get('icc_profile') if spec.color != 'none' else None
+    analysis = {}
+    outputs = []
+    for rule in spec.rules:
+        with timed_stage('resize'):
+            out = resize_pixels(pixels, scale, rule, analysis)
+        with timed_stage('encode'):
+            if rule.bit_depth == 16:
+                if spec.watermark or spec.watermark_text:
+                    out = watermark_pixels(out, spec)
+                samples = np.rint(out * 65535).astype(np.uint16)
+                embed = icc_profile if spec.color == 'embed' else None
+                outputs.append(encode_png16(samples, embed) if rule.format_type == 'PNG'
+                               else encode_tiff16(samples, embed))
+            else:
+                outputs.append(finish_output(float_to_image(out), rule, spec, exif_data, icc_profile))
+    return outputs
+
+
+def benchmark_high_bit(source_size=(2400, 1600), size=(800, 533)):
+    # A smooth 16-bit gradient through the 8-bit Pillow path and the float32 path, both measured
+    # against a float64 reference in 16-bit units
+    width, height = source_size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    gradient = np.dstack([x / (width - 1), y / (height - 1), (x + y) / (width + height - 2)]) * 65535
+    samples = np.rint(gradient).astype(np.uint16)
+    reference = np.dstack([
+        np.asarray(Image.fromarray(gradient[..., c].astype(np.float32), 'F').resize(size, Image.Resampling.LANCZOS))
+        for c in range(3)])
+
+    t = time.perf_counter()
+    eight = Image.fromarray((samples >> 8).astype(np.uint8)).resize(size, Image.Resampling.LANCZOS)
+    eight_time = time.perf_counter() - t
+    t = time.perf_counter()
+    sixteen = np.rint(np.clip(resample_float(samples, size, scale=65535.0), 0, 1) * 65535)
+    float_time = time.perf_counter() - t
+    eight_error = np.abs(np.asarray(eight, np.float64) * 257 - reference).max()
+    float_error = np.abs(sixteen - reference).max()
+    return [
+        f"8-bit path: {eight_time * 1000:.1f} ms, max error {eight_error:.0f}/65535",
+        f"16-bit float path: {float_time * 1000:.1f} ms, max error {float_error:.0f}/65535",
+    ]
+
+
+# Resampling verification: exact output sizes, and PSNR/SSIM against float reference renders
+SIZE_CASES = [
+    # (source size, rule, expected output size)
+    ((1920, 1080), OutputRule(1280, 720), (1280, 720)),
+    ((1366, 768), OutputRule(1280, 720), (1280, 720)),
+    ((4000, 3000), OutputRule(1280, 720), (960, 720)),
+    ((1000, 1000), OutputRule(1280, 720), (720, 720)),
+    ((3000, 2001), OutputRule(1000, 1000), (1000, 667)),
+    ((2001, 3000), OutputRule(1000, 1000), (667, 1000)),
+    ((3, 1000), OutputRule(100, 100), (1, 100)),
+    ((1000, 3), OutputRule(100, 100), (100, 1)),
+    ((640, 480), OutputRule(1280, 720), (960, 720)),
+    ((1920, 1080), OutputRule(1280, 720, keep_aspect=False), (1280, 720)),
+    ((1920, 1080), OutputRule(300, 500, keep_aspect=False), (300, 500)),
+    ((1920, 1080), OutputRule(300, 300, fit='cover'), (300, 300)),
+    ((1080, 1920), OutputRule(300, 200, fit='smart'), (300, 200)),
+    ((1920, 1080), OutputRule(300, 300, fit='pad'), (300, 300)),
+]
+
+# name -> (source size, rule); each is rendered through resize_image and compared to the reference
+QUALITY_CASES = {
+    'downscale': ((1200, 900), OutputRule(400, 300)),
+    'odd-ratio': ((1023, 767), OutputRule(333, 333)),
+    'upscale': ((200, 150), OutputRule(500, 500)),
+    'cover': ((1200, 900), OutputRule(300, 300, fit='cover')),
+    'stretch': ((900, 900), OutputRule(640, 200, keep_aspect=False)),
+}
+
+PSNR_THRESHOLD = 40.0
+SSIM_THRESHOLD = 0.99
+
+
+def synthetic_image(size, seed=0):
+    # Deterministic content that stresses resamplers: gradients, a zone plate, noise and hard edges
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    rng = np.random.default_rng(seed)
+    zone = 127.5 + 127.5 * np.cos(((x - width / 2) ** 2 + (y - height / 2) ** 2) * (math.pi / (4 * max(size))))
+    channels = [
+        255 * x / max(1, width - 1),
+        zone,
+        np.where((x // 37 + y // 29) % 2 == 0, 40.0, 215.0) + rng.normal(0, 12, (height, width)),
+    ]
+    return Image.fromarray(np.clip(np.dstack(channels), 0, 255).round().astype(np.uint8), 'RGB')
+
+
+def reference_resize(img, size, box=None):
+    # Same filter in 32-bit float per channel: the 8-bit paths are measured against this
+    bands = [np.asarray(band.convert('F').resize(size, Image.Resampling.LANCZOS, box=box)) for band in img.split()]
+    return np.dstack(bands).astype(np.float64)
+
+
+def reference_case(src_size, rule):
+    # Synthetic source and its float reference render for one (source size, rule) quality case
+    img = synthetic_image(src_size)
+    size = target_size(src_size, rule)
+    box = crop_box(src_size, size) if rule.keep_aspect and rule.fit == 'cover' else None
+    return img, reference_resize(img, size, box)
+
+
+def luminance(pixels):
+    pixels = np.asarray(pixels, dtype=np.float64)
+    if pixels.ndim == 2:
+        return pixels
+    return pixels[..., 0] * 0.299 + pixels[..., 1] * 0.587 + pixels[..., 2] * 0.114
+
+
+def psnr(a, b, data_range=255.0):
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    if mse == 0:
+        return float('inf')
+    return float(10 * np.log10(data_range ** 2 / mse))
+
+
+def box_mean(a, radius):
+    # Mean over (2r+1)^2 windows from an integral image; 'valid' region only
+    k = 2 * radius + 1
+    c = np.pad(a, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (c[k:, k:] - c[:-k, k:] - c[k:, :-k] + c[:-k, :-k]) / (k * k)
+
+
+def ssim(a, b, data_range=255.0, radius=3):
+    # Mean SSIM of two luminance planes with a uniform 7x7 window
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if min(a.shape) < 2 * radius + 1:
+        return 1.0 if np.array_equal(a, b) else 0.0
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    mu_a, mu_b = box_mean(a, radius), box_mean(b, radius)
+    var_a = box_mean(a * a, radius) - mu_a ** 2
+    var_b = box_mean(b * b, radius) - mu_b ** 2
+    cov = box_mean(a * b, radius) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def resampling_paths():
+    # name -> callable(img, rule) returning a PIL image, for every available backend
+    paths = {
+        name: (lambda img, rule, backend=backend: resize_image(img, rule, backend=backend))
+        for name, backend in RESAMPLE_BACKENDS.items() if backend.available()
+    }
+    paths['numpy-float'] = lambda img, rule: float_to_image(resize_pixels(pixel_array(img), 255, rule), dither=False)
+    return paths
+
+
+def verify_resampling(paths=None):
+    # paths: as from resampling_paths(), which is the default
+    if paths is None:
+        paths = resampling_paths()
+    failures = []
+    lines = []
+
+    for src_size, rule, expected in SIZE_CASES:
+        got = resize_image(Image.new('RGB', src_size), rule).size
+        if got != expected:
+            failures.append(f"size {src_size} -> {rule.width}x{rule.height} {rule.fit}: got {got}, expected {expected}")
+    lines.append(f"sizes: {len(SIZE_CASES) - len(failures)}/{len(SIZE_CASES)} ok")
+
+    for case_name, (src_size, rule) in QUALITY_CASES.items():
+        img, reference = reference_case(src_size, rule)
+        for path_name, resize in paths.items():
+            out = np.asarray(resize(img, rule).convert('RGB'), dtype=np.float64)
+            if out.shape != reference.shape:
+                failures.append(f"{path_name}/{case_name}: shape {out.shape} != {reference.shape}")
+                continue
+            p = psnr(out, reference)
+            q = ssim(luminance(out), luminance(reference))
+            ok = p >= PSNR_THRESHOLD and q >= SSIM_THRESHOLD
+            lines.append(f"{path_name}/{case_name}: PSNR {p:.2f} dB, SSIM {q:.5f}{'' if ok else '  FAIL'}")
+            if not ok:
+                failures.append(f"{path_name}/{case_name}: PSNR {p:.2f} dB, SSIM {q:.5f}")
+
+    lines.extend(benchmark_high_bit())
+    return lines, failures
+
+
+# Representative scale per bucket for calibration
+CALIBRATION_SCALES = {'<0.25': 0.15, '0.25-0.5': 0.35, '0.5-1': 0.75, '>=1': 1.5}
+
+
+def calibrate_backends(repeats=3, source_size=(2400, 1600)):
+    # Time every available backend per (mode, scale bucket) on this host and store the fastest
+    # one whose output stays within PSNR_THRESHOLD of Pillow's Lanczos
+    global _calibration
+    base = synthetic_image(source_size)
+    choices = {}
+    timings = {}
+    lines = []
+    for mode in CALIBRATION_MODES:
+        img = base.convert(mode)
+        for bucket, scale in CALIBRATION_SCALES.items():
+            source = img if scale < 1 else img.reduce(3)
+            size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+            reference = np.asarray(RESAMPLE_BACKENDS['pillow'].resize(source, size), dtype=np.float64)
+            results = {}
+            for name, backend in RESAMPLE_BACKENDS.items():
+                if not backend.available() or not backend.supports(mode):
+                    continue
+                try:
+                    out = backend.resize(source, size)
+                    if out.size != size or psnr(np.asarray(out, dtype=np.float64), reference) < PSNR_THRESHOLD:
+                        continue
+                    best = float('inf')
+                    for _ in range(repeats):
+                        t = time.perf_counter()
+                        backend.resize(source, size)
+                        best = min(best, time.perf_counter() - t)
+                except Exception:
+                    continue
+                results[name] = best
+            key = f"{mode}|{bucket}"
+            fastest = min(results, key=results.get)
+            # Within timing noise of Pillow is not worth leaving the reference path for
+            if results[fastest] > results['pillow'] * 0.9:
+                fastest = 'pillow'
+            choices[key] = fastest
+            timings[key] = {name: round(t * 1000, 3) for name, t in results.items()}
+            summary = ", ".join(f"{name} {t * 1000:.1f} ms" for name, t in sorted(results.items(), key=lambda r: r[1]))
+            lines.append(f"{key:<16}{summary}  -> {choices[key]}")
+
+    path = calibration_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {'version': 1, 'choices': choices, 'timings_ms': timings}
+    OutputWriter(max_workers=1).write(json.dumps(data, indent=2).encode('utf-8'), path)
+    _calibration = choices
+    lines.append(f"Saved to {path}")
+    return lines
+
+
+# Job slots shared by previews, single resizes and batches in this process; lower priority value wins.
+# A waiting preview or single resize gets the next free slot before any further batch image starts.
+PRIORITY_PREVIEW = 0
+PRIORITY_SINGLE = 1
+PRIORITY_BATCH = 2
+BATCH_NICENESS = 10
+
+
+class JobScheduler:
+    def __init__(self, slots=None):
+        self.slots = slots or os.cpu_count() or 1
+        self.busy = 0
+        self.waiting = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.batch_limits = []  # in-flight caps of the batches running now
+
+    def capacity(self):
+        return max([self.slots] + self.batch_limits)
+
+    @contextlib.contextmanager
+    def batch(self, limit):
+        # A batch keeps up to limit images in flight, which can be more than there are slots;
+        # while it runs there are that many, so the scheduler never holds it below its own cap
+        with self.condition:
+            self.batch_limits.append(limit)
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.batch_limits.remove(limit)
+
+    def acquire(self, priority):
+        with self.condition:
+            ticket = (priority, next(self.order))
+            heapq.heappush(self.waiting, ticket)
+            while self.busy >= self.capacity() or self.waiting[0] != ticket:
+                self.condition.wait()
+            heapq.heappop(self.waiting)
+            self.busy += 1
+            self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.busy -= 1
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+scheduler = JobScheduler()
+
+
+def lower_priority(niceness):
+    # Process pool initializer: batch workers yield the CPU to the GUI and single resizes
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+
+
+class PreviewWorker(QThread):
+    loaded = pyqtSignal(str, QImage, int, int)
+    error = pyqtSignal(str)
+
+    def __init__(self, path, size, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.size = size
+
+    def run(self):
+        try:
+            with scheduler.slot(PRIORITY_PREVIEW):
+                # QImage rather than QPixmap: only QImage may be used off the GUI thread
+                image = QImage(self.path)
+                if image.isNull():
+                    raise Exception("Invalid image")
+                scaled = image.scaled(self.size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+                with Image.open(self.path) as img:
+                    w, h = img.size
+            self.loaded.emit(self.path, scaled, w, h)
+        except Exception as e:
+            self.error.emit(str(e))
 
 
 # Thread for image resizing
@@ -33,52 +1835,1564 @@ class ResizeWorker(QThread):
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    def __init__(self, input_path, output_path, width, height, keep_aspect, quality, format_type, preserve_meta):
+    def __init__(self, input_path, output_path, spec):
         super().__init__()
         self.input_path = input_path
         self.output_path = output_path
-        self.width = width
-        self.height = height
-        self.keep_aspect = keep_aspect
-        self.quality = quality
-        self.format_type = format_type
-        self.preserve_meta = preserve_meta
+        self.spec = spec
+        self.output = None
 
     def run(self):
         try:
-            img = Image.open(self.input_path)
-            original_width, original_height = img.size
+            with scheduler.slot(PRIORITY_SINGLE):
+                data = render_outputs(self.input_path, self.spec)[0]
+            self.output = data
+            output_path = output_report(data, self.output_path)[0]
+            OutputWriter(max_workers=1, fsync=self.spec.fsync).write(data, output_path)
+            self.finished.emit(output_path)
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class PyramidWorker(QThread):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, input_path, output_dir, rule, fsync='none'):
+        super().__init__()
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.rule = rule
+        self.fsync = fsync
+
+    def run(self):
+        writer = OutputWriter(fsync=self.fsync)
+        try:
+            result = build_pyramid(
+                self.input_path, self.output_dir, self.rule.format_type, self.rule.quality,
+                self.rule.background, writer=writer,
+                on_progress=lambda done, total: self.progress.emit(done * 100 // max(1, total)))
+            writer.close()
+            self.finished.emit(f"{result['levels']} levels, {result['tiles']} tiles")
+        except Exception as e:
+            writer.close()
+            self.error.emit(str(e))
+
+
+# Thread-safe batch progress; the GUI polls it on a timer instead of receiving a signal per file
+class BatchProgress:
+    def __init__(self, total, max_lines=1000, logger=None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.passed = 0
+        self.formats = collections.Counter()
+        self.lock = threading.Lock()
+        self.lines = collections.deque(maxlen=max_lines)
+        self.logger = logger or logging.getLogger("image_resizer_pro")
+
+    def record(self, result, success, count=1):
+        if success:
+            msg = f"Batch: {os.path.basename(result)}"
+        else:
+            msg = f"Batch Error: {result}"
+        with self.lock:
+            self.done += count
+            if not success:
+                self.failed += count
+            self.lines.append((time.strftime('%H:%M:%S'), msg))
+        if success:
+            self.logger.info(msg)
+        else:
+            self.logger.error(msg)
+
+    def passthrough(self, count):
+        with self.lock:
+            self.passed += count
+
+    def auto_format(self, format_type):
+        if format_type:
+            with self.lock:
+                self.formats[format_type] += 1
+
+    def summary(self):
+        with self.lock:
+            text = f"{self.done - self.failed} succeeded, {self.failed} failed"
+            if self.passed:
+                text += f", {self.passed} passed through without re-encoding"
+            if self.formats:
+                text += "; Auto picked " + ", ".join(f"{fmt} {count}" for fmt, count in self.formats.most_common())
+            return text
+
+    def note(self, msg):
+        # Informational line that does not count towards progress
+        with self.lock:
+            self.lines.append((time.strftime('%H:%M:%S'), msg))
+        self.logger.info(msg)
+
+    def drain(self):
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+            return self.done, self.failed, lines
+
+    def finished(self):
+        with self.lock:
+            return self.done >= self.total
+
+
+# Metrics for unattended runs: counters, gauges and latency histograms kept in memory, served as
+# Prometheus text on a loopback port and/or rewritten as a JSON snapshot every few seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_INTERVAL = 10
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRIC_HELP = {
+    'irp_start_time_seconds': ('gauge', 'Unix time the process started collecting metrics'),
+    'irp_images_total': ('counter', 'Source images finished, by status'),
+    'irp_outputs_total': ('counter', 'Output files written, by extension'),
+    'irp_failures_total': ('counter', 'Failures by stage and exception type'),
+    'irp_bytes_in_total': ('counter', 'Bytes of source images read'),
+    'irp_bytes_out_total': ('counter', 'Bytes of encoded output'),
+    'irp_stage_seconds': ('histogram', 'Seconds per pipeline stage; write includes time queued for an I/O thread'),
+    'irp_image_seconds': ('histogram', 'Seconds from submitting an image to having its encoded outputs'),
+    'irp_queue_depth': ('gauge', 'Images waiting for or being rendered'),
+    'irp_write_queue': ('gauge', 'Encoded outputs waiting to be written'),
+    'irp_workers': ('gauge', 'Worker processes'),
+    'irp_worker_busy_seconds_total': ('counter', 'Seconds worker processes spent decoding, resizing and encoding'),
+    'irp_worker_utilization': ('gauge', 'Share of worker time spent rendering since the batch started'),
+    'irp_requests_total': ('counter', 'Service requests, by HTTP status'),
+    'irp_request_seconds': ('histogram', 'Seconds to answer a service request'),
+    'irp_cache_total': ('counter', 'Service renditions by where they came from'),
+}
+
+
+def metric_labels(labels):
+    if not labels:
+        return ''
+    escaped = ((name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metrics:
+    # Thread-safe; recording is a dict update under one lock, so it can sit on the per-image path
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.values = {}
+        self.histograms = {}
+        self.set('irp_start_time_seconds', time.time())
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            # Per-bucket counts plus an overflow bucket, then the running sum
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            hist[bisect.bisect_left(self.buckets, value)] += 1
+            hist[-1] += value
+
+    def collect(self):
+        with self.lock:
+            values = sorted(self.values.items())
+            histograms = sorted((key, list(hist)) for key, hist in self.histograms.items())
+        return values, histograms
+
+    def cumulative(self, hist):
+        # (upper bound, observations at or below it) pairs ending with +Inf, plus the sum
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(bounds, itertools.accumulate(hist[:-1]))), hist[-1]
+
+    def prometheus(self):
+        values, histograms = self.collect()
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = METRIC_HELP.get(name, ('untyped', name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in values:
+            describe(name)
+            lines.append(f"{name}{metric_labels(labels)} {value}")
+        for (name, labels), hist in histograms:
+            describe(name)
+            buckets, total = self.cumulative(hist)
+            for bound, count in buckets:
+                lines.append(f"{name}_bucket{metric_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{metric_labels(labels)} {total}")
+            lines.append(f"{name}_count{metric_labels(labels)} {buckets[-1][1]}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        values, histograms = self.collect()
+        metrics = collections.defaultdict(list)
+        for (name, labels), value in values:
+            metrics[name].append({'labels': dict(labels), 'value': value})
+        for (name, labels), hist in histograms:
+            buckets, total = self.cumulative(hist)
+            metrics[name].append({'labels': dict(labels), 'count': buckets[-1][1], 'sum': total,
+                                  'buckets': dict(buckets)})
+        return {'time': time.time(), 'metrics': metrics}
+
+
+def send_metrics(handler, metrics):
+    body = metrics.prometheus().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != '/metrics':
+            self.send_error(404)
+            return
+        send_metrics(self, self.metrics)
+
+    def log_message(self, format, *args):
+        # A scraper polls every few seconds; don't let it drown the batch log
+        pass
+
+
+class MetricsExporter:
+    # Serves /metrics on loopback and/or rewrites a JSON snapshot every interval, on daemon threads
+    def __init__(self, metrics, port=None, path=None, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = max(1, interval)
+        self.stop = threading.Event()
+        self.server = None
+        self.threads = []
+        if port is not None:
+            handler = type('Handler', (MetricsHandler,), {'metrics': metrics})
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+            self.server.daemon_threads = True
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if path:
+            self.writer = OutputWriter(max_workers=1)
+            self.threads.append(threading.Thread(target=self.snapshots, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def write_snapshot(self):
+        data = json.dumps(self.metrics.snapshot(), indent=2).encode('utf-8')
+        try:
+            self.writer.write(data, self.path)
+        except OSError as e:
+            logging.getLogger("image_resizer_pro").warning(f"Metrics: could not write {self.path}: {e}")
+
+    def snapshots(self):
+        while not self.stop.wait(self.interval):
+            self.write_snapshot()
+
+    def close(self):
+        self.stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if self.path:
+            # Leave the final counts behind for whoever checks on the run afterwards
+            self.write_snapshot()
+            self.writer.close()
+
+
+# Profiling hooks: cProfile and/or tracemalloc around each render inside the worker processes
+PROFILE_MODES = ['off', 'cpu', 'memory', 'both']
+
+
+class ProfileSnapshot:
+    # Picklable stand-in for a cProfile.Profile; pstats.Stats.add() only needs these two members
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def profiled_render(input_path, spec, mode, top=25):
+    # Worker-process entry point: render_outputs plus this image's CPU and allocation stats
+    profiler = cProfile.Profile() if mode in ('cpu', 'both') else None
+    trace = mode in ('memory', 'both')
+    if trace:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    memory = None
+    try:
+        if profiler:
+            profiler.enable()
+        outputs = render_outputs(input_path, spec)
+        if profiler:
+            profiler.disable()
+            profiler.create_stats()
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            # Taken while the encoded outputs are still referenced, so it shows what a render holds on to
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__)))
+            memory = (peak, [(str(stat.traceback[0]), stat.size, stat.count)
+                             for stat in snapshot.statistics('lineno')[:top]])
+    finally:
+        # A failed image must not leave the worker process profiling the next one
+        if profiler:
+            profiler.disable()
+        if trace:
+            tracemalloc.stop()
+    return outputs, ProfileSnapshot(profiler.stats) if profiler else None, memory
+
+
+def timed_render(input_path, spec):
+    # Worker-process entry point: render_outputs plus the seconds it spent in each stage
+    stage_times.clear()
+    outputs = render_outputs(input_path, spec)
+    return outputs, dict(stage_times)
+
+
+class BatchProfile:
+    # Aggregates per-image stats from all worker processes into one report at batch end
+    def __init__(self, mode, folder=None, top=20):
+        self.mode = mode
+        self.folder = folder or os.path.join(app_data_dir(), "profiles")
+        self.top = top
+        self.stats = pstats.Stats() if mode in ('cpu', 'both') else None
+        self.allocations = collections.Counter()
+        self.peak = 0
+        self.peak_input = None
+        self.images = 0
+
+    def add(self, input_path, cpu, memory):
+        self.images += 1
+        if cpu and self.stats is not None:
+            self.stats.add(cpu)
+        if memory:
+            peak, sites = memory
+            if peak > self.peak:
+                self.peak, self.peak_input = peak, input_path
+            for site, size, _ in sites:
+                self.allocations[site] += size
+
+    def report(self):
+        if not self.images:
+            return []
+        lines = [f"Profile: {self.images} images profiled ({self.mode})"]
+        if self.stats is not None and self.stats.stats:
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, f"batch-{time.strftime('%Y%m%d-%H%M%S')}.pstats")
+            self.stats.dump_stats(path)
+            lines.append(f"Profile: CPU stats saved to {path} (open with python -m pstats)")
+            lines.append(f"Profile: top {self.top} by cumulative time, summed over all workers")
+            hotspots = sorted(self.stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            for func, (_, calls, own, cumulative, _) in hotspots[:self.top]:
+                lines.append(f"  {cumulative:9.3f}s cum {own:9.3f}s self {calls:8d} calls  {pstats.func_std_string(func)}")
+        if self.peak_input:
+            lines.append(f"Profile: peak traced Python memory {self.peak / 1e6:.1f} MB "
+                         f"({os.path.basename(self.peak_input)})")
+            lines.append(f"Profile: top {self.top} allocation sites live at end of render, summed over all images")
+            for site, size in self.allocations.most_common(self.top):
+                lines.append(f"  {size / 1e6:9.2f} MB  {site}")
+        return lines
+
+
+# Read-ahead for batch inputs: upcoming files are read on I/O threads so workers decode from memory
+PREFETCH_BYTES = 256 * 1024 * 1024
+PREFETCH_DEPTH = 16
+
+
+def advise_willneed(fd):
+    # Starts kernel read-ahead for the whole file; a no-op where posix_fadvise does not exist
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
+
+class PrefetchedFile(io.BytesIO):
+    # In-memory copy of a batch input; the repr keeps decoder error messages naming the file
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+    def __repr__(self):
+        return repr(self.name)
+
+
+class Prefetcher:
+    # Reads the next files of a batch, in order, within a byte budget. Files too big for the budget
+    # only get a WILLNEED hint and are read (or memory-mapped) by the worker itself.
+    def __init__(self, paths, budget=PREFETCH_BYTES, depth=PREFETCH_DEPTH, threads=4):
+        self.paths = list(paths)
+        self.budget = budget
+        self.depth = depth
+        self.position = 0
+        self.used = 0
+        self.lock = threading.Lock()
+        self.futures = {}  # by position in the batch; the same path may be listed more than once
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="prefetch")
+        self.fill()
+
+    def read(self, path, reserved):
+        # reserved: bytes counted against the budget when the read was queued; 0 means hint only
+        data = None
+        try:
+            with open(path, 'rb') as f:
+                advise_willneed(f.fileno())
+                if reserved:
+                    data = f.read()
+        except OSError:
+            pass  # the worker reports the error when it opens the file
+        with self.lock:
+            self.used += (len(data) if data is not None else 0) - reserved
+        return data
+
+    def fill(self):
+        with self.lock:
+            while self.position < len(self.paths) and len(self.futures) < self.depth:
+                path = self.paths[self.position]
+                try:
+                    size = os.stat(path).st_size
+                except OSError:
+                    size = 0
+                # Reserved when queued rather than when read, so reads still in flight count too
+                reserved = size if size <= self.budget // 4 else 0
+                if reserved and self.used + reserved > self.budget:
+                    break
+                self.used += reserved
+                self.futures[self.position] = self.executor.submit(self.read, path, reserved)
+                self.position += 1
+
+    def take(self, index):
+        # Source for the batch's index-th job: the prefetched bytes, or the path itself
+        path = self.paths[index]
+        with self.lock:
+            future = self.futures.pop(index, None)
+            # A job that goes ahead without its bytes must not have them read later, unclaimed
+            self.position = max(self.position, index + 1)
+        data = future.result() if future else None
+        self.fill()
+        return PrefetchedFile(data, path) if data is not None else path
+
+    def release(self, source):
+        # The job holding these bytes finished; their budget can go to later files
+        if isinstance(source, PrefetchedFile):
+            with self.lock:
+                self.used -= len(source.getbuffer())
+            self.fill()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Contact sheets and sprite atlases: each rendition is pasted in as its image finishes, and every
+# completed band is compressed straight into the PNG, so only one band is held in memory
+SHEET_LAYOUTS = ['grid', 'atlas']
+SHEET_SPACING = 4
+
+
+def sheet_rule_index(spec):
+    # Default rendition for a sheet: the rule with the smallest box, i.e. the thumbnail
+    return min(range(len(spec.rules)), key=lambda i: spec.rules[i].width * spec.rules[i].height)
+
+
+class StripPNGWriter:
+    # 8-bit PNG written band by band into a temp file; IHDR gets the final height on close
+    def __init__(self, path, width, mode):
+        self.path = path
+        self.width = width
+        self.mode = mode
+        self.height = 0
+        self.previous = None
+        self.compressor = zlib.compressobj(6)
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=folder, prefix='.sheet-', suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n' + self.header())
+
+    def header(self):
+        color_type = 6 if self.mode == 'RGBA' else 2
+        return png_chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, color_type, 0, 0, 0))
+
+    def write(self, band):
+        rows = np.asarray(band.convert(self.mode)).reshape(band.height, -1)
+        filtered = np.empty((band.height, rows.shape[1] + 1), np.uint8)
+        filtered[:, 0] = 2  # Up filter, continued across bands
+        filtered[:, 1:] = rows
+        filtered[1:, 1:] -= rows[:-1]
+        if self.previous is not None:
+            filtered[0, 1:] -= self.previous
+        self.previous = rows[-1].copy()
+        self.height += band.height
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.file.write(png_chunk(b'IDAT', data))
+
+    def close(self, file_mode):
+        self.file.write(png_chunk(b'IDAT', self.compressor.flush()) + png_chunk(b'IEND', b''))
+        self.file.seek(8)
+        self.file.write(self.header())
+        self.file.close()
+        os.chmod(self.temp_path, file_mode)
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class ContactSheet:
+    # grid: one cell per input in input order, a band per finished row of cells.
+    # atlas: shelf packing in completion order, a band per closed shelf; transparent background.
+    def __init__(self, path, spec, layout='grid', columns=0, rule_index=None,
+                 spacing=SHEET_SPACING, background='#FFFFFF'):
+        if layout not in SHEET_LAYOUTS:
+            raise ValueError(f"Unknown sheet layout: {layout}")
+        self.rule_index = sheet_rule_index(spec) if rule_index is None else rule_index
+        if not 0 <= self.rule_index < len(spec.rules):
+            raise ValueError(f"The recipe has no rule {self.rule_index}")
+        rule = spec.rules[self.rule_index]
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + '.json'
+        self.layout = layout
+        self.columns = columns
+        self.cell = (rule.width, rule.height)
+        self.spacing = spacing
+        self.background = background
+        self.writer = None
+        self.sprites = []
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheet")
+
+    def start(self, count):
+        cell_w, cell_h = self.cell
+        # Roughly square unless a column count was given
+        columns = self.columns or round(math.sqrt(count * cell_h / cell_w))
+        self.columns = max(1, min(columns, count))
+        self.count = count
+        self.width = self.columns * (cell_w + self.spacing) + self.spacing
+        self.cells = {}
+        self.next_row = 0
+        self.shelf = []
+        self.x = self.spacing
+        self.writer = StripPNGWriter(self.path, self.width, 'RGB' if self.layout == 'grid' else 'RGBA')
+        self.writer.write(self.blank(self.spacing))
+
+    def blank(self, height):
+        if self.layout == 'grid':
+            return Image.new('RGB', (self.width, height), self.background)
+        return Image.new('RGBA', (self.width, height), (0, 0, 0, 0))
+
+    def add(self, index, input_path, output_path, data):
+        self.futures.append(self.executor.submit(self.place, index, input_path, output_path, data))
+
+    def skip(self, index):
+        self.add(index, None, None, None)
+
+    def place(self, index, input_path, output_path, data):
+        thumb = None
+        if data is not None:
+            try:
+                thumb = Image.open(io.BytesIO(data))
+                thumb.load()
+            except Exception:
+                thumb = None  # e.g. a 16-bit TIFF Pillow can't read back; leave its cell empty
+        if thumb is not None:
+            if self.layout == 'grid':
+                thumb = flatten_alpha(thumb, self.background) if has_alpha(thumb) else thumb.convert('RGB')
+            else:
+                thumb = thumb.convert('RGBA')
+            thumb.thumbnail(self.cell)
+        if self.layout == 'grid':
+            self.cells[index] = (thumb, input_path, output_path)
+            self.flush_rows()
+        elif thumb is not None:
+            if self.shelf and self.x + thumb.width > self.width - self.spacing:
+                self.flush_shelf()
+            self.shelf.append((self.x, thumb, input_path, output_path))
+            self.x += thumb.width + self.spacing
+
+    def record(self, input_path, output_path, x, y, size):
+        self.sprites.append({
+            'name': os.path.splitext(os.path.basename(input_path))[0],
+            'source': input_path, 'file': output_path,
+            'x': x, 'y': y, 'width': size[0], 'height': size[1],
+        })
+
+    def flush_rows(self):
+        cell_w, cell_h = self.cell
+        while self.next_row * self.columns < self.count:
+            first = self.next_row * self.columns
+            indices = range(first, min(first + self.columns, self.count))
+            if any(index not in self.cells for index in indices):
+                return
+            band = self.blank(cell_h + self.spacing)
+            for column, index in enumerate(indices):
+                thumb, input_path, output_path = self.cells.pop(index)
+                if thumb is None:
+                    continue
+                x = self.spacing + column * (cell_w + self.spacing) + (cell_w - thumb.width) // 2
+                top = (cell_h - thumb.height) // 2
+                band.paste(thumb, (x, top))
+                self.record(input_path, output_path, x, self.writer.height + top, thumb.size)
+            self.writer.write(band)
+            self.next_row += 1
+
+    def flush_shelf(self):
+        if not self.shelf:
+            return
+        band = self.blank(max(thumb.height for _, thumb, _, _ in self.shelf) + self.spacing)
+        for x, thumb, input_path, output_path in self.shelf:
+            band.paste(thumb, (x, 0))
+            self.record(input_path, output_path, x, self.writer.height, thumb.size)
+        self.writer.write(band)
+        self.shelf = []
+        self.x = self.spacing
+
+    def close(self):
+        # Finishes the PNG and writes the JSON index; returns a summary line for the batch log
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+        self.flush_shelf()
+        output = OutputWriter(max_workers=1)
+        self.writer.close(output.file_mode)
+        index = {
+            'image': os.path.basename(self.path), 'layout': self.layout,
+            'width': self.width, 'height': self.writer.height, 'sprites': self.sprites,
+        }
+        output.write(json.dumps(index, indent=2).encode('utf-8'), self.index_path)
+        return [f"Contact sheet: {self.path} ({len(self.sprites)} images, {self.width}x{self.writer.height})"]
+
+    def discard(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.writer is not None and not self.writer.file.closed:
+            self.writer.discard()
+
+
+def run_batch(items, spec, writer, progress, profile=None, prefetch_bytes=PREFETCH_BYTES, niceness=0,
+              sheet=None, metrics=None):
+    # items: (input_path, [output path per rule]); encoded bytes go to the OutputWriter's I/O threads
+    def on_written(future):
+        try:
+            progress.record(future.result(), True)
+        except Exception as e:
+            progress.record(str(e), False)
+
+    def record_write(extension, submitted, future):
+        metrics.inc('irp_write_queue', -1)
+        metrics.observe('irp_stage_seconds', time.perf_counter() - submitted, stage='write')
+        error = future.exception()
+        if error is None:
+            metrics.inc('irp_outputs_total', format=extension)
+        else:
+            metrics.inc('irp_failures_total', stage='write', type=type(error).__name__)
+
+    def record_render(input_path, outputs, stages, submitted):
+        nonlocal busy
+        now = time.perf_counter()
+        busy += sum(stages.values())
+        for stage, seconds in stages.items():
+            metrics.observe('irp_stage_seconds', seconds, stage=stage)
+        metrics.observe('irp_image_seconds', now - submitted)
+        metrics.inc('irp_images_total', status='ok')
+        metrics.inc('irp_worker_busy_seconds_total', sum(stages.values()))
+        metrics.set('irp_worker_utilization', busy / (max_workers * max(now - started, 1e-6)))
+        metrics.inc('irp_bytes_out_total', sum(len(data) for data in outputs))
+        try:
+            metrics.inc('irp_bytes_in_total', os.path.getsize(input_path))
+        except OSError:
+            pass
 
-            if self.preserve_meta:
-                exif_data = img.info.get('exif')
+    max_workers = spec.workers or os.cpu_count() or 1
+    items = list(items)
+    for folder in {os.path.dirname(os.path.abspath(path)) for _, output_paths in items for path in output_paths}:
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except OSError:
+            pass  # each write into it then fails and is reported per file
+    remaining = len(items)
+    started, busy = time.perf_counter(), 0.0
+    if metrics:
+        metrics.set('irp_workers', max_workers)
+        metrics.set('irp_queue_depth', remaining)
+    prefetcher = Prefetcher([input_path for input_path, _ in items], prefetch_bytes) if prefetch_bytes else None
+    if sheet:
+        sheet.start(len(items))
+    # spawn rather than fork: forking a process that already runs Qt threads is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    # Cap in-flight jobs so finished-but-unwritten buffers can't pile up
+    limit = max_workers * 2
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=lower_priority,
+                                 initargs=(niceness,)) as pool, scheduler.batch(limit):
+            pending = {}
+            items = enumerate(items)
+            while True:
+                for index, (input_path, output_paths) in items:
+                    source = prefetcher.take(index) if prefetcher else input_path
+                    # Each image holds a scheduler slot until it finishes, so previews and single
+                    # resizes waiting for a slot go ahead of the rest of the batch
+                    scheduler.acquire(PRIORITY_BATCH)
+                    try:
+                        if profile:
+                            future = pool.submit(profiled_render, source, spec, profile.mode)
+                        elif metrics:
+                            future = pool.submit(timed_render, source, spec)
+                        else:
+                            future = pool.submit(render_outputs, source, spec)
+                    except BaseException:
+                        scheduler.release()
+                        raise
+                    future.add_done_callback(lambda _: scheduler.release())
+                    pending[future] = (index, input_path, output_paths, source, time.perf_counter())
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, input_path, output_paths, source, submitted = pending.pop(future)
+                    remaining -= 1
+                    if metrics:
+                        metrics.set('irp_queue_depth', remaining)
+                    if prefetcher:
+                        prefetcher.release(source)
+                    try:
+                        outputs = future.result()
+                    except Exception as e:
+                        progress.record(f"{os.path.basename(input_path)}: {e}", False, len(output_paths))
+                        if metrics:
+                            metrics.inc('irp_images_total', status='failed')
+                            metrics.inc('irp_failures_total', stage='render', type=type(e).__name__)
+                        if sheet:
+                            sheet.skip(index)
+                        continue
+                    stages = {}
+                    if profile:
+                        outputs, cpu, memory = outputs
+                        profile.add(input_path, cpu, memory)
+                    elif metrics:
+                        outputs, stages = outputs
+                    if metrics:
+                        record_render(input_path, outputs, stages, submitted)
+                    progress.passthrough(sum(isinstance(data, PassThrough) for data in outputs))
+                    for rule_index, (data, output_path) in enumerate(zip(outputs, output_paths)):
+                        output_path, format_type, notes = output_report(data, output_path)
+                        progress.auto_format(format_type)
+                        for note in notes:
+                            progress.note(note)
+                        if sheet and rule_index == sheet.rule_index:
+                            sheet.add(index, input_path, output_path, data)
+                        written = writer.submit(data, output_path)
+                        if metrics:
+                            metrics.inc('irp_write_queue')
+                            extension = os.path.splitext(output_path)[1][1:].lower()
+                            written.add_done_callback(functools.partial(record_write, extension,
+                                                                        time.perf_counter()))
+                        written.add_done_callback(on_written)
+        if sheet:
+            for line in sheet.close():
+                progress.note(line)
+        if profile:
+            for line in profile.report():
+                progress.note(line)
+    finally:
+        if sheet:
+            sheet.discard()
+        if prefetcher:
+            prefetcher.close()
+        writer.close()
+
+
+def collect_inputs(paths):
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    inputs.append(os.path.join(path, name))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def console_logger():
+    # The module logger, printing to stderr. Every headless entry point calls this, and a process
+    # can run more than one, so the handler is only added once.
+    logger = logging.getLogger("image_resizer_pro")
+    logger.setLevel(logging.INFO)
+    if not any(type(handler) is logging.StreamHandler for handler in logger.handlers):
+        logger.addHandler(logging.StreamHandler())
+    return logger
+
+
+def run_headless(spec, paths, profile=None, prefetch_bytes=PREFETCH_BYTES, niceness=0, sheet=None,
+                 metrics=None):
+    logger = console_logger()
+
+    inputs = collect_inputs(paths)
+    writer = OutputWriter(fsync=spec.fsync)
+    items = [(path, spec.output_paths(path, writer)) for path in inputs]
+    progress = BatchProgress(len(items) * len(spec.rules), max_lines=1)
+    run_batch(items, spec, writer, progress, profile, prefetch_bytes, niceness, sheet, metrics)
+    logger.info(f"Batch: {progress.summary()}")
+    return 1 if progress.failed else 0
+
+
+# Deep-zoom tile pyramids (DZI or XYZ): one decode, each level a 2x reduction of the one above
+PYRAMID_LAYOUTS = ['dzi', 'xyz']
+# Tiles are loaded by browser viewers, so only formats a browser can display
+PYRAMID_FORMATS = ['JPEG', 'PNG', 'WEBP']
+TILE_SIZES = [256, 512]
+
+
+def pyramid_sizes(size):
+    # DZI numbering: level 0 is 1x1, the last level is the full image
+    sizes = [size]
+    while max(sizes[-1]) > 1:
+        w, h = sizes[-1]
+        sizes.append(((w + 1) // 2, (h + 1) // 2))
+    return sizes[::-1]
+
+
+def tile_boxes(size, tile_size, overlap=0):
+    w, h = size
+    for row in range((h + tile_size - 1) // tile_size):
+        for col in range((w + tile_size - 1) // tile_size):
+            left = max(0, col * tile_size - overlap)
+            top = max(0, row * tile_size - overlap)
+            right = min(w, (col + 1) * tile_size + overlap)
+            bottom = min(h, (row + 1) * tile_size + overlap)
+            yield col, row, (left, top, right, bottom)
+
+
+def is_blank_tile(tile, background):
+    # Flat tiles in the background colour, or fully transparent ones, are not written
+    bands = tile.getbands()
+    extrema = tile.getextrema()
+    if len(bands) == 1:
+        extrema = (extrema,)
+    if 'A' in bands and extrema[-1][1] == 0:
+        return True
+    if any(low != high for low, high in extrema):
+        return False
+    return tile.getpixel((0, 0)) == background
+
+
+def pad_tile(tile, tile_size, fill):
+    # XYZ clients draw every tile at the full tile size, so edge tiles are padded rather than stretched
+    size = (max(tile_size, tile.width), max(tile_size, tile.height))
+    if tile.size == size:
+        return tile
+    padded = Image.new(tile.mode, size, fill)
+    padded.paste(tile, (0, 0))
+    return padded
+
+
+def encode_tile(tile, rule, background, skip_blank):
+    if skip_blank and is_blank_tile(tile, background):
+        return None
+    return encode_image(prepare_for_format(tile, rule), rule)
+
+
+def build_pyramid(input_path, output_dir, format_type='JPEG', quality=90, background='#FFFFFF',
+                  tile_size=256, overlap=0, layout='dzi', skip_blank=True, workers=None,
+                  writer=None, on_progress=None):
+    if layout not in PYRAMID_LAYOUTS:
+        raise ValueError(f"Unknown pyramid layout: {layout}")
+    if tile_size < 1 or overlap < 0 or overlap >= tile_size:
+        raise ValueError("Invalid tile size or overlap")
+    if format_type not in PYRAMID_FORMATS:
+        raise ValueError(f"Tile pyramids need JPEG, PNG or WEBP tiles, got {format_type}")
+    rule = OutputRule(tile_size, tile_size, quality=quality, format_type=format_type, background=background)
+    ext = output_extension(format_type)
+
+    img = normalize_mode(Image.open(input_path))
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    sizes = pyramid_sizes(img.size)
+    top = len(sizes) - 1
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    if layout == 'dzi':
+        first = 0
+        root = os.path.join(output_dir, f"{base_name}_files")
+    else:
+        # XYZ zoom 0 is the largest level that still fits in one tile
+        first = max(level for level, size in enumerate(sizes) if max(size) <= tile_size)
+        root = os.path.join(output_dir, base_name)
+    total = sum(-(-w // tile_size) * -(-h // tile_size) for w, h in sizes[first:])
+
+    own_writer = writer is None
+    writer = writer or OutputWriter()
+    workers = workers or os.cpu_count() or 1
+    done = skipped = 0
+    try:
+        # Pillow's encoders release the GIL, so threads share each level without copying it to processes
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyramid") as pool:
+            pending = {}
+            limit = workers * 4
+
+            def settle():
+                nonlocal done, skipped
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = pending.pop(future)
+                    data = future.result()
+                    if path is not None and data is not None:
+                        # Encoded tile: hand it to the writer and count it once it is on disk
+                        pending[writer.submit(data, path)] = None
+                        continue
+                    done += 1
+                    skipped += data is None
+                    if on_progress:
+                        on_progress(done, total)
+
+            level_img = img
+            for level in range(top, first - 1, -1):
+                # Only the current level is held; tiles are cropped here and encoded/written as they go
+                folder = os.path.join(root, str(level - first))
+                os.makedirs(folder, exist_ok=True)
+                fill = ImageColor.getcolor(background, level_img.mode)
+                # Padding is transparent when the image has alpha, the background colour otherwise
+                pad = (0,) * len(level_img.getbands()) if 'A' in level_img.getbands() else fill
+                for col, row, box in tile_boxes(level_img.size, tile_size, overlap):
+                    tile = level_img.crop(box)
+                    if layout == 'dzi':
+                        path = os.path.join(folder, f"{col}_{row}.{ext}")
+                    else:
+                        os.makedirs(os.path.join(folder, str(col)), exist_ok=True)
+                        path = os.path.join(folder, str(col), f"{row}.{ext}")
+                        tile = pad_tile(tile, tile_size, pad)
+                    future = pool.submit(encode_tile, tile, rule, fill, skip_blank)
+                    pending[future] = path
+                    while len(pending) >= limit:
+                        settle()
+                if level > first:
+                    w, h = level_img.size
+                    level_img = level_img.reduce((2 if w > 1 else 1, 2 if h > 1 else 1))
+            while pending:
+                settle()
+
+        if layout == 'dzi':
+            width, height = sizes[top]
+            manifest = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{ext}" '
+                f'Overlap="{overlap}" TileSize="{tile_size}">\n'
+                f'  <Size Width="{width}" Height="{height}"/>\n'
+                '</Image>\n'
+            )
+            writer.write(manifest.encode('utf-8'), os.path.join(output_dir, f"{base_name}.dzi"))
+    finally:
+        if own_writer:
+            writer.close()
+    return {'levels': top - first + 1, 'tiles': total - skipped, 'skipped': skipped}
+
+
+def run_pyramids(paths, output_dir, spec, tile_size=256, layout='dzi', overlap=0):
+    logger = console_logger()
+
+    rule = spec.rules[0] if spec else OutputRule(tile_size, tile_size, quality=90)
+    failed = 0
+    for path in collect_inputs(paths):
+        writer = OutputWriter(fsync=spec.fsync if spec else 'none')
+        try:
+            result = build_pyramid(path, output_dir, rule.format_type, rule.quality, rule.background,
+                                   tile_size, overlap, layout, workers=spec.workers if spec else None,
+                                   writer=writer)
+            logger.info(f"Pyramid: {os.path.basename(path)}: {result['levels']} levels, "
+                        f"{result['tiles']} tiles, {result['skipped']} blank skipped")
+        except Exception as e:
+            failed += 1
+            logger.error(f"Pyramid Error: {os.path.basename(path)}: {e}")
+        finally:
+            writer.close()
+    return 1 if failed else 0
+
+
+# Local HTTP resize service: GET /img/<path>?w=&h=&fmt=&q=&fit= renders from a root folder on demand
+def rendition_size(src_size, width, height):
+    # A missing dimension follows the source aspect ratio; neither means the source size
+    src_w, src_h = src_size
+    if not width and not height:
+        return src_w, src_h
+    if not width:
+        return max(1, round(src_w * height / src_h)), height
+    if not height:
+        return width, max(1, round(src_h * width / src_w))
+    return width, height
+
+
+def render_rendition(path, width, height, format_type, quality, fit):
+    # Worker-process entry point
+    img = Image.open(path)
+    width, height = rendition_size(img.size, width, height)
+    rule = OutputRule(width, height, quality=quality, format_type=format_type, fit=fit)
+    img.load()
+    return render_image(img, JobSpec(rules=(rule,), preserve_meta=False))[0]
+
+
+class RenditionCache:
+    # Byte-bounded LRU of encoded renditions, keyed by ETag
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.items:
+                return
+            self.items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ResizeService:
+    FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+    CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+    def __init__(self, root, cache_dir=None, memory_bytes=256 * 1024 * 1024, workers=None, metrics=None):
+        self.root = os.path.realpath(root)
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "image_resizer_pro_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.memory = RenditionCache(memory_bytes)
+        self.writer = OutputWriter(max_workers=2)
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.metrics = metrics
+        self.logger = logging.getLogger("image_resizer_pro")
+
+    def count(self, name, amount=1, **labels):
+        if self.metrics:
+            self.metrics.inc(name, amount, **labels)
+
+    def resolve(self, rel_path):
+        # Only files inside the root; symlinks and ../ can't escape it
+        path = os.path.realpath(os.path.join(self.root, rel_path.lstrip('/')))
+        if os.path.commonpath([path, self.root]) != self.root or not os.path.isfile(path):
+            raise FileNotFoundError(rel_path)
+        return path
+
+    def parse(self, query, path):
+        params = urllib.parse.parse_qs(query)
+
+        def value(name, default=None):
+            return params[name][-1] if name in params else default
+
+        try:
+            width = int(value('w', 0))
+            height = int(value('h', 0))
+            quality = int(value('q', 85))
+        except ValueError:
+            raise ValueError("w, h and q must be integers")
+        format_type = self.FORMATS.get(value('fmt', 'jpg').lower())
+        if format_type is None:
+            raise ValueError(f"Unsupported format: {value('fmt')}")
+        fit = value('fit', 'contain')
+        size = (width, height)
+        if not width or not height:
+            # A derived side can still be out of range; only the header is read for the source size
+            try:
+                with Image.open(path) as img:
+                    size = rendition_size(img.size, width, height)
+            except OSError:
+                size = (width or 1, height or 1)  # not an image: the worker reports it
+        # Validate up front so bad requests never reach the pool
+        OutputRule(*size, quality=quality, format_type=format_type, fit=fit)
+        return width, height, format_type, quality, fit
+
+    def etag(self, path, params):
+        # Derived from the request and the source's stat, so If-None-Match needs no rendering
+        st = os.stat(path)
+        key = f"{os.path.relpath(path, self.root)}|{st.st_mtime_ns}|{st.st_size}|{params}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, etag, path, params):
+        data = self.memory.get(etag)
+        if data is not None:
+            self.count('irp_cache_total', source='memory')
+            return data
+        cache_path = os.path.join(self.cache_dir, f"{etag}.{output_extension(params[2])}")
+        try:
+            with open(cache_path, 'rb') as f:
+                data = f.read()
+            self.memory.put(etag, data)
+            self.count('irp_cache_total', source='disk')
+            return data
+        except FileNotFoundError:
+            pass
+
+        # Coalesce: concurrent identical requests wait on the same job
+        with self.lock:
+            future = self.inflight.get(etag)
+            if future is None:
+                future = self.pool.submit(render_rendition, path, *params)
+                self.inflight[etag] = future
+                submitted = time.perf_counter()
+                future.add_done_callback(lambda f: self.store(etag, cache_path, f, path, submitted))
+                self.count('irp_cache_total', source='render')
             else:
-                exif_data = None
+                self.count('irp_cache_total', source='shared')
+            if self.metrics:
+                self.metrics.set('irp_queue_depth', len(self.inflight))
+        return future.result()
+
+    def store(self, etag, cache_path, future, path=None, submitted=None):
+        with self.lock:
+            self.inflight.pop(etag, None)
+            if self.metrics:
+                self.metrics.set('irp_queue_depth', len(self.inflight))
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.count('irp_images_total', status='failed')
+            self.count('irp_failures_total', stage='render', type=type(error).__name__)
+            return
+        data = future.result()
+        if self.metrics:
+            self.metrics.observe('irp_image_seconds', time.perf_counter() - submitted)
+            self.count('irp_images_total', status='ok')
+            self.count('irp_bytes_out_total', len(data))
+            try:
+                self.count('irp_bytes_in_total', os.path.getsize(path))
+            except OSError:
+                pass
+        self.memory.put(etag, data)
+        self.writer.submit(data, cache_path)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.writer.close()
 
-            if self.keep_aspect:
-                ratio = min(self.width / original_width, self.height / original_height)
-                new_width = int(original_width * ratio)
-                new_height = int(original_height * ratio)
+
+class ResizeRequestHandler(BaseHTTPRequestHandler):
+    service = None
+    status = None
+
+    def send_response(self, code, message=None):
+        self.status = int(code)
+        super().send_response(code, message)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        metrics = self.service.metrics
+        if url.path == '/metrics' and metrics:
+            send_metrics(self, metrics)
+            return
+        start = time.perf_counter()
+        try:
+            self.respond(url)
+        finally:
+            if metrics:
+                metrics.inc('irp_requests_total', code=self.status)
+                metrics.observe('irp_request_seconds', time.perf_counter() - start)
+
+    def respond(self, url):
+        if not url.path.startswith('/img/'):
+            self.send_error(404)
+            return
+        try:
+            path = self.service.resolve(urllib.parse.unquote(url.path[len('/img/'):]))
+            params = self.service.parse(url.query, path)
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        etag = self.service.etag(path, params)
+        if f'"{etag}"' in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', f'"{etag}"')
+            self.end_headers()
+            return
+
+        try:
+            data = self.service.get(etag, path, params)
+        except Exception as e:
+            # The details stay in the log; they can name files and paths outside the served root
+            self.service.logger.error(f"Service Error: {url.path}: {type(e).__name__}: {e}")
+            self.send_error(500, "Could not render this image")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', ResizeService.CONTENT_TYPES[params[2]])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', f'"{etag}"')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        self.service.logger.info("%s %s", self.address_string(), format % args)
+
+
+def run_server(root, port=8765, cache_dir=None, memory_mb=256, workers=None, metrics_file=None,
+               metrics_interval=METRICS_INTERVAL):
+    logger = console_logger()
+
+    # The service always answers /metrics on its own port; the snapshot file is optional
+    metrics = Metrics()
+    service = ResizeService(root, cache_dir, memory_mb * 1024 * 1024, workers, metrics)
+    handler = type('Handler', (ResizeRequestHandler,), {'service': service})
+    # Loopback only: this is a local tool, not a public image server
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    exporter = MetricsExporter(metrics, path=metrics_file, interval=metrics_interval) if metrics_file else None
+    logger.info(f"Serving {service.root} on http://127.0.0.1:{server.server_address[1]}/img/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if exporter:
+            exporter.close()
+    return 0
+
+
+# Distributed batches: a coordinator hands chunks of a batch to worker processes over TCP.
+# Frames are a 4-byte length, a JSON header, then the binary blobs the header lists.
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+
+def send_message(sock, header, blobs=()):
+    blobs = list(blobs)
+    body = json.dumps(dict(header, blobs=[len(blob) for blob in blobs])).encode('utf-8')
+    sock.sendall(struct.pack('!I', len(body)) + body)
+    for blob in blobs:
+        sock.sendall(blob)
+
+
+def recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    size, = struct.unpack('!I', recv_exact(sock, 4))
+    if size > MAX_HEADER_BYTES:
+        raise ValueError("Oversized message header")
+    header = json.loads(recv_exact(sock, size))
+    blobs = [recv_exact(sock, length) for length in header.get('blobs', [])]
+    return header, blobs
+
+
+def parse_address(text, default_port=8766):
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, default_port
+    return host, int(port)
+
+
+class BatchCoordinator:
+    # Chunk bookkeeping shared by all worker connections
+    def __init__(self, items, spec, writer, progress, chunk_size=16, stream=False,
+                 heartbeat=5.0, max_retries=2, token=''):
+        self.spec = spec
+        self.writer = writer
+        self.progress = progress
+        self.stream = stream
+        self.heartbeat = heartbeat
+        self.max_retries = max_retries
+        self.token = token
+        self.chunks = queue.Queue()
+        count = 0
+        for start in range(0, len(items), max(1, chunk_size)):
+            self.chunks.put({'id': count, 'items': items[start:start + chunk_size], 'attempts': 0})
+            count += 1
+        self.remaining = count
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if not count:
+            self.finished.set()
+
+    def next_chunk(self, timeout):
+        try:
+            return self.chunks.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def complete(self, chunk, results, blobs):
+        def on_written(future):
+            try:
+                self.progress.record(future.result(), True)
+            except Exception as e:
+                self.progress.record(str(e), False)
+
+        blobs = iter(blobs)
+        for (input_path, output_paths), result in zip(chunk['items'], results):
+            if not result.get('ok'):
+                self.progress.record(result.get('error', os.path.basename(input_path)), False, len(output_paths))
+                continue
+            self.progress.passthrough(result.get('passthrough', 0))
+            for note in result.get('notes', []):
+                self.progress.note(note)
+            for output_path, format_type in zip(output_paths, result.get('formats') or [None] * len(output_paths)):
+                self.progress.auto_format(format_type)
+                if format_type:
+                    output_path = auto_output_path(output_path, format_type)
+                if self.stream:
+                    self.writer.submit(next(blobs), output_path).add_done_callback(on_written)
+                else:
+                    self.progress.record(output_path, True)
+        self.chunk_done()
+
+    def fail(self, chunk, reason):
+        # The worker died or stalled mid-chunk: hand the chunk to someone else, a few times
+        chunk['attempts'] += 1
+        if chunk['attempts'] <= self.max_retries:
+            self.progress.logger.warning(f"Chunk {chunk['id']} requeued: {reason}")
+            self.chunks.put(chunk)
+            return
+        for input_path, output_paths in chunk['items']:
+            self.progress.record(f"{os.path.basename(input_path)}: {reason}", False, len(output_paths))
+        self.chunk_done()
+
+    def chunk_done(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.finished.set()
+
+
+class CoordinatorHandler(socketserver.BaseRequestHandler):
+    coordinator = None
+
+    def handle(self):
+        coordinator = self.coordinator
+        sock = self.request
+        # Three missed heartbeats and the worker is considered dead
+        sock.settimeout(coordinator.heartbeat * 3)
+        try:
+            hello, _ = recv_message(sock)
+            token = str(hello.get('token', ''))
+            if hello.get('type') != 'hello' or not hmac.compare_digest(token, coordinator.token):
+                send_message(sock, {'type': 'error', 'error': 'unauthorized'})
+                return
+            send_message(sock, {'type': 'spec', 'spec': coordinator.spec.to_dict(),
+                                'stream': coordinator.stream, 'heartbeat': coordinator.heartbeat})
+        except (OSError, ValueError):
+            return
+        name = hello.get('worker') or f"{self.client_address[0]}:{self.client_address[1]}"
+
+        while not coordinator.finished.is_set():
+            chunk = coordinator.next_chunk(coordinator.heartbeat)
+            if chunk is None:
+                continue
+            try:
+                blobs = []
+                if coordinator.stream:
+                    for input_path, _ in chunk['items']:
+                        try:
+                            with open(input_path, 'rb') as f:
+                                blobs.append(f.read())
+                        except OSError:
+                            blobs.append(b'')
+                send_message(sock, {'type': 'chunk', 'id': chunk['id'], 'items': chunk['items']}, blobs)
+                while True:
+                    header, blobs = recv_message(sock)
+                    if header.get('type') == 'result' and header.get('id') == chunk['id']:
+                        break
+                coordinator.complete(chunk, header['results'], blobs)
+            except (OSError, ValueError, KeyError) as e:
+                coordinator.fail(chunk, f"worker {name}: {e}")
+                return
+        try:
+            send_message(sock, {'type': 'done'})
+        except OSError:
+            pass
+
+
+def process_chunk(pool, writer, spec, header, blobs, stream):
+    futures = []
+    for index, (input_path, _) in enumerate(header['items']):
+        source = io.BytesIO(blobs[index]) if stream else input_path
+        futures.append(pool.submit(render_outputs, source, spec))
+
+    results, outputs = [], []
+    for (input_path, output_paths), future in zip(header['items'], futures):
+        try:
+            encoded = future.result()
+            reports = [output_report(data, path) for data, path in zip(encoded, output_paths)]
+            if stream:
+                outputs.extend(encoded)
             else:
-                new_width, new_height = self.width, self.height
-
-            resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            save_kwargs = {}
-            if self.format_type == 'JPEG':
-                save_kwargs['quality'] = self.quality
-                save_kwargs['optimize'] = True
-                if exif_data and self.preserve_meta:
-                    save_kwargs['exif'] = exif_data
-            elif self.format_type == 'WEBP':
-                save_kwargs['quality'] = self.quality
-                save_kwargs['method'] = 6
-            elif self.format_type == 'PNG':
-                save_kwargs['optimize'] = True
-
-            resized.save(self.output_path, **save_kwargs)
-            self.finished.emit(self.output_path)
+                for path, _, _ in reports:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                for written in [writer.submit(data, report[0]) for data, report in zip(encoded, reports)]:
+                    written.result()
+            results.append({'ok': True, 'passthrough': sum(isinstance(data, PassThrough) for data in encoded),
+                            'formats': [report[1] for report in reports],
+                            'notes': [note for report in reports for note in report[2]]})
         except Exception as e:
-            self.error.emit(str(e))
+            results.append({'ok': False, 'error': f"{os.path.basename(input_path)}: {e}"})
+    return results, outputs
+
+
+def run_worker(address, token='', processes=None):
+    # Connects to a coordinator and processes chunks until it says done or goes away
+    logger = console_logger()
+    sock = socket.create_connection(address)
+    send_message(sock, {'type': 'hello', 'worker': f"{socket.gethostname()}:{os.getpid()}", 'token': token})
+    header, _ = recv_message(sock)
+    if header.get('type') != 'spec':
+        sock.close()
+        raise ConnectionError(header.get('error', 'rejected by coordinator'))
+    spec = JobSpec.from_dict(header['spec'])
+    stream = header['stream']
+
+    send_lock = threading.Lock()
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(header['heartbeat']):
+            try:
+                with send_lock:
+                    send_message(sock, {'type': 'heartbeat'})
+            except OSError:
+                return
+
+    threading.Thread(target=beat, daemon=True).start()
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1, mp_context=ctx)
+    writer = OutputWriter(fsync=spec.fsync)
+    chunks = 0
+    try:
+        while True:
+            message, blobs = recv_message(sock)
+            if message.get('type') != 'chunk':
+                break
+            results, outputs = process_chunk(pool, writer, spec, message, blobs, stream)
+            with send_lock:
+                send_message(sock, {'type': 'result', 'id': message['id'], 'results': results}, outputs)
+            chunks += 1
+    except (ConnectionError, ValueError) as e:
+        logger.warning(f"Worker: coordinator connection lost: {e}")
+    finally:
+        stop.set()
+        sock.close()
+        writer.close()
+        pool.shutdown()
+    return chunks
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'  # '' (every interface) and other host names are not
+
+
+def run_coordinator(spec, paths, port=8766, bind='127.0.0.1', chunk_size=16, stream=False,
+                    local_workers=0, token='', heartbeat=5.0):
+    # Workers receive the job spec and, with stream, the source files: nobody else may connect
+    if not token and not is_loopback(bind):
+        raise ValueError(f"Listening on {bind or 'every interface'} needs a --token (or $IRP_TOKEN)")
+    logger = console_logger()
+
+    inputs = collect_inputs(paths)
+    writer = OutputWriter(fsync=spec.fsync)
+    items = [(path, spec.output_paths(path, writer)) for path in inputs]
+    if stream:
+        # Streamed outputs are written here; with shared storage the workers create the folders
+        for folder in {os.path.dirname(path) for _, output_paths in items for path in output_paths}:
+            os.makedirs(folder, exist_ok=True)
+    progress = BatchProgress(len(items) * len(spec.rules), max_lines=1)
+    coordinator = BatchCoordinator(items, spec, writer, progress, chunk_size, stream, heartbeat, token=token)
+
+    handler = type('Handler', (CoordinatorHandler,), {'coordinator': coordinator})
+    server = socketserver.ThreadingTCPServer((bind, port), handler)
+    server.daemon_threads = True
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Coordinator: {coordinator.remaining} chunks of {len(items)} images on {bind}:{port}")
+
+    # Local workers are plain worker processes on this machine, for testing or a single big box
+    ctx = multiprocessing.get_context("spawn")
+    processes = max(1, (os.cpu_count() or 1) // max(1, local_workers))
+    local = [ctx.Process(target=run_worker, args=(('127.0.0.1', port), token, processes))
+             for _ in range(local_workers)]
+    for process in local:
+        process.start()
+    try:
+        coordinator.finished.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+        for process in local:
+            process.join(heartbeat * 3)
+    logger.info(f"Batch: {progress.summary()}")
+    return 1 if progress.failed or not coordinator.finished.is_set() else 0
+
+
+# Runs a batch off the GUI thread
+class BatchRunner(QThread):
+    completed = pyqtSignal()
+
+    def __init__(self, items, spec, writer, progress, profile=None, niceness=0, sheet=None):
+        super().__init__()
+        self.items = items
+        self.spec = spec
+        self.writer = writer
+        self.state = progress
+        self.profile = profile
+        self.niceness = niceness
+        self.sheet = sheet
+
+    def run(self):
+        try:
+            run_batch(self.items, self.spec, self.writer, self.state, self.profile,
+                      niceness=self.niceness, sheet=self.sheet)
+        finally:
+            self.completed.emit()
 
 
 # Batch Processing Dialog
@@ -106,17 +3420,57 @@ class BatchDialog(QDialog):
         # Buttons
         btn_layout = QHBoxLayout()
         add_btn = QPushButton(parent.tr("Select Multiple Images"))
-        add_btn.setIcon(qta.icon('fa5s.images'))
+        add_btn.setIcon(qta_icon('fa5s.images'))
         add_btn.clicked.connect(self.add_files)
         btn_layout.addWidget(add_btn)
 
         clear_btn = QPushButton(parent.tr("Clear Queue"))
-        clear_btn.setIcon(qta.icon('fa5s.trash'))
+        clear_btn.setIcon(qta_icon('fa5s.trash'))
         clear_btn.clicked.connect(self.clear_queue)
         btn_layout.addWidget(clear_btn)
 
         layout.addLayout(btn_layout)
 
+        # Recipe: output rules for this batch; empty means "current settings"
+        self.recipe = None
+        recipe_layout = QHBoxLayout()
+        self.recipe_label = QLabel()
+        self.recipe_label.setWordWrap(True)
+        recipe_layout.addWidget(self.recipe_label, 1)
+
+        add_rule_btn = QPushButton(parent.tr("Add Output Rule"))
+        add_rule_btn.setIcon(qta_icon('fa5s.plus'))
+        add_rule_btn.setToolTip(parent.tr("Add the current size/format settings as another output"))
+        add_rule_btn.clicked.connect(self.add_rule)
+        recipe_layout.addWidget(add_rule_btn)
+
+        load_btn = QPushButton(parent.tr("Load Recipe"))
+        load_btn.setIcon(qta_icon('fa5s.file-import'))
+        load_btn.clicked.connect(self.load_recipe)
+        recipe_layout.addWidget(load_btn)
+
+        save_btn = QPushButton(parent.tr("Save Recipe"))
+        save_btn.setIcon(qta_icon('fa5s.save'))
+        save_btn.clicked.connect(self.save_recipe)
+        recipe_layout.addWidget(save_btn)
+
+        reset_btn = QPushButton(parent.tr("Reset"))
+        reset_btn.clicked.connect(self.reset_recipe)
+        recipe_layout.addWidget(reset_btn)
+        layout.addLayout(recipe_layout)
+        self.update_recipe_label()
+
+        # Contact sheet of the smallest output, written next to the outputs
+        sheet_layout = QHBoxLayout()
+        self.sheet_check = QCheckBox(parent.tr("Contact Sheet"))
+        self.sheet_check.setToolTip(parent.tr("Also write contact_sheet.png and a JSON index of where each image is"))
+        sheet_layout.addWidget(self.sheet_check)
+        self.sheet_combo = QComboBox()
+        self.sheet_combo.addItems([parent.tr("Grid"), parent.tr("Sprite Atlas")])
+        sheet_layout.addWidget(self.sheet_combo)
+        sheet_layout.addStretch()
+        layout.addLayout(sheet_layout)
+
         # Progress
         self.batch_progress = QProgressBar()
         self.batch_progress.setVisible(False)
@@ -124,9 +3478,9 @@ class BatchDialog(QDialog):
 
         # Start button
         self.start_batch_btn = QPushButton(parent.tr("Start Batch"))
-        self.start_batch_btn.setIcon(qta.icon('fa5s.play-circle'))
+        self.start_batch_btn.setIcon(qta_icon('fa5s.play-circle'))
         self.start_batch_btn.clicked.connect(self.start_batch)
-        self.start_batch_btn.setStyleSheet(parent.create_action_button("", "", None, "").styleSheet())
+        self.start_batch_btn.setStyleSheet(parent.action_button_style())
         layout.addWidget(self.start_batch_btn)
 
         # Close
@@ -150,79 +3504,222 @@ class BatchDialog(QDialog):
         self.queue.clear()
         self.list_widget.clear()
 
-    def start_batch(self):
-        if not self.queue:
-            QMessageBox.warning(self, "Warning", self.parent.tr("Queue is empty!"))
+    def current_spec(self):
+        # Frozen at batch start: editing the main window mid-batch can't change later outputs
+        if self.recipe:
+            return self.recipe
+        return self.parent.current_spec()
+
+    def update_recipe_label(self):
+        if self.recipe:
+            rules = ", ".join(f"{r.format_type} {r.width}×{r.height}" for r in self.recipe.rules)
+            self.recipe_label.setText(self.parent.tr("Outputs:") + f" {rules}")
+        else:
+            self.recipe_label.setText(self.parent.tr("Outputs:") + " " + self.parent.tr("current settings"))
+
+    def add_rule(self):
+        rule = self.parent.current_rule()
+        rule = dataclasses.replace(rule, suffix=f"_{rule.width}x{rule.height}")
+        try:
+            if self.recipe:
+                self.recipe = dataclasses.replace(self.recipe, rules=self.recipe.rules + (rule,))
+            else:
+                self.recipe = dataclasses.replace(self.parent.current_spec(), rules=(rule,))
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", str(e))
             return
+        self.update_recipe_label()
 
-        self.start_batch_btn.setEnabled(False)
-        self.batch_progress.setVisible(True)
-        self.batch_progress.setMaximum(len(self.queue))
-        self.current_index = 0
-        self.process_next()
-
-    def process_next(self):
-        if self.current_index >= len(self.queue):
-            self.batch_progress.setValue(self.batch_progress.maximum())
-            QMessageBox.information(self, "Success", self.parent.tr("Batch completed!"))
-            self.start_batch_btn.setEnabled(True)
-            self.batch_progress.setVisible(False)
+    def reset_recipe(self):
+        self.recipe = None
+        self.update_recipe_label()
+
+    def load_recipe(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, self.parent.tr("Load Recipe"), "", "Recipes (*.json *.toml)"
+        )
+        if not path:
             return
+        try:
+            self.recipe = JobSpec.load(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+        self.parent.log(f"Recipe: {path}")
+        self.update_recipe_label()
 
-        path = self.queue[self.current_index]
-        output_folder = self.parent.output_folder or os.path.dirname(path)
-        base_name = os.path.splitext(os.path.basename(path))[0]
-        ext = self.parent.format_combo.currentText().split()[-1].lower()
-        if ext == 'jpeg': ext = 'jpg'
-        output_path = os.path.join(output_folder, f"{base_name}_resized.{ext}")
-
-        worker = ResizeWorker(
-            path, output_path,
-            self.parent.width_spin.value(), self.parent.height_spin.value(),
-            self.parent.aspect_check.isChecked(), self.parent.quality_spin.value(),
-            self.parent.format_combo.currentText().split()[-1], self.parent.meta_check.isChecked()
+    def save_recipe(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, self.parent.tr("Save Recipe"), "recipe.json", "Recipes (*.json *.toml)"
         )
-        worker.finished.connect(lambda p: self.on_batch_item_done(p, True))
-        worker.error.connect(lambda e: self.on_batch_item_done(e, False))
-        worker.start()
+        if not path:
+            return
+        try:
+            self.current_spec().save(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+        self.parent.log(f"Recipe saved: {path}")
 
-        self.batch_progress.setValue(self.current_index)
-        self.current_index += 1
+    def start_batch(self):
+        if not self.queue:
+            QMessageBox.warning(self, "Warning", self.parent.tr("Queue is empty!"))
+            return
 
-    def on_batch_item_done(self, result, success):
-        if success:
-            self.parent.log(f"Batch: {os.path.basename(result)}")
-        else:
-            self.parent.log(f"Batch Error: {result}")
-        self.process_next()
+        try:
+            spec = self.current_spec()
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", str(e))
+            return
+        writer = OutputWriter(fsync=spec.fsync)
+        items = [(path, spec.output_paths(path, writer)) for path in self.queue]
+
+        self.start_batch_btn.setEnabled(False)
+        self.batch_progress.setVisible(True)
+        self.batch_progress.setMaximum(len(items) * len(spec.rules))
+        self.batch_progress.setValue(0)
+
+        self.state = BatchProgress(self.batch_progress.maximum(), max_lines=self.parent.LOG_VIEW_LINES)
+        profile_mode = self.parent.profile_mode()
+        profile = BatchProfile(profile_mode) if profile_mode != 'off' else None
+        sheet = None
+        if self.sheet_check.isChecked():
+            folder = spec.output_folder or os.path.dirname(self.queue[0])
+            sheet = ContactSheet(os.path.join(folder, "contact_sheet.png"), spec,
+                                 SHEET_LAYOUTS[self.sheet_combo.currentIndex()])
+        self.runner = BatchRunner(items, spec, writer, self.state, profile, self.parent.batch_niceness(), sheet)
+        self.runner.completed.connect(self.finish_batch)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(100)
+        self.poll_timer.timeout.connect(self.poll_progress)
+        self.poll_timer.start()
+        self.runner.start()
+
+    def poll_progress(self):
+        done, failed, lines = self.state.drain()
+        self.batch_progress.setValue(done)
+        self.parent.append_log_lines(lines)
+
+    def finish_batch(self):
+        self.poll_timer.stop()
+        self.poll_progress()
+        self.parent.log(f"Batch: {self.state.summary()}")
+        self.batch_progress.setValue(self.batch_progress.maximum())
+        QMessageBox.information(self, "Success", self.parent.tr("Batch completed!"))
+        self.start_batch_btn.setEnabled(True)
+        self.batch_progress.setVisible(False)
 
 
 # Main Application Window
 class ImageResizerApp(QMainWindow):
+    LANGUAGES = ['en', 'fa', 'zh', 'ru']
+    THEMES = ['light', 'dark', 'system', 'red', 'blue']
+    LOG_VIEW_LINES = 5000
+    FORMAT_LABELS = ["JPEG", "PNG", "WEBP", "Auto (smallest)", "TIFF"]
+    SSIM_LABELS = ["Fixed Quality", "Adaptive (SSIM ≥ 0.99)", "Adaptive (SSIM ≥ 0.98)", "Adaptive (SSIM ≥ 0.95)"]
+    WATERMARK_LABELS = ["Bottom Right", "Bottom Left", "Top Right", "Top Left", "Center"]
+
     def __init__(self):
         super().__init__()
-        self.translators = {}
+        # Widgets are built in English; load_settings() retranslates to the saved language
         self.current_lang = 'en'
         self.input_path = None
         self.output_folder = None
         self.original_ratio = 1.0
         self.settings = QSettings("ImageResizerPro", "Settings")
         self.worker = None
+        self.pyramid_worker = None
         self.batch_dialog = None
-
-        # Initialize
+        self.log_text = None
+        self.pending_log = []
+        self.pending_icons = []
+        self.icons_ready = False
+        self.deferred_tabs = {}
+        self.first_paint_done = False
+        self.startup_profile = False
+
+        # Initialize: only what the first paint needs. Icons, the hidden tabs and
+        # their settings are filled in by finish_startup() once the window is up.
+        self.init_logging()
         self.init_translations()
         self.init_ui()
-        self.load_settings()  # Must come after init_ui() because it uses self.theme_group
+        self.load_settings()
         self.apply_theme()
         self.setup_shortcuts()
 
-    def init_translations(self):
-        # English
-        self.translators['en'] = {}
+    def saved_language(self):
+        lang = self.settings.value("language", "en")
+        return lang if lang in self.LANGUAGES else 'en'
+
+    def event(self, event):
+        if event.type() == QEvent.Type.Paint and not self.first_paint_done:
+            self.first_paint_done = True
+            STARTUP_MARKS.append(("first paint", time.perf_counter()))
+            QTimer.singleShot(0, self.finish_startup)
+        return super().event(event)
+
+    def finish_startup(self):
+        load_numpy()
+        self.load_icons()
+        self.build_deferred_tabs()
+        STARTUP_MARKS.append(("deferred startup", time.perf_counter()))
+        if self.startup_profile:
+            print_startup_profile()
+            QApplication.instance().quit()
+
+    def deferred_icon(self, apply, *icon_args, **icon_kwargs):
+        if self.icons_ready:
+            self.apply_icon(apply, icon_args, icon_kwargs)
+        else:
+            self.pending_icons.append((apply, icon_args, icon_kwargs))
 
-        # Persian
-        self.translators['fa'] = {
+    def apply_icon(self, apply, icon_args, icon_kwargs):
+        try:
+            apply(qta_icon(*icon_args, **icon_kwargs))
+        except Exception:
+            pass  # missing glyph: keep the text-only widget
+
+    def load_icons(self):
+        self.icons_ready = True
+        pending, self.pending_icons = self.pending_icons, []
+        for apply, icon_args, icon_kwargs in pending:
+            self.apply_icon(apply, icon_args, icon_kwargs)
+
+    def add_deferred_tab(self, builder, title, icon_name, color):
+        page = QWidget()
+        index = self.tabs.addTab(page, self.tr(title))
+        self.deferred_icon(lambda icon: self.tabs.setTabIcon(index, icon), icon_name, color=color)
+        self.deferred_tabs[index] = builder
+
+    def build_deferred_tabs(self):
+        if not self.deferred_tabs:
+            return
+        # Build in English like the rest of the UI, then retranslate in one pass
+        lang, self.current_lang = self.current_lang, 'en'
+        try:
+            for index, builder in sorted(self.deferred_tabs.items()):
+                builder(self.tabs.widget(index))
+        finally:
+            self.current_lang = lang
+        self.deferred_tabs = {}
+        self.load_tab_settings()
+        if lang != 'en':
+            self.retranslate_ui()
+
+    def init_translations(self):
+        # Only the saved language is built; others load on first switch
+        self.translators = {'en': {}}
+        self.load_translation(self.saved_language())
+
+    def load_translation(self, lang):
+        if lang not in self.translators:
+            loader = getattr(self, f"translations_{lang}", None)
+            self.translators[lang] = loader() if loader else {}
+        return self.translators[lang]
+
+    # Persian
+    def translations_fa(self):
+        return {
             "Image Resizer Pro": "تغییر اندازه حرفه‌ای تصویر",
             "Select Image": "انتخاب تصویر",
             "Output Folder": "پوشه خروجی",
@@ -260,6 +3757,7 @@ class ImageResizerApp(QMainWindow):
             "JPEG": "JPEG",
             "PNG": "PNG",
             "WEBP": "WEBP",
+            "Auto (smallest)": "خودکار (کوچک‌ترین)",
             "Preserve Metadata": "حفظ متادیتا",
             "High Performance Mode": "حالت عملکرد بالا",
             "Open Output Folder": "باز کردن پوشه خروجی",
@@ -283,6 +3781,8 @@ class ImageResizerApp(QMainWindow):
             "Percentage": "درصد",
             "Scale by percentage": "تغییر اندازه بر اساس درصد",
             "Batch Processing": "پردازش دسته‌ای",
+            "Build Tile Pyramid": "ساخت هرم کاشی",
+            "Tile pyramid done:": "هرم کاشی ساخته شد:",
             "Select Multiple Images": "انتخاب چندین تصویر",
             "Queue": "صف",
             "Clear Queue": "پاک کردن صف",
@@ -294,12 +3794,59 @@ class ImageResizerApp(QMainWindow):
             "Input": "ورودی",
             "Output": "خروجی",
             "Quality": "کیفیت",
+            "Fixed Quality": "کیفیت ثابت",
+            "Adaptive (SSIM ≥ 0.99)": "تطبیقی (SSIM ≥ 0.99)",
+            "Adaptive (SSIM ≥ 0.98)": "تطبیقی (SSIM ≥ 0.98)",
+            "Adaptive (SSIM ≥ 0.95)": "تطبیقی (SSIM ≥ 0.95)",
+            "Adaptive: lowest JPEG/WebP quality that keeps the target SSIM, capped at the quality above": "تطبیقی: کمترین کیفیت JPEG/WebP که SSIM هدف را حفظ کند، حداکثر تا کیفیت بالا",
             "Close": "بستن",
             "Warning": "هشدار",
+            "Off": "خاموش",
+            "Each file": "هر فایل",
+            "Batched": "دسته‌ای",
+            "Durable Writes": "نوشتن پایدار",
+            "Batch Workers": "پردازش‌های موازی",
+            "CPU (cProfile)": "پردازنده (cProfile)",
+            "Memory (tracemalloc)": "حافظه (tracemalloc)",
+            "CPU + Memory": "پردازنده + حافظه",
+            "Batch Profiling": "پروفایل‌گیری دسته‌ای",
+            "Low Priority Batches": "پردازش دسته‌ای با اولویت پایین",
+            "Profile batch workers and write a hotspot summary to the Logs tab": "پروفایل‌گیری از پردازش‌های دسته‌ای و نوشتن خلاصه نقاط داغ در زبانه گزارش‌ها",
+            "Add Output Rule": "افزودن قانون خروجی",
+            "Load Recipe": "بارگذاری دستور",
+            "Save Recipe": "ذخیره دستور",
+            "Outputs:": "خروجی‌ها:",
+            "current settings": "تنظیمات فعلی",
+            "Fit": "جای‌گیری",
+            "Contain": "درون کادر",
+            "Cover": "پوشش کامل",
+            "Pad": "حاشیه‌دار",
+            "Smart Crop": "برش هوشمند",
+            "Never Upscale": "بدون بزرگ‌نمایی",
+            "Keep images that are already small enough at their own size": "تصاویری که به اندازه کافی کوچک هستند در اندازه خودشان می‌مانند",
+            "Ignore Color Profile": "نادیده گرفتن پروفایل رنگ",
+            "Convert to sRGB": "تبدیل به sRGB",
+            "Embed Source Profile": "جاسازی پروفایل مبدأ",
+            "Smaller PNG (256 colors)": "PNG کوچک‌تر (۲۵۶ رنگ)",
+            "Background": "پس‌زمینه",
+            "Watermark": "واترمارک",
+            "Contact Sheet": "برگه تصاویر بندانگشتی",
+            "Grid": "شبکه",
+            "Sprite Atlas": "اطلس اسپرایت",
+            "16-bit PNG/TIFF": "PNG/TIFF ۱۶ بیتی",
+            "Watermark text or image": "متن یا تصویر واترمارک",
+            "Bottom Right": "پایین راست",
+            "Bottom Left": "پایین چپ",
+            "Top Right": "بالا راست",
+            "Top Left": "بالا چپ",
+            "Center": "وسط",
+            "Quantize PNG output to a palette: much smaller files, slight color loss": "تبدیل خروجی PNG به پالت: فایل‌های بسیار کوچک‌تر، کمی افت رنگ",
+            "Color that transparent areas are flattened onto for JPEG": "رنگی که نواحی شفاف در JPEG روی آن قرار می‌گیرند",
         }
 
-        # Chinese
-        self.translators['zh'] = {
+    # Chinese
+    def translations_zh(self):
+        return {
             "Image Resizer Pro": "专业图像缩放器",
             "Select Image": "选择图像",
             "Output Folder": "输出文件夹",
@@ -337,6 +3884,7 @@ class ImageResizerApp(QMainWindow):
             "JPEG": "JPEG",
             "PNG": "PNG",
             "WEBP": "WEBP",
+            "Auto (smallest)": "自动（最小）",
             "Preserve Metadata": "保留元数据",
             "High Performance Mode": "高性能模式",
             "Open Output Folder": "打开输出文件夹",
@@ -360,6 +3908,8 @@ class ImageResizerApp(QMainWindow):
             "Percentage": "百分比",
             "Scale by percentage": "按百分比缩放",
             "Batch Processing": "批量处理",
+            "Build Tile Pyramid": "生成瓦片金字塔",
+            "Tile pyramid done:": "瓦片金字塔已完成：",
             "Select Multiple Images": "选择多个图像",
             "Queue": "队列",
             "Clear Queue": "清除队列",
@@ -371,12 +3921,59 @@ class ImageResizerApp(QMainWindow):
             "Input": "输入",
             "Output": "输出",
             "Quality": "质量",
+            "Fixed Quality": "固定质量",
+            "Adaptive (SSIM ≥ 0.99)": "自适应（SSIM ≥ 0.99）",
+            "Adaptive (SSIM ≥ 0.98)": "自适应（SSIM ≥ 0.98）",
+            "Adaptive (SSIM ≥ 0.95)": "自适应（SSIM ≥ 0.95）",
+            "Adaptive: lowest JPEG/WebP quality that keeps the target SSIM, capped at the quality above": "自适应：满足目标 SSIM 的最低 JPEG/WebP 质量，上限为上方的质量值",
             "Close": "关闭",
             "Warning": "警告",
+            "Off": "关闭",
+            "Each file": "每个文件",
+            "Batched": "批量",
+            "Durable Writes": "持久写入",
+            "Batch Workers": "批处理进程数",
+            "CPU (cProfile)": "CPU（cProfile）",
+            "Memory (tracemalloc)": "内存（tracemalloc）",
+            "CPU + Memory": "CPU + 内存",
+            "Batch Profiling": "批处理性能分析",
+            "Low Priority Batches": "低优先级批处理",
+            "Profile batch workers and write a hotspot summary to the Logs tab": "分析批处理进程并将热点摘要写入日志标签页",
+            "Add Output Rule": "添加输出规则",
+            "Load Recipe": "加载配方",
+            "Save Recipe": "保存配方",
+            "Outputs:": "输出：",
+            "current settings": "当前设置",
+            "Fit": "适配",
+            "Contain": "包含",
+            "Cover": "覆盖",
+            "Pad": "填充",
+            "Smart Crop": "智能裁剪",
+            "Never Upscale": "从不放大",
+            "Keep images that are already small enough at their own size": "已经足够小的图像保持原尺寸",
+            "Ignore Color Profile": "忽略颜色配置文件",
+            "Convert to sRGB": "转换为 sRGB",
+            "Embed Source Profile": "嵌入源配置文件",
+            "Smaller PNG (256 colors)": "更小的 PNG（256 色）",
+            "Background": "背景",
+            "Watermark": "水印",
+            "Contact Sheet": "缩略图总览",
+            "Grid": "网格",
+            "Sprite Atlas": "精灵图集",
+            "16-bit PNG/TIFF": "16 位 PNG/TIFF",
+            "Watermark text or image": "水印文字或图片",
+            "Bottom Right": "右下",
+            "Bottom Left": "左下",
+            "Top Right": "右上",
+            "Top Left": "左上",
+            "Center": "居中",
+            "Quantize PNG output to a palette: much smaller files, slight color loss": "将 PNG 输出量化为调色板：文件小得多，颜色略有损失",
+            "Color that transparent areas are flattened onto for JPEG": "JPEG 中透明区域合成到的背景色",
         }
 
-        # Russian
-        self.translators['ru'] = {
+    # Russian
+    def translations_ru(self):
+        return {
             "Image Resizer Pro": "Профессиональный ресайзер изображений",
             "Select Image": "Выбрать изображение",
             "Output Folder": "Папка вывода",
@@ -414,6 +4011,7 @@ class ImageResizerApp(QMainWindow):
             "JPEG": "JPEG",
             "PNG": "PNG",
             "WEBP": "WEBP",
+            "Auto (smallest)": "Авто (наименьший)",
             "Preserve Metadata": "Сохранить метаданные",
             "High Performance Mode": "Режим высокой производительности",
             "Open Output Folder": "Открыть папку вывода",
@@ -437,6 +4035,8 @@ class ImageResizerApp(QMainWindow):
             "Percentage": "Процент",
             "Scale by percentage": "Масштабировать по проценту",
             "Batch Processing": "Пакетная обработка",
+            "Build Tile Pyramid": "Построить пирамиду тайлов",
+            "Tile pyramid done:": "Пирамида тайлов готова:",
             "Select Multiple Images": "Выбрать несколько изображений",
             "Queue": "Очередь",
             "Clear Queue": "Очистить очередь",
@@ -448,18 +4048,64 @@ class ImageResizerApp(QMainWindow):
             "Input": "Вход",
             "Output": "Выход",
             "Quality": "Качество",
+            "Fixed Quality": "Фиксированное качество",
+            "Adaptive (SSIM ≥ 0.99)": "Адаптивно (SSIM ≥ 0.99)",
+            "Adaptive (SSIM ≥ 0.98)": "Адаптивно (SSIM ≥ 0.98)",
+            "Adaptive (SSIM ≥ 0.95)": "Адаптивно (SSIM ≥ 0.95)",
+            "Adaptive: lowest JPEG/WebP quality that keeps the target SSIM, capped at the quality above": "Адаптивно: наименьшее качество JPEG/WebP, сохраняющее целевой SSIM, не выше указанного качества",
             "Close": "Закрыть",
             "Warning": "Предупреждение",
+            "Off": "Выкл.",
+            "Each file": "Каждый файл",
+            "Batched": "Пакетно",
+            "Durable Writes": "Надёжная запись",
+            "Batch Workers": "Процессы пакета",
+            "CPU (cProfile)": "ЦП (cProfile)",
+            "Memory (tracemalloc)": "Память (tracemalloc)",
+            "CPU + Memory": "ЦП + память",
+            "Batch Profiling": "Профилирование пакета",
+            "Low Priority Batches": "Пакеты с низким приоритетом",
+            "Profile batch workers and write a hotspot summary to the Logs tab": "Профилировать процессы пакета и выводить сводку горячих точек во вкладку журнала",
+            "Add Output Rule": "Добавить правило вывода",
+            "Load Recipe": "Загрузить рецепт",
+            "Save Recipe": "Сохранить рецепт",
+            "Outputs:": "Выходы:",
+            "current settings": "текущие настройки",
+            "Fit": "Вписывание",
+            "Contain": "Вписать",
+            "Cover": "Заполнить",
+            "Pad": "С полями",
+            "Smart Crop": "Умная обрезка",
+            "Never Upscale": "Не увеличивать",
+            "Keep images that are already small enough at their own size": "Достаточно маленькие изображения остаются в своём размере",
+            "Ignore Color Profile": "Игнорировать цветовой профиль",
+            "Convert to sRGB": "Преобразовать в sRGB",
+            "Embed Source Profile": "Встроить исходный профиль",
+            "Smaller PNG (256 colors)": "Меньший PNG (256 цветов)",
+            "Background": "Фон",
+            "Watermark": "Водяной знак",
+            "Contact Sheet": "Контактный лист",
+            "Grid": "Сетка",
+            "Sprite Atlas": "Атлас спрайтов",
+            "16-bit PNG/TIFF": "16-битные PNG/TIFF",
+            "Watermark text or image": "Текст или изображение водяного знака",
+            "Bottom Right": "Справа внизу",
+            "Bottom Left": "Слева внизу",
+            "Top Right": "Справа вверху",
+            "Top Left": "Слева вверху",
+            "Center": "По центру",
+            "Quantize PNG output to a palette: much smaller files, slight color loss": "Квантовать PNG в палитру: намного меньше файлы, небольшая потеря цвета",
+            "Color that transparent areas are flattened onto for JPEG": "Цвет, на который накладываются прозрачные области в JPEG",
         }
 
     def tr(self, text):
         if self.current_lang == 'en':
             return text
-        return self.translators.get(self.current_lang, {}).get(text, text)
+        return self.load_translation(self.current_lang).get(text, text)
 
     def init_ui(self):
         self.setWindowTitle(self.tr("Image Resizer Pro"))
-        self.setWindowIcon(qta.icon('fa5s.images', color='#0078D4'))
+        self.deferred_icon(self.setWindowIcon, 'fa5s.images', color='#0078D4')
         self.resize(1300, 850)
         self.setMinimumSize(1100, 700)
 
@@ -491,7 +4137,7 @@ class ImageResizerApp(QMainWindow):
         self.header_frame.setStyleSheet("background: qlineargradient(x1:0, y1:0, x2:1, y2:1, stop:0 #0078D4, stop:1 #106EBE); border-radius: 16px; padding: 16px;")
         header_layout = QHBoxLayout(self.header_frame)
         icon_label = QLabel()
-        icon_label.setPixmap(qta.icon('fa5s.images', color='white').pixmap(56, 56))
+        self.deferred_icon(lambda icon: icon_label.setPixmap(icon.pixmap(56, 56)), 'fa5s.images', color='white')
         header_layout.addWidget(icon_label)
 
         self.title_label = QLabel(self.tr("Image Resizer Pro"))
@@ -561,6 +4207,17 @@ class ImageResizerApp(QMainWindow):
         dim_layout.addWidget(self.height_spin, 1, 1)
         dim_layout.addWidget(self.aspect_check, 2, 0, 1, 2)
 
+        self.fit_combo = QComboBox()
+        self.fit_combo.addItems([self.tr("Contain"), self.tr("Cover"), self.tr("Pad"), self.tr("Smart Crop")])
+        self.fit_combo.setStyleSheet(self.combo_style())
+        self.fit_combo.setToolTip(self.tr("How the image fills the box when the aspect ratio is kept"))
+        dim_layout.addWidget(QLabel(self.tr("Fit") + ":"), 3, 0)
+        dim_layout.addWidget(self.fit_combo, 3, 1)
+
+        self.no_upscale_check = QCheckBox(self.tr("Never Upscale"))
+        self.no_upscale_check.setToolTip(self.tr("Keep images that are already small enough at their own size"))
+        dim_layout.addWidget(self.no_upscale_check, 4, 0, 1, 2)
+
         left_layout.addWidget(dim_group)
 
         # Quality & Format
@@ -573,12 +4230,17 @@ class ImageResizerApp(QMainWindow):
         self.quality_spin.setStyleSheet(self.spin_style())
         self.quality_spin.setToolTip(self.tr("Image quality (higher = better)"))
         q_layout.addRow(self.tr("Quality") + ":", self.quality_spin)
+        self.ssim_combo = QComboBox()
+        self.ssim_combo.addItems([self.tr(text) for text in self.SSIM_LABELS])
+        self.ssim_combo.setStyleSheet(self.combo_style())
+        self.ssim_combo.setToolTip(self.tr("Adaptive: lowest JPEG/WebP quality that keeps the target SSIM, capped at the quality above"))
+        q_layout.addRow(self.ssim_combo)
         quality_format.addWidget(quality_group)
 
         format_group = self.create_group(self.tr("Format"))
         f_layout = QHBoxLayout(format_group)
         self.format_combo = QComboBox()
-        self.format_combo.addItems([self.tr("JPEG"), self.tr("PNG"), self.tr("WEBP")])
+        self.format_combo.addItems([self.tr(text) for text in self.FORMAT_LABELS])
         self.format_combo.setStyleSheet(self.combo_style())
         self.format_combo.setToolTip(self.tr("Output image format"))
         f_layout.addWidget(self.format_combo)
@@ -592,9 +4254,55 @@ class ImageResizerApp(QMainWindow):
         self.meta_check = QCheckBox(self.tr("Preserve Metadata"))
         self.meta_check.setChecked(True)
         self.meta_check.setToolTip(self.tr("Keep EXIF, IPTC, XMP data"))
+        self.color_combo = QComboBox()
+        self.color_combo.addItems([self.tr("Ignore Color Profile"), self.tr("Convert to sRGB"), self.tr("Embed Source Profile")])
+        self.color_combo.setStyleSheet(self.combo_style())
+        self.color_combo.setToolTip(self.tr("What to do with embedded ICC profiles (Adobe RGB, Display P3, ...)"))
         self.perf_check = QCheckBox(self.tr("High Performance Mode"))
         self.perf_check.setToolTip(self.tr("Use faster but lower quality resampling"))
+        self.png_palette_check = QCheckBox(self.tr("Smaller PNG (256 colors)"))
+        self.png_palette_check.setToolTip(self.tr("Quantize PNG output to a palette: much smaller files, slight color loss"))
+        self.background_color = '#FFFFFF'
+        self.background_btn = QPushButton(self.tr("Background"))
+        self.background_btn.setToolTip(self.tr("Color that transparent areas are flattened onto for JPEG"))
+        self.background_btn.clicked.connect(self.select_background)
+        self.update_background_button()
         adv_layout.addWidget(self.meta_check)
+        adv_layout.addWidget(self.color_combo)
+        adv_layout.addWidget(self.png_palette_check)
+        self.high_bit_check = QCheckBox(self.tr("16-bit PNG/TIFF"))
+        self.high_bit_check.setToolTip(self.tr("Keep 16 bits per channel in PNG and TIFF output; other formats are dithered to 8 bits"))
+        adv_layout.addWidget(self.high_bit_check)
+        adv_layout.addWidget(self.background_btn)
+
+        watermark_row = QHBoxLayout()
+        self.watermark_edit = QLineEdit()
+        self.watermark_edit.setPlaceholderText(self.tr("Watermark text or image"))
+        self.watermark_edit.setToolTip(self.tr("Text, or the path of a PNG logo, drawn on every output"))
+        watermark_row.addWidget(self.watermark_edit, 1)
+        watermark_btn = QPushButton(self.tr("Browse"))
+        watermark_btn.clicked.connect(self.select_watermark)
+        watermark_row.addWidget(watermark_btn)
+        adv_layout.addLayout(watermark_row)
+
+        watermark_options = QHBoxLayout()
+        self.watermark_position_combo = QComboBox()
+        self.watermark_position_combo.addItems([self.tr(text) for text in self.WATERMARK_LABELS])
+        self.watermark_position_combo.setStyleSheet(self.combo_style())
+        watermark_options.addWidget(self.watermark_position_combo, 1)
+        self.watermark_opacity_spin = QSpinBox()
+        self.watermark_opacity_spin.setRange(5, 100)
+        self.watermark_opacity_spin.setValue(50)
+        self.watermark_opacity_spin.setSuffix("%")
+        self.watermark_opacity_spin.setToolTip(self.tr("Watermark opacity"))
+        watermark_options.addWidget(self.watermark_opacity_spin)
+        self.watermark_scale_spin = QSpinBox()
+        self.watermark_scale_spin.setRange(5, 100)
+        self.watermark_scale_spin.setValue(20)
+        self.watermark_scale_spin.setSuffix("%")
+        self.watermark_scale_spin.setToolTip(self.tr("Watermark width relative to the output width"))
+        watermark_options.addWidget(self.watermark_scale_spin)
+        adv_layout.addLayout(watermark_options)
         adv_layout.addWidget(self.perf_check)
         left_layout.addWidget(adv_group)
 
@@ -655,20 +4363,45 @@ class ImageResizerApp(QMainWindow):
         info_layout.addRow(self.tr("New Size:"), self.new_size_label)
         preview_layout.addWidget(info_frame)
 
-        self.tabs.addTab(preview_tab, qta.icon('fa5s.eye', color='#0078D4'), self.tr("Preview"))
+        self.tabs.addTab(preview_tab, self.tr("Preview"))
+        self.deferred_icon(lambda icon: self.tabs.setTabIcon(0, icon), 'fa5s.eye', color='#0078D4')
+
+        # Hidden tabs are built right after the first paint, or when first opened
+        self.add_deferred_tab(self.build_logs_tab, "Logs", 'fa5s.file-alt', '#6C757D')
+        self.add_deferred_tab(self.build_settings_tab, "Settings", 'fa5s.cog', '#6C757D')
+        self.add_deferred_tab(self.build_help_tab, "Help", 'fa5s.question-circle', '#17A2B8')
+        self.tabs.currentChanged.connect(self.build_deferred_tabs)
 
-        # Logs Tab
-        logs_tab = QWidget()
-        logs_layout = QVBoxLayout(logs_tab)
-        self.log_text = QTextEdit()
+        splitter.addWidget(left_panel)
+        splitter.addWidget(self.tabs)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 7)
+
+        # Menu Bar
+        self.create_menus()
+
+        # Add shadow effects
+        self.add_shadow(self.header_frame)
+        self.add_shadow(input_group)
+        self.add_shadow(dim_group)
+        self.add_shadow(quality_group)
+        self.add_shadow(format_group)
+        self.add_shadow(adv_group)
+
+    def build_logs_tab(self, page):
+        logs_layout = QVBoxLayout(page)
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        # Ring buffer: Qt drops the oldest lines past this count; the full log is on disk
+        self.log_text.setMaximumBlockCount(self.LOG_VIEW_LINES)
         self.log_text.setStyleSheet("font-family: Consolas; font-size: 10pt; background: #1E1E1E; color: #D4D4D4; border-radius: 12px;")
         logs_layout.addWidget(self.log_text)
-        self.tabs.addTab(logs_tab, qta.icon('fa5s.file-alt', color='#6C757D'), self.tr("Logs"))
+        if self.pending_log:
+            self.log_text.appendPlainText("\n".join(self.pending_log))
+            self.pending_log = []
 
-        # Settings Tab
-        settings_tab = QWidget()
-        settings_layout = QFormLayout(settings_tab)
+    def build_settings_tab(self, page):
+        settings_layout = QFormLayout(page)
         settings_layout.setLabelAlignment(Qt.AlignmentFlag.AlignRight)
 
         # Language
@@ -698,33 +4431,35 @@ class ImageResizerApp(QMainWindow):
         theme_layout.addLayout(theme_hbox)
         settings_layout.addRow(theme_layout)
 
-        self.tabs.addTab(settings_tab, qta.icon('fa5s.cog', color='#6C757D'), self.tr("Settings"))
-
-        # Help Tab
-        help_tab = QWidget()
-        help_layout = QVBoxLayout(help_tab)
-        help_browser = QTextEdit()
-        help_browser.setHtml(self.get_help_text())
-        help_browser.setReadOnly(True)
-        help_browser.setStyleSheet("background: #F8F9FA; border: none; border-radius: 12px;")
-        help_layout.addWidget(help_browser)
-        self.tabs.addTab(help_tab, qta.icon('fa5s.question-circle', color='#17A2B8'), self.tr("Help"))
-
-        splitter.addWidget(left_panel)
-        splitter.addWidget(self.tabs)
-        splitter.setStretchFactor(0, 3)
-        splitter.setStretchFactor(1, 7)
-
-        # Menu Bar
-        self.create_menus()
-
-        # Add shadow effects
-        self.add_shadow(self.header_frame)
-        self.add_shadow(input_group)
-        self.add_shadow(dim_group)
-        self.add_shadow(quality_group)
-        self.add_shadow(format_group)
-        self.add_shadow(adv_group)
+        # Output durability
+        self.fsync_combo = QComboBox()
+        self.fsync_combo.addItems([self.tr("Off"), self.tr("Each file"), self.tr("Batched")])
+        self.fsync_combo.setToolTip(self.tr("fsync outputs before they replace the final file"))
+        settings_layout.addRow(self.tr("Durable Writes") + ":", self.fsync_combo)
+
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        self.workers_spin.setToolTip(self.tr("Parallel processes used for batch processing"))
+        settings_layout.addRow(self.tr("Batch Workers") + ":", self.workers_spin)
+
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems([self.tr("Off"), self.tr("CPU (cProfile)"), self.tr("Memory (tracemalloc)"), self.tr("CPU + Memory")])
+        self.profile_combo.setToolTip(self.tr("Profile batch workers and write a hotspot summary to the Logs tab"))
+        settings_layout.addRow(self.tr("Batch Profiling") + ":", self.profile_combo)
+
+        self.low_priority_check = QCheckBox(self.tr("Low Priority Batches"))
+        self.low_priority_check.setChecked(True)
+        self.low_priority_check.setToolTip(self.tr("Run batch workers at lower OS priority so previews and single resizes stay responsive"))
+        settings_layout.addRow(self.low_priority_check)
+
+    def build_help_tab(self, page):
+        help_layout = QVBoxLayout(page)
+        self.help_browser = QTextEdit()
+        self.help_browser.setHtml(self.get_help_text())
+        self.help_browser.setReadOnly(True)
+        self.help_browser.setStyleSheet("background: #F8F9FA; border: none; border-radius: 12px;")
+        help_layout.addWidget(self.help_browser)
 
     def add_shadow(self, widget):
         shadow = QGraphicsDropShadowEffect()
@@ -759,7 +4494,7 @@ class ImageResizerApp(QMainWindow):
 
     def create_button(self, text, icon_name, callback):
         btn = QPushButton(text)
-        btn.setIcon(qta.icon(icon_name, color='#495057'))
+        self.deferred_icon(btn.setIcon, icon_name, color='#495057')
         btn.clicked.connect(callback)
         btn.setStyleSheet(self.button_style())
         btn.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -767,9 +4502,14 @@ class ImageResizerApp(QMainWindow):
 
     def create_action_button(self, text, icon_name, callback, extra_style=""):
         btn = QPushButton(text)
-        btn.setIcon(qta.icon(icon_name, color='white'))
+        self.deferred_icon(btn.setIcon, icon_name, color='white')
         btn.clicked.connect(callback)
-        btn.setStyleSheet(f"""
+        btn.setStyleSheet(self.action_button_style(extra_style))
+        btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        return btn
+
+    def action_button_style(self, extra_style=""):
+        return f"""
             QPushButton {{
                 {extra_style}
                 border-radius: 16px;
@@ -780,9 +4520,7 @@ class ImageResizerApp(QMainWindow):
             }}
             QPushButton:hover {{ opacity: 0.9; }}
             QPushButton:pressed {{ padding-top: 16px; padding-bottom: 12px; }}
-        """)
-        btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        return btn
+        """
 
     def label_style(self):
         return "color: #212529; padding: 10px; background: #E9ECEF; border-radius: 10px; font-family: Segoe UI; font-size: 10pt;"
@@ -846,55 +4584,66 @@ class ImageResizerApp(QMainWindow):
 
     def create_menus(self):
         menubar = self.menuBar()
+        menubar.clear()
 
         # File Menu
         file_menu = menubar.addMenu(self.tr("File"))
-        action = QAction(qta.icon('fa5s.folder-open'), self.tr("Select Image"), self)
+        action = QAction(self.tr("Select Image"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.folder-open')
         action.triggered.connect(self.select_input)
         action.setShortcut(QKeySequence("Ctrl+O"))
         file_menu.addAction(action)
 
-        action = QAction(qta.icon('fa5s.save'), self.tr("Output Folder"), self)
+        action = QAction(self.tr("Output Folder"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.save')
         action.triggered.connect(self.select_output)
         file_menu.addAction(action)
 
         file_menu.addSeparator()
 
-        action = QAction(qta.icon('fa5s.sign-out-alt'), self.tr("Exit"), self)
+        action = QAction(self.tr("Exit"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.sign-out-alt')
         action.triggered.connect(self.close)
         action.setShortcut(QKeySequence("Ctrl+Q"))
         file_menu.addAction(action)
 
         # Edit Menu
         edit_menu = menubar.addMenu(self.tr("Edit"))
-        action = QAction(qta.icon('fa5s.redo'), self.tr("Reset all settings"), self)
+        action = QAction(self.tr("Reset all settings"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.redo')
         action.triggered.connect(self.reset_settings)
         edit_menu.addAction(action)
 
         # View Menu
         view_menu = menubar.addMenu(self.tr("View"))
-        action = QAction(qta.icon('fa5s.expand'), "Fullscreen", self)
+        action = QAction("Fullscreen", self)
+        self.deferred_icon(action.setIcon, 'fa5s.expand')
         action.triggered.connect(self.toggle_fullscreen)
         action.setShortcut(QKeySequence("F11"))
         view_menu.addAction(action)
 
         # Tools Menu
         tools_menu = menubar.addMenu(self.tr("Tools"))
-        action = QAction(qta.icon('fa5s.images'), self.tr("Batch Processing"), self)
+        action = QAction(self.tr("Batch Processing"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.images')
         action.triggered.connect(self.open_batch_dialog)
         tools_menu.addAction(action)
 
+        action = QAction(self.tr("Build Tile Pyramid"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.th')
+        action.triggered.connect(self.start_pyramid)
+        tools_menu.addAction(action)
+
         # Help Menu
         help_menu = menubar.addMenu(self.tr("Help"))
-        action = QAction(qta.icon('fa5s.info-circle'), self.tr("About"), self)
+        action = QAction(self.tr("About"), self)
+        self.deferred_icon(action.setIcon, 'fa5s.info-circle')
         action.triggered.connect(self.show_about)
         help_menu.addAction(action)
 
         # Use 'mdi.github' instead of 'fa5s.github'
-        try:
-            action = QAction(qta.icon('mdi.github'), "GitHub", self)
-        except:
-            action = QAction("GitHub", self)
+        action = QAction("GitHub", self)
+        self.deferred_icon(action.setIcon, 'mdi.github')
         action.triggered.connect(lambda: QDesktopServices.openUrl(QUrl("https://github.com")))
         help_menu.addAction(action)
 
@@ -968,6 +4717,22 @@ class ImageResizerApp(QMainWindow):
             self.width_spin.blockSignals(False)
             self.update_new_size()
 
+    def select_background(self):
+        color = QColorDialog.getColor(QColor(self.background_color), self, self.tr("Background"))
+        if color.isValid():
+            self.background_color = color.name().upper()
+            self.update_background_button()
+
+    def select_watermark(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, self.tr("Watermark"), "", "Images (*.png *.webp *.gif *.jpg *.jpeg)"
+        )
+        if path:
+            self.watermark_edit.setText(path)
+
+    def update_background_button(self):
+        self.background_btn.setStyleSheet(f"border-left: 24px solid {self.background_color}; padding: 8px;")
+
     def update_new_size(self):
         self.new_size_label.setText(f"{self.width_spin.value()} × {self.height_spin.value()}")
 
@@ -990,22 +4755,22 @@ class ImageResizerApp(QMainWindow):
             self.log(f"Output: {path}")
 
     def load_preview(self, path):
-        try:
-            pixmap = QPixmap(path)
-            if pixmap.isNull():
-                raise Exception("Invalid image")
-            scaled = pixmap.scaled(550, 380, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.preview_label.setPixmap(scaled)
-
-            img = Image.open(path)
-            w, h = img.size
-            self.orig_size_label.setText(f"{w} × {h}")
-            self.original_ratio = w / h if h > 0 else 1.0
-            self.update_new_size()
-            self.log(f"Preview: {w}×{h}")
-        except Exception as e:
-            self.preview_label.setText(self.tr("Loading..."))
-            self.log(f"Preview error: {e}")
+        # Decoded on a worker thread at preview priority, so a running batch can't freeze the window
+        self.preview_label.setText(self.tr("Loading..."))
+        worker = PreviewWorker(path, QSize(550, 380), self)
+        worker.loaded.connect(self.show_preview)
+        worker.error.connect(lambda msg: self.log(f"Preview error: {msg}"))
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def show_preview(self, path, image, w, h):
+        if path != self.input_path:
+            return  # a newer image was selected while this one loaded
+        self.preview_label.setPixmap(QPixmap.fromImage(image))
+        self.orig_size_label.setText(f"{w} × {h}")
+        self.original_ratio = w / h if h > 0 else 1.0
+        self.update_new_size()
+        self.log(f"Preview: {w}×{h}")
 
     def start_resize(self):
         if not self.input_path:
@@ -1014,9 +4779,12 @@ class ImageResizerApp(QMainWindow):
 
         output_folder = self.output_folder or os.path.dirname(self.input_path)
         base_name = os.path.splitext(os.path.basename(self.input_path))[0]
-        ext_map = {self.tr("JPEG"): "jpg", self.tr("PNG"): "png", self.tr("WEBP"): "webp"}
-        ext = ext_map.get(self.format_combo.currentText(), "jpg")
-        output_path = os.path.join(output_folder, f"{base_name}_resized.{ext}")
+        try:
+            spec = self.current_spec()
+        except ValueError as e:
+            self.on_error(str(e))
+            return
+        output_path = os.path.join(output_folder, f"{base_name}_resized.{output_extension(spec.rules[0].format_type)}")
 
         self.progress.setVisible(True)
         self.progress.setValue(0)
@@ -1024,13 +4792,7 @@ class ImageResizerApp(QMainWindow):
         self.status_label.setText(self.tr("Processing..."))
         self.statusBar.showMessage(self.tr("Processing..."))
 
-        format_type = self.format_combo.currentText().split()[-1]
-        self.worker = ResizeWorker(
-            self.input_path, output_path,
-            self.width_spin.value(), self.height_spin.value(),
-            self.aspect_check.isChecked(), self.quality_spin.value(),
-            format_type, self.meta_check.isChecked()
-        )
+        self.worker = ResizeWorker(self.input_path, output_path, spec)
         self.worker.finished.connect(self.on_success)
         self.worker.error.connect(self.on_error)
         self.worker.start()
@@ -1042,6 +4804,12 @@ class ImageResizerApp(QMainWindow):
         self.status_label.setText(self.tr("Success! Saved to:") + f" {os.path.basename(path)}")
         self.statusBar.showMessage(self.tr("Success! Saved to:") + f" {os.path.basename(path)}", 6000)
         self.log(f"Success: {path}")
+        output = self.worker.output if self.worker else None
+        if isinstance(output, PassThrough):
+            self.log(f"Passed through without re-encoding ({output.how})")
+        elif output is not None:
+            for note in output_report(output, path)[2]:
+                self.log(note)
 
     def on_error(self, msg):
         self.progress.setVisible(False)
@@ -1050,24 +4818,106 @@ class ImageResizerApp(QMainWindow):
         self.statusBar.showMessage(self.tr("Error:") + f" {msg}", 10000)
         self.log(f"Error: {msg}")
 
+    def current_rule(self):
+        format_type = OUTPUT_FORMATS[self.format_combo.currentIndex()]
+        return OutputRule(
+            width=self.width_spin.value(),
+            height=self.height_spin.value(),
+            keep_aspect=self.aspect_check.isChecked(),
+            quality=self.quality_spin.value(),
+            target_ssim=SSIM_TARGETS[self.ssim_combo.currentIndex()],
+            format_type=format_type,
+            fit=FIT_MODES[self.fit_combo.currentIndex()],
+            no_upscale=self.no_upscale_check.isChecked(),
+            background=self.background_color,
+            png_palette=self.png_palette_check.isChecked(),
+            bit_depth=16 if self.high_bit_check.isChecked() and format_type in HIGH_BIT_FORMATS
+            and not self.png_palette_check.isChecked() else 8,
+        )
+
+    def current_spec(self):
+        self.build_deferred_tabs()
+        return JobSpec(
+            rules=(self.current_rule(),),
+            preserve_meta=self.meta_check.isChecked(),
+            output_folder=self.output_folder or '',
+            fsync=self.fsync_mode(),
+            workers=self.workers_spin.value(),
+            color=COLOR_MODES[self.color_combo.currentIndex()],
+            **self.watermark_options(),
+        )
+
+    def watermark_options(self):
+        # An existing file is drawn as an image, anything else as text
+        text = self.watermark_edit.text().strip()
+        is_image = bool(text) and os.path.isfile(text)
+        return dict(
+            watermark=text if is_image else '',
+            watermark_text='' if is_image else text,
+            watermark_position=WATERMARK_POSITIONS[self.watermark_position_combo.currentIndex()],
+            watermark_opacity=self.watermark_opacity_spin.value() / 100,
+            watermark_scale=self.watermark_scale_spin.value() / 100,
+        )
+
+    def fsync_mode(self):
+        return OutputWriter.FSYNC_MODES[self.fsync_combo.currentIndex()]
+
+    def profile_mode(self):
+        self.build_deferred_tabs()
+        return PROFILE_MODES[self.profile_combo.currentIndex()]
+
+    def batch_niceness(self):
+        self.build_deferred_tabs()
+        return BATCH_NICENESS if self.low_priority_check.isChecked() else 0
+
     def open_output_folder(self):
         if self.output_folder:
             QDesktopServices.openUrl(QUrl.fromLocalFile(self.output_folder))
 
+    def init_logging(self):
+        log_dir = os.path.join(app_data_dir(), "logs")
+        self.logger = logging.getLogger("image_resizer_pro")
+        self.logger.setLevel(logging.INFO)
+        self.log_listener = None
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, "image_resizer_pro.log"),
+                maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8"
+            )
+        except OSError:
+            return
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        # File writes happen on the listener thread, never on the GUI thread
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self.log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+        self.log_listener.start()
+
     def log(self, msg):
         timestamp = QDateTime.currentDateTime().toString('hh:mm:ss')
-        self.log_text.append(f"[{timestamp}] {msg}")
+        self.append_log_text(f"[{timestamp}] {msg}")
+        self.logger.info(msg)
+
+    def append_log_lines(self, lines):
+        # Lines already went to the log file when they were recorded
+        if lines:
+            self.append_log_text("\n".join(f"[{t}] {msg}" for t, msg in lines))
+
+    def append_log_text(self, text):
+        if self.log_text is None:
+            self.pending_log.append(text)
+        else:
+            self.log_text.appendPlainText(text)
 
     def change_language(self, index):
-        langs = ['en', 'fa', 'zh', 'ru']
-        self.current_lang = langs[index]
+        self.current_lang = self.LANGUAGES[index]
         self.retranslate_ui()
         self.update_direction()
         self.save_settings()
 
     def change_theme(self, button):
-        themes = ['light', 'dark', 'system', 'red', 'blue']
-        theme = themes[self.theme_group.id(button)]
+        theme = self.THEMES[self.theme_group.id(button)]
         self.settings.setValue("theme", theme)
         self.apply_theme()
 
@@ -1076,6 +4926,7 @@ class ImageResizerApp(QMainWindow):
         app = QApplication.instance()
 
         if theme == "dark":
+            import qdarkstyle  # only needed for the dark theme
             app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt6())
         elif theme == "light":
             app.setStyleSheet("")
@@ -1087,9 +4938,9 @@ class ImageResizerApp(QMainWindow):
             app.setStyleSheet("")
 
         # Force text color
-        forced = "\nQLabel, QPushButton, QComboBox, QSpinBox, QGroupBox, QTextEdit { color: #212529; }"
+        forced = "\nQLabel, QPushButton, QComboBox, QSpinBox, QGroupBox, QTextEdit, QPlainTextEdit { color: #212529; }"
         if theme == "dark":
-            forced = "\nQLabel, QPushButton, QComboBox, QSpinBox, QGroupBox, QTextEdit { color: #E9ECEF; }"
+            forced = "\nQLabel, QPushButton, QComboBox, QSpinBox, QGroupBox, QTextEdit, QPlainTextEdit { color: #E9ECEF; }"
         app.setStyleSheet(app.styleSheet() + forced)
 
     def red_theme(self):
@@ -1098,7 +4949,7 @@ class ImageResizerApp(QMainWindow):
         QGroupBox { border: 2px solid #FFA0A0; background: #FFEBEE; }
         QGroupBox::title { color: #C21807; }
         QPushButton { background: #FFEBEE; border: 2px solid #FF8A80; color: #B71C1C; }
-        QTextEdit { background: #1E1E1E; color: #FFB3B3; }
+        QTextEdit, QPlainTextEdit { background: #1E1E1E; color: #FFB3B3; }
         """
 
     def blue_theme(self):
@@ -1107,7 +4958,7 @@ class ImageResizerApp(QMainWindow):
         QGroupBox { border: 2px solid #87CEFA; background: #E3F2FD; }
         QGroupBox::title { color: #1E90FF; }
         QPushButton { background: #E3F2FD; border: 2px solid #64B5F6; color: #1565C0; }
-        QTextEdit { background: #1E1E1E; color: #87CEFA; }
+        QTextEdit, QPlainTextEdit { background: #1E1E1E; color: #87CEFA; }
         """
 
     def retranslate_ui(self):
@@ -1124,46 +4975,105 @@ class ImageResizerApp(QMainWindow):
                 widget.setText(self.tr(original))
 
         # Update combo boxes
-        current_format = self.format_combo.currentText()
-        self.format_combo.clear()
-        self.format_combo.addItems([self.tr("JPEG"), self.tr("PNG"), self.tr("WEBP")])
-        idx = [self.tr("JPEG"), self.tr("PNG"), self.tr("WEBP")].index(current_format) if current_format in [self.tr("JPEG"), self.tr("PNG"), self.tr("WEBP")] else 0
-        self.format_combo.setCurrentIndex(idx)
+        combos = [
+            (self.format_combo, self.FORMAT_LABELS),
+            (self.fit_combo, ["Contain", "Cover", "Pad", "Smart Crop"]),
+            (self.ssim_combo, self.SSIM_LABELS),
+            (self.watermark_position_combo, self.WATERMARK_LABELS),
+            (self.color_combo, ["Ignore Color Profile", "Convert to sRGB", "Embed Source Profile"]),
+        ]
+        if hasattr(self, 'fsync_combo'):
+            combos.append((self.fsync_combo, ["Off", "Each file", "Batched"]))
+            combos.append((self.profile_combo, ["Off", "CPU (cProfile)", "Memory (tracemalloc)", "CPU + Memory"]))
+        for combo, texts in combos:
+            idx = combo.currentIndex()
+            combo.clear()
+            combo.addItems([self.tr(t) for t in texts])
+            combo.setCurrentIndex(idx)
 
         # Update menus
         self.create_menus()
 
+        for index, title in enumerate(["Preview", "Logs", "Settings", "Help"]):
+            self.tabs.setTabText(index, self.tr(title))
+
         # Update help
-        self.tabs.widget(3).layout().itemAt(0).widget().setHtml(self.get_help_text())
+        if hasattr(self, 'help_browser'):
+            self.help_browser.setHtml(self.get_help_text())
 
     def save_settings(self):
+        self.build_deferred_tabs()
         self.settings.setValue("language", self.current_lang)
         self.settings.setValue("width", self.width_spin.value())
         self.settings.setValue("height", self.height_spin.value())
         self.settings.setValue("quality", self.quality_spin.value())
+        self.settings.setValue("ssim_target", self.ssim_combo.currentIndex())
         self.settings.setValue("keep_aspect", self.aspect_check.isChecked())
+        self.settings.setValue("fit", self.fit_combo.currentIndex())
+        self.settings.setValue("no_upscale", self.no_upscale_check.isChecked())
         self.settings.setValue("preserve_meta", self.meta_check.isChecked())
+        self.settings.setValue("color_mode", self.color_combo.currentIndex())
+        self.settings.setValue("png_palette", self.png_palette_check.isChecked())
+        self.settings.setValue("high_bit", self.high_bit_check.isChecked())
+        self.settings.setValue("background", self.background_color)
+        self.settings.setValue("watermark", self.watermark_edit.text())
+        self.settings.setValue("watermark_position", self.watermark_position_combo.currentIndex())
+        self.settings.setValue("watermark_opacity", self.watermark_opacity_spin.value())
+        self.settings.setValue("watermark_scale", self.watermark_scale_spin.value())
         self.settings.setValue("format", self.format_combo.currentIndex())
+        self.settings.setValue("fsync_mode", self.fsync_mode())
+        self.settings.setValue("batch_workers", self.workers_spin.value())
+        self.settings.setValue("profile_mode", self.profile_mode())
+        self.settings.setValue("low_priority_batches", self.low_priority_check.isChecked())
         self.settings.setValue("theme", self.settings.value("theme", "system"))
 
     def load_settings(self):
         # Language
-        lang = self.settings.value("language", "en")
-        idx = ['en', 'fa', 'zh', 'ru'].index(lang) if lang in ['en', 'fa', 'zh', 'ru'] else 0
-        self.lang_combo.setCurrentIndex(idx)
-        self.current_lang = ['en', 'fa', 'zh', 'ru'][idx]
+        lang = self.saved_language()
+        if lang != self.current_lang:
+            self.current_lang = lang
+            self.retranslate_ui()
+            self.update_direction()
 
         # Dimensions
         self.width_spin.setValue(int(self.settings.value("width", 1280)))
         self.height_spin.setValue(int(self.settings.value("height", 720)))
         self.quality_spin.setValue(int(self.settings.value("quality", 95)))
+        self.ssim_combo.setCurrentIndex(int(self.settings.value("ssim_target", 0)))
         self.aspect_check.setChecked(self.settings.value("keep_aspect", True) in [True, "true"])
+        self.fit_combo.setCurrentIndex(int(self.settings.value("fit", 0)))
+        self.no_upscale_check.setChecked(self.settings.value("no_upscale", False) in [True, "true"])
         self.meta_check.setChecked(self.settings.value("preserve_meta", True) in [True, "true"])
+        self.color_combo.setCurrentIndex(int(self.settings.value("color_mode", 0)))
+        self.png_palette_check.setChecked(self.settings.value("png_palette", False) in [True, "true"])
+        self.high_bit_check.setChecked(self.settings.value("high_bit", False) in [True, "true"])
+        background = self.settings.value("background", "#FFFFFF")
+        self.background_color = background if QColor.isValidColorName(background) else "#FFFFFF"
+        self.update_background_button()
+        self.watermark_edit.setText(self.settings.value("watermark", ""))
+        self.watermark_position_combo.setCurrentIndex(int(self.settings.value("watermark_position", 0)))
+        self.watermark_opacity_spin.setValue(int(self.settings.value("watermark_opacity", 50)))
+        self.watermark_scale_spin.setValue(int(self.settings.value("watermark_scale", 20)))
         self.format_combo.setCurrentIndex(int(self.settings.value("format", 0)))
 
+        if not self.deferred_tabs:
+            self.load_tab_settings()
+
+    def load_tab_settings(self):
+        # Settings shown in the Settings tab, which is built after startup
+        self.lang_combo.blockSignals(True)
+        self.lang_combo.setCurrentIndex(self.LANGUAGES.index(self.current_lang))
+        self.lang_combo.blockSignals(False)
+        fsync_mode = self.settings.value("fsync_mode", "none")
+        self.fsync_combo.setCurrentIndex(OutputWriter.FSYNC_MODES.index(fsync_mode) if fsync_mode in OutputWriter.FSYNC_MODES else 0)
+        self.workers_spin.setValue(int(self.settings.value("batch_workers", os.cpu_count() or 1)))
+        profile_mode = self.settings.value("profile_mode", "off")
+        self.profile_combo.setCurrentIndex(PROFILE_MODES.index(profile_mode) if profile_mode in PROFILE_MODES else 0)
+        self.low_priority_check.setChecked(self.settings.value("low_priority_batches", True) in [True, "true"])
+
         # Theme - SAFE CHECK
         theme = self.settings.value("theme", "system")
-        theme_idx = ['light', 'dark', 'system', 'red', 'blue'].index(theme) if theme in ['light', 'dark', 'system', 'red', 'blue'] else 2
+        theme_idx = self.THEMES.index(theme) if theme in self.THEMES else 2
         if self.theme_group.button(theme_idx):  # Check if button exists
             self.theme_group.button(theme_idx).setChecked(True)
 
@@ -1193,18 +5103,183 @@ class ImageResizerApp(QMainWindow):
         self.batch_dialog.raise_()
         self.batch_dialog.activateWindow()
 
+    def start_pyramid(self):
+        if not self.input_path:
+            self.status_label.setText(self.tr("Select input image first!"))
+            return
+        start_dir = self.output_folder or os.path.dirname(self.input_path)
+        output_dir = QFileDialog.getExistingDirectory(self, self.tr("Build Tile Pyramid"), start_dir)
+        if not output_dir:
+            return
+
+        self.progress.setVisible(True)
+        self.progress.setValue(0)
+        self.start_btn.setEnabled(False)
+        self.status_label.setText(self.tr("Processing..."))
+        self.statusBar.showMessage(self.tr("Processing..."))
+
+        self.pyramid_worker = PyramidWorker(self.input_path, output_dir, self.current_rule(), self.fsync_mode())
+        self.pyramid_worker.progress.connect(self.progress.setValue)
+        self.pyramid_worker.finished.connect(self.on_pyramid_done)
+        self.pyramid_worker.error.connect(self.on_error)
+        self.pyramid_worker.start()
+
+    def on_pyramid_done(self, summary):
+        self.progress.setVisible(False)
+        self.start_btn.setEnabled(True)
+        self.status_label.setText(self.tr("Tile pyramid done:") + f" {summary}")
+        self.statusBar.showMessage(self.tr("Tile pyramid done:") + f" {summary}", 6000)
+        self.log(f"Pyramid: {self.input_path}: {summary}")
+
     def closeEvent(self, event):
         self.save_settings()
+        if self.log_listener:
+            self.log_listener.stop()
         super().closeEvent(event)
 
 
+def print_startup_profile():
+    start = previous = STARTUP_MARKS[0][1]
+    for name, t in STARTUP_MARKS[1:]:
+        print(f"{name:<20}{(t - previous) * 1000:8.1f} ms {(t - start) * 1000:10.1f} ms")
+        previous = t
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Image Resizer Pro")
+    parser.add_argument("--recipe", help="run a saved JSON/TOML recipe without the GUI")
+    parser.add_argument("--output", help="output folder (overrides the recipe)")
+    parser.add_argument("inputs", nargs="*", help="image files or folders for --recipe")
+    parser.add_argument("--verify-resampling", action="store_true",
+                        help="check output sizes and resampling quality against reference renders")
+    parser.add_argument("--serve", metavar="ROOT", help="serve resized images from ROOT on localhost")
+    parser.add_argument("--port", type=int, default=8765, help="port for --serve")
+    parser.add_argument("--cache-dir", help="disk cache folder for --serve")
+    parser.add_argument("--cache-mb", type=int, default=256, help="memory cache size for --serve")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="benchmark resampling backends on this machine and remember the fastest")
+    parser.add_argument("--pyramid", metavar="DIR",
+                        help="write deep-zoom tile pyramids of the inputs to DIR "
+                             "(JPEG, PNG or WEBP tiles, format from --recipe)")
+    parser.add_argument("--tile-size", type=int, choices=TILE_SIZES, default=256, help="tile size for --pyramid")
+    parser.add_argument("--layout", choices=PYRAMID_LAYOUTS, default='dzi', help="tile layout for --pyramid")
+    parser.add_argument("--overlap", type=int, default=0, help="tile overlap in pixels for --pyramid")
+    parser.add_argument("--coordinator", type=int, metavar="PORT",
+                        help="run the --recipe batch as a coordinator for remote workers on PORT")
+    parser.add_argument("--bind", default="127.0.0.1", help="address the coordinator listens on")
+    parser.add_argument("--chunk-size", type=int, default=16, help="images per chunk for --coordinator")
+    parser.add_argument("--stream", action="store_true",
+                        help="send inputs to workers and stream outputs back instead of using shared storage")
+    parser.add_argument("--local-workers", type=int, default=0, help="worker processes to start on this machine")
+    parser.add_argument("--worker", metavar="HOST:PORT", help="process chunks for a coordinator")
+    parser.add_argument("--token", default=os.environ.get("IRP_TOKEN", ""),
+                        help="shared secret between coordinator and workers (default: $IRP_TOKEN); "
+                             "required when --bind is not a loopback address")
+    parser.add_argument("--profile", choices=PROFILE_MODES[1:],
+                        help="profile --recipe workers with cProfile and/or tracemalloc and print a summary")
+    parser.add_argument("--profile-dir", help="folder for the .pstats file written by --profile")
+    parser.add_argument("--nice", type=int, default=0, metavar="N",
+                        help="run --recipe batch workers at this much lower OS priority (POSIX only)")
+    parser.add_argument("--prefetch-mb", type=int, default=PREFETCH_BYTES // (1024 * 1024),
+                        help="memory for reading upcoming --recipe inputs ahead of the workers (0 disables)")
+    parser.add_argument("--contact-sheet", metavar="PNG",
+                        help="also build a contact sheet or sprite atlas of the --recipe outputs, with a JSON index")
+    parser.add_argument("--sheet-layout", choices=SHEET_LAYOUTS, default='grid',
+                        help="grid: one cell per input in input order; atlas: packed sprites on a transparent sheet")
+    parser.add_argument("--sheet-columns", type=int, default=0, help="cells per row (default: a roughly square sheet)")
+    parser.add_argument("--sheet-rule", type=int, help="index of the recipe rule to use (default: the smallest)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics during --recipe runs")
+    parser.add_argument("--metrics-file", metavar="JSON",
+                        help="rewrite a JSON metrics snapshot every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=int, default=METRICS_INTERVAL, metavar="SECONDS",
+                        help="seconds between metrics snapshots")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print import and construction times up to the first paint, then exit")
+    return parser.parse_known_args(argv)[0]
+
+
 # Run Application
 if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if any((args.verify_resampling, args.calibrate, args.serve, args.pyramid, args.worker, args.recipe)):
+        load_numpy()
+    if args.verify_resampling:
+        if np is None:
+            sys.exit("Error: --verify-resampling needs numpy")
+        lines, failures = verify_resampling()
+        print("\n".join(lines))
+        for failure in failures:
+            print(f"FAIL {failure}")
+        sys.exit(1 if failures else 0)
+
+    if args.calibrate:
+        if np is None:
+            sys.exit("Error: --calibrate needs numpy")
+        print("\n".join(calibrate_backends()))
+        sys.exit(0)
+
+    if args.serve:
+        sys.exit(run_server(args.serve, args.port, args.cache_dir, args.cache_mb,
+                            metrics_file=args.metrics_file, metrics_interval=args.metrics_interval))
+
+    if args.pyramid:
+        try:
+            spec = JobSpec.load(args.recipe) if args.recipe else None
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error: {e}")
+        sys.exit(run_pyramids(args.inputs, args.pyramid, spec, args.tile_size, args.layout, args.overlap))
+
+    if args.worker:
+        try:
+            chunks = run_worker(parse_address(args.worker), args.token)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error: {e}")
+        print(f"Worker: processed {chunks} chunks")
+        sys.exit(0)
+
+    if args.recipe:
+        try:
+            spec = JobSpec.load(args.recipe)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error: {e}")
+        if args.output:
+            spec = dataclasses.replace(spec, output_folder=args.output)
+        if args.coordinator is not None:
+            try:
+                sys.exit(run_coordinator(spec, args.inputs, args.coordinator, args.bind, args.chunk_size,
+                                         args.stream, args.local_workers, args.token))
+            except (OSError, ValueError) as e:
+                sys.exit(f"Error: {e}")
+        profile = BatchProfile(args.profile, args.profile_dir) if args.profile else None
+        try:
+            sheet = ContactSheet(args.contact_sheet, spec, args.sheet_layout, args.sheet_columns,
+                                 args.sheet_rule) if args.contact_sheet else None
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        metrics = exporter = None
+        if args.metrics_port is not None or args.metrics_file:
+            metrics = Metrics()
+            try:
+                exporter = MetricsExporter(metrics, args.metrics_port, args.metrics_file, args.metrics_interval)
+            except OSError as e:
+                sys.exit(f"Error: metrics port {args.metrics_port}: {e}")
+        try:
+            status = run_headless(spec, args.inputs, profile, args.prefetch_mb * 1024 * 1024, args.nice, sheet,
+                                  metrics)
+        finally:
+            if exporter:
+                exporter.close()
+        sys.exit(status)
+
     app = QApplication(sys.argv)
     app.setApplicationName("Image Resizer Pro")
     app.setOrganizationName("ProTools")
     app.setStyle("Fusion")
+    STARTUP_MARKS.append(("QApplication", time.perf_counter()))
 
     window = ImageResizerApp()
+    window.startup_profile = args.startup_profile
+    STARTUP_MARKS.append(("main window", time.perf_counter()))
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,41 @@
+# Adaptive quality: the lowest JPEG/WebP quality whose encode still reaches the rule's target SSIM
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture(scope="module")
+def photo():
+    return irp.synthetic_image((320, 240))
+
+
+def test_identical_images_score_one(photo):
+    luma = irp.luminance(photo)
+    assert irp.ssim(luma, luma) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("format_type", ["JPEG", "WEBP"])
+@pytest.mark.parametrize("target", [0.95, 0.98])
+def test_encode_meets_the_target_below_the_cap(photo, format_type, target):
+    rule = irp.OutputRule(320, 240, quality=95, format_type=format_type, target_ssim=target)
+    output = irp.encode_for_ssim(photo, rule)
+    assert isinstance(output, irp.TunedOutput)
+    assert output.score >= target and output.quality <= 95
+    assert output.attempts <= irp.SSIM_MAX_ATTEMPTS
+    decoded = Image.open(io.BytesIO(output))
+    assert irp.ssim(irp.luminance(photo), irp.luma_plane(decoded)) == pytest.approx(output.score)
+    # The winner is the smallest passing encode: one step lower misses the target
+    if output.quality > min(irp.SSIM_QUALITY_FLOOR, rule.quality):
+        lower = irp.encode_image(photo, irp.dataclasses.replace(rule, quality=output.quality - 1))
+        assert irp.ssim(irp.luminance(photo), irp.luma_plane(Image.open(io.BytesIO(lower)))) < target
+
+
+def test_lower_target_never_costs_more_bytes(photo):
+    sizes = [len(irp.encode_for_ssim(photo, irp.OutputRule(320, 240, target_ssim=target)))
+             for target in (0.99, 0.98, 0.95)]
+    assert sizes == sorted(sizes, reverse=True)
@@ -0,0 +1,46 @@
+# Auto (smallest) format: every candidate is encoded and the smallest one that qualifies is kept
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+import image_resizer_pro as irp
+
+
+def screenshot():
+    # Flat colours and hard edges, which PNG compresses best
+    img = Image.new('RGB', (320, 200), '#FFFFFF')
+    draw = ImageDraw.Draw(img)
+    for y in range(10, 200, 20):
+        draw.rectangle((10, y, 300, y + 8), fill='#2050A0')
+    return img
+
+
+@pytest.mark.parametrize("make, expected", [(screenshot, 'PNG'), (lambda: irp.synthetic_image((320, 200)), None)])
+def test_smallest_candidate_wins(make, expected):
+    img = make()
+    rule = irp.OutputRule(320, 200, format_type=irp.AUTO_FORMAT, quality=85)
+    output = irp.encode_output(img, rule)
+    assert isinstance(output, irp.AutoOutput)
+    sizes = {fmt: len(irp.encode_format(img, irp.dataclasses.replace(rule, format_type=fmt)))
+             for fmt in irp.AUTO_CANDIDATES}
+    assert output.format_type == min(sizes, key=sizes.get)
+    assert len(output) == sizes[output.format_type]
+    if expected:
+        assert output.format_type == expected
+    assert Image.open(io.BytesIO(output)).format == output.format_type
+
+
+def test_jpeg_does_not_compete_for_transparent_images():
+    img = irp.synthetic_image((200, 200)).convert('RGBA')
+    img.putalpha(Image.linear_gradient('L').resize((200, 200)))
+    output = irp.encode_output(img, irp.OutputRule(200, 200, format_type=irp.AUTO_FORMAT))
+    assert output.format_type in ('WEBP', 'PNG')
+    assert Image.open(io.BytesIO(output)).mode == 'RGBA'
+
+
+def test_output_path_takes_the_winning_extension():
+    output = irp.AutoOutput(b'')
+    output.format_type = 'WEBP'
+    path, format_type, notes = irp.output_report(output, '/out/photo_resized.auto')
+    assert (path, format_type, notes) == ('/out/photo_resized.webp', 'WEBP', [])
@@ -0,0 +1,49 @@
+# Parallel batches: every input is rendered by the process pool and its outputs are written
+import os
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+def test_progress_log_is_bounded_and_counts_failures():
+    progress = irp.BatchProgress(10, max_lines=3)
+    for n in range(8):
+        progress.record(f"/out/{n}.jpg", True)
+    progress.record("bad.jpg: cannot identify image file", False, 2)
+    progress.note("Contact sheet: done")
+    done, failed, lines = progress.drain()
+    assert (done, failed) == (10, 2)
+    assert [line for _, line in lines] == ["Batch: 7.jpg", "Batch Error: bad.jpg: cannot identify image file",
+                                           "Contact sheet: done"]
+    assert progress.drain()[2] == []
+    assert progress.finished()
+    assert progress.summary() == "8 succeeded, 2 failed"
+
+
+@pytest.fixture
+def folder(tmp_path):
+    inputs = tmp_path / "in"
+    (inputs / "nested").mkdir(parents=True)
+    for n in range(6):
+        irp.synthetic_image((200 + 10 * n, 150)).save(inputs / f"img{n}.png")
+    # Same name in another folder: outputs must not overwrite each other
+    irp.synthetic_image((100, 100)).save(inputs / "nested" / "img0.png")
+    (inputs / "broken.jpg").write_bytes(b"not an image")
+    return inputs
+
+
+@pytest.mark.parametrize("prefetch_bytes", [0, irp.PREFETCH_BYTES])
+def test_headless_batch_writes_every_output(folder, tmp_path, prefetch_bytes):
+    out = tmp_path / f"out{prefetch_bytes}"
+    spec = irp.JobSpec(rules=(irp.OutputRule(80, 80, suffix='_s'),
+                              irp.OutputRule(40, 40, format_type='PNG', suffix='_t')),
+                       output_folder=str(out), workers=2)
+    paths = [str(folder), str(folder / "nested" / "img0.png")]
+    assert irp.run_headless(spec, paths, prefetch_bytes=prefetch_bytes) == 1  # broken.jpg
+    names = sorted(os.listdir(out))
+    assert len(names) == 14 and "img0_s_2.jpg" in names and "img0_t_2.png" in names
+    assert not any(name.startswith('.') for name in names)
+    assert Image.open(out / "img5_s.jpg").size == (80, 48)
+    assert Image.open(out / "img5_t.png").size == (40, 24)
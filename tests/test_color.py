@@ -0,0 +1,59 @@
+# ICC colour management: profiles dropped, embedded, or converted to sRGB through cached transforms
+import io
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+pytestmark = pytest.mark.skipif(irp.ImageCms is None, reason="Pillow built without LittleCMS")
+
+
+def profile(description):
+    # A real sRGB profile under another name, so it is not recognised as sRGB and gets converted
+    data = irp.ImageCms.ImageCmsProfile(irp.ImageCms.createProfile('sRGB')).tobytes()
+    return data.replace('sRGB'.encode('utf-16-be'), description.encode('utf-16-be'))
+
+
+def render(icc_profile, color, format_type='PNG'):
+    img = irp.synthetic_image((80, 60))
+    img.info['icc_profile'] = icc_profile
+    spec = irp.JobSpec(rules=(irp.OutputRule(40, 30, format_type=format_type),), color=color)
+    [data] = irp.render_image(img, spec)
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("format_type", ['PNG', 'JPEG', 'WEBP', 'TIFF'])
+def test_profiles_are_dropped_by_default(format_type):
+    assert render(profile('wide'), 'none', format_type).info.get('icc_profile') is None
+
+
+@pytest.mark.parametrize("format_type", ['PNG', 'JPEG', 'WEBP'])
+def test_embed_copies_the_source_profile(format_type):
+    assert render(profile('wide'), 'embed', format_type).info.get('icc_profile') == profile('wide')
+
+
+def test_srgb_converts_and_leaves_no_profile_behind():
+    out = render(profile('wide'), 'srgb')
+    assert out.info.get('icc_profile') is None
+    reference = render(profile('wide'), 'none')
+    # Converting sRGB data to sRGB only moves values by rounding
+    diff = [abs(a - b) for a, b in zip(out.tobytes(), reference.tobytes())]
+    assert max(diff) <= 2
+
+
+def test_transforms_are_built_once_per_profile_and_mode():
+    first = irp.srgb_transform(profile('wide'), 'RGB')
+    assert first is not None
+    assert irp.srgb_transform(profile('wide'), 'RGB') is first
+    assert irp.srgb_transform(profile('wide'), 'RGBA') is not first
+
+
+@pytest.mark.parametrize("icc_profile", [profile('sRGB'), b'not a profile'])
+def test_srgb_and_unreadable_profiles_are_left_alone(icc_profile):
+    assert irp.srgb_transform(icc_profile, 'RGB') is None
+
+
+def test_16_bit_rules_cannot_be_converted():
+    with pytest.raises(ValueError, match="sRGB"):
+        irp.JobSpec(rules=(irp.OutputRule(10, 10, format_type='PNG', bit_depth=16),), color='srgb')
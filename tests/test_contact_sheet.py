@@ -0,0 +1,71 @@
+# Contact sheets and sprite atlases: built band by band while the batch runs, plus a JSON index
+import io
+import json
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+COLOURS = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF']
+
+
+def encoded(colour, size, format_type='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, colour).save(buffer, format=format_type)
+    return buffer.getvalue()
+
+
+def spec():
+    return irp.JobSpec(rules=(irp.OutputRule(40, 30, format_type='PNG'),))
+
+
+def test_grid_places_cells_in_input_order(tmp_path):
+    path = str(tmp_path / "sheet.png")
+    sheet = irp.ContactSheet(path, spec(), 'grid', columns=2, spacing=4)
+    sheet.start(len(COLOURS))
+    # Finished out of order, as a batch does; index 3 failed to render
+    for index in (4, 1, 0, 2):
+        sheet.add(index, f"in/{index}.jpg", f"out/{index}.png", encoded(COLOURS[index], (40, 30)))
+    sheet.skip(3)
+    sheet.close()
+
+    img = Image.open(path)
+    assert img.size == (2 * 44 + 4, 4 + 3 * 34)
+    index = json.loads((tmp_path / "sheet.json").read_text())
+    assert index['layout'] == 'grid' and (index['width'], index['height']) == img.size
+    assert [sprite['name'] for sprite in index['sprites']] == ['0', '1', '2', '4']
+    for sprite in index['sprites']:
+        centre = (sprite['x'] + sprite['width'] // 2, sprite['y'] + sprite['height'] // 2)
+        assert img.getpixel(centre) == Image.new('RGB', (1, 1), COLOURS[int(sprite['name'])]).getpixel((0, 0))
+    # The failed image's cell stays background
+    assert img.getpixel((4 + 44 + 20, 4 + 34 + 15)) == (255, 255, 255)
+
+
+def test_atlas_packs_shelves_on_a_transparent_background(tmp_path):
+    path = str(tmp_path / "atlas.png")
+    sheet = irp.ContactSheet(path, spec(), 'atlas', columns=2, spacing=4)
+    sheet.start(4)
+    sizes = [(40, 30), (20, 30), (40, 10), (10, 10)]
+    for index, size in enumerate(sizes):
+        sheet.add(index, f"in/{index}.png", f"out/{index}.png", encoded(COLOURS[index], size))
+    sheet.close()
+
+    img = Image.open(path)
+    assert img.mode == 'RGBA' and img.getpixel((0, 0))[3] == 0
+    sprites = json.loads((tmp_path / "atlas.json").read_text())['sprites']
+    assert [(sprite['width'], sprite['height']) for sprite in sprites] == sizes
+    boxes = [(s['x'], s['y'], s['x'] + s['width'], s['y'] + s['height']) for s in sprites]
+    for a in range(len(boxes)):
+        assert boxes[a][2] <= img.width and boxes[a][3] <= img.height
+        for b in range(a):
+            overlap = min(boxes[a][2], boxes[b][2]) > max(boxes[a][0], boxes[b][0]) and \
+                min(boxes[a][3], boxes[b][3]) > max(boxes[a][1], boxes[b][1])
+            assert not overlap
+
+
+def test_unknown_rule_or_layout_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="no rule 3"):
+        irp.ContactSheet(str(tmp_path / "s.png"), spec(), rule_index=3)
+    with pytest.raises(ValueError, match="layout"):
+        irp.ContactSheet(str(tmp_path / "s.png"), spec(), 'mosaic')
@@ -0,0 +1,75 @@
+# Coordinator/worker batches: framing, the token handshake, and a batch run by a real worker
+import os
+import socket
+import socketserver
+import threading
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+def test_messages_round_trip_with_blobs():
+    a, b = socket.socketpair()
+    with a, b:
+        irp.send_message(a, {'type': 'chunk', 'id': 7}, [b'first', b'', b'\0' * 100000])
+        header, blobs = irp.recv_message(b)
+    assert header['type'] == 'chunk' and header['id'] == 7
+    assert blobs == [b'first', b'', b'\0' * 100000]
+
+
+def test_oversized_header_is_refused():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall((irp.MAX_HEADER_BYTES + 1).to_bytes(4, 'big'))
+        with pytest.raises(ValueError, match="Oversized"):
+            irp.recv_message(b)
+
+
+def start_coordinator(tmp_path, stream, token='secret'):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for n in range(5):
+        irp.synthetic_image((120 + n, 90)).save(inputs / f"img{n}.png")
+    (inputs / "broken.jpg").write_bytes(b"not an image")
+    spec = irp.JobSpec(rules=(irp.OutputRule(60, 60, suffix='_s'),), output_folder=str(tmp_path / "out"))
+    writer = irp.OutputWriter()
+    items = [(path, spec.output_paths(path, writer)) for path in irp.collect_inputs([str(inputs)])]
+    os.makedirs(spec.output_folder)
+    progress = irp.BatchProgress(len(items), max_lines=1)
+    coordinator = irp.BatchCoordinator(items, spec, writer, progress, chunk_size=2, stream=stream,
+                                       heartbeat=2.0, token=token)
+    handler = type('Handler', (irp.CoordinatorHandler,), {'coordinator': coordinator})
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return coordinator, server, writer, progress
+
+
+def test_wrong_token_is_rejected(tmp_path):
+    coordinator, server, writer, _ = start_coordinator(tmp_path, stream=False)
+    try:
+        with pytest.raises(ConnectionError, match="unauthorized"):
+            irp.run_worker(server.server_address, 'guess', processes=1)
+    finally:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_worker_processes_the_whole_batch(tmp_path, stream):
+    coordinator, server, writer, progress = start_coordinator(tmp_path, stream)
+    try:
+        assert irp.run_worker(server.server_address, 'secret', processes=1) == 3
+        assert coordinator.finished.wait(30)
+    finally:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+    assert progress.failed == 1
+    names = sorted(os.listdir(tmp_path / "out"))
+    assert names == [f"img{n}_s.jpg" for n in range(5)]
+    for name in names:
+        assert Image.open(tmp_path / "out" / name).size[0] == 60
@@ -0,0 +1,62 @@
+# Fit modes: output sizes per mode, pad colour, and where cover and smart crop
+import pytest
+from PIL import Image, ImageDraw
+
+import image_resizer_pro as irp
+
+
+@pytest.mark.parametrize("src, rule, expected", [
+    ((1366, 768), irp.OutputRule(1280, 720), (1280, 720)),
+    ((1000, 500), irp.OutputRule(300, 300), (300, 150)),
+    ((500, 1000), irp.OutputRule(300, 300), (150, 300)),
+    ((1000, 500), irp.OutputRule(300, 300, fit='cover'), (300, 300)),
+    ((1000, 500), irp.OutputRule(300, 300, fit='smart'), (300, 300)),
+    ((1000, 500), irp.OutputRule(300, 300, keep_aspect=False), (300, 300)),
+    ((200, 100), irp.OutputRule(300, 300, no_upscale=True), (200, 100)),
+    ((200, 100), irp.OutputRule(400, 400, fit='cover', no_upscale=True), (100, 100)),
+    ((200, 100), irp.OutputRule(300, 300, keep_aspect=False, no_upscale=True), (200, 100)),
+])
+def test_target_size(src, rule, expected):
+    assert irp.target_size(src, rule) == expected
+
+
+def test_pad_centres_the_image_on_the_pad_colour():
+    img = Image.new('RGB', (400, 200), '#FF0000')
+    out = irp.resize_image(img, irp.OutputRule(300, 300, fit='pad', pad_color='#0000FF'))
+    assert out.size == (300, 300)
+    assert out.getpixel((150, 10)) == (0, 0, 255)
+    assert out.getpixel((150, 290)) == (0, 0, 255)
+    assert out.getpixel((150, 150)) == (255, 0, 0)
+
+
+def test_pad_keeps_transparency():
+    img = Image.new('RGBA', (400, 200), (255, 0, 0, 128))
+    out = irp.resize_image(img, irp.OutputRule(300, 300, fit='pad', pad_color='#00000000', format_type='PNG'))
+    assert out.mode == 'RGBA'
+    assert out.getpixel((150, 10))[3] == 0
+
+
+@pytest.fixture
+def detail_on_the_right():
+    # Flat grey except for a busy checkerboard in the right quarter
+    img = Image.new('RGB', (800, 200), '#808080')
+    draw = ImageDraw.Draw(img)
+    for x in range(600, 800, 10):
+        for y in range(0, 200, 10):
+            if (x + y) // 10 % 2:
+                draw.rectangle((x, y, x + 9, y + 9), fill='#000000')
+    return img
+
+
+def test_cover_crops_the_centre(detail_on_the_right):
+    out = irp.resize_image(detail_on_the_right, irp.OutputRule(100, 100, fit='cover'))
+    assert out.size == (100, 100)
+    assert max(out.convert('L').getextrema()) - min(out.convert('L').getextrema()) < 8
+
+
+def test_smart_crop_follows_the_detail(detail_on_the_right):
+    pytest.importorskip("numpy")
+    out = irp.resize_image(detail_on_the_right, irp.OutputRule(100, 100, fit='smart'))
+    assert out.size == (100, 100)
+    low, high = out.convert('L').getextrema()
+    assert high - low > 100
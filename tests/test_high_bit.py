@@ -0,0 +1,119 @@
+# 16-bit encoders: what encode_png16/encode_tiff16 write must read back sample for sample.
+# The readers here follow the file formats directly, so they also cover layouts Pillow can't open.
+import io
+import struct
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import image_resizer_pro as irp
+
+# TIFF field type -> struct format; ASCII (2) and UNDEFINED (7) are kept as bytes
+TIFF_TYPES = {1: 'B', 2: 's', 3: 'H', 4: 'I', 7: 's'}
+
+
+def samples(channels, seed=0):
+    return np.random.default_rng(seed).integers(0, 65536, (9, 13, channels)).astype(np.uint16)
+
+
+def read_png16(data):
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos, idat, header = 8, b'', None
+    while pos < len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        assert struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])[0] == zlib.crc32(kind + body)
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'IDAT':
+            idat += body
+        pos += 12 + length
+    width, height, depth, color_type, _, _, interlace = header
+    assert depth == 16 and interlace == 0
+    channels = {0: 1, 4: 2, 2: 3, 6: 4}[color_type]
+    bpp, stride = 2 * channels, 2 * channels * width
+    raw = zlib.decompress(idat)
+    rows, prior = [], bytearray(stride)
+    for y in range(height):
+        kind, line = raw[y * (stride + 1)], bytearray(raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        for i in range(stride):
+            a = line[i - bpp] if i >= bpp else 0
+            b, c = prior[i], prior[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            paeth = a if abs(p - a) <= abs(p - b) and abs(p - a) <= abs(p - c) else b if abs(p - b) <= abs(p - c) else c
+            line[i] = (line[i] + [0, a, b, (a + b) // 2, paeth][kind]) & 255
+        rows.append(bytes(line))
+        prior = line
+    return np.frombuffer(b''.join(rows), '>u2').reshape(height, width, channels)
+
+
+def read_tiff16(data):
+    assert data[:4] == b'II*\0'
+    (ifd,) = struct.unpack('<I', data[4:8])
+    (count,) = struct.unpack('<H', data[ifd:ifd + 2])
+    tags = {}
+    for n in range(count):
+        tag, kind, number, value = struct.unpack('<HHI4s', data[ifd + 2 + 12 * n:ifd + 14 + 12 * n])
+        size = struct.calcsize(f'<{TIFF_TYPES[kind]}') * number
+        # Values of up to 4 bytes are stored in the entry; anything else is at an offset
+        raw = value[:size] if size <= 4 else data[struct.unpack('<I', value)[0]:][:size]
+        tags[tag] = raw if TIFF_TYPES[kind] == 's' else struct.unpack(f'<{number}{TIFF_TYPES[kind]}', raw)
+    width, height, channels = tags[256][0], tags[257][0], tags[277][0]
+    assert tags[258] == (16,) * channels and tags[259] == (8,)
+    offset, length = tags[273][0], tags[279][0]
+    pixels = np.frombuffer(zlib.decompress(data[offset:offset + length]), '<u2').reshape(height, width, channels)
+    if tags.get(317, (1,)) == (2,):
+        pixels = np.cumsum(pixels, axis=1, dtype=np.uint16)
+    return pixels, tags
+
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_png16_round_trip(channels):
+    expected = samples(channels)
+    data = irp.encode_png16(expected)
+    assert np.array_equal(read_png16(data), expected)
+    assert Image.open(io.BytesIO(data)).size == (13, 9)
+
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_tiff16_round_trip(channels, tmp_path):
+    expected = samples(channels)
+    data = irp.encode_tiff16(expected, b'icc-profile-bytes')
+    pixels, tags = read_tiff16(data)
+    assert np.array_equal(pixels, expected)
+    assert tags[34675] == b'icc-profile-bytes'
+    if channels == 2:
+        return  # Pillow has no 16-bit grey+alpha TIFF mode
+    path = tmp_path / "out.tif"
+    path.write_bytes(data)
+    img = Image.open(path)
+    assert img.size == (13, 9)
+    pixels, scale = irp.high_bit_pixels(str(path), img)
+    assert scale == 65535.0
+    assert np.array_equal(pixels, expected)
+
+
+@pytest.mark.parametrize("channels", [1, 3, 4])
+def test_png16_reads_back_at_full_depth(channels, tmp_path):
+    expected = samples(channels, seed=1)
+    path = tmp_path / "in.png"
+    path.write_bytes(irp.encode_png16(expected))
+    pixels, scale = irp.high_bit_pixels(str(path), Image.open(path))
+    assert np.array_equal(pixels, expected)
+
+
+def test_prefetched_tiff16_renders_like_the_file(tmp_path):
+    # run_batch hands workers an in-memory copy; the full-depth read must not depend on that
+    path = tmp_path / "in.tif"
+    data = irp.encode_tiff16(samples(3))
+    path.write_bytes(data)
+    spec = irp.JobSpec(rules=(irp.OutputRule(7, 5, format_type='PNG', bit_depth=16),
+                              irp.OutputRule(7, 5, format_type='PNG', suffix='_8')))
+    from_file = irp.render_outputs(str(path), spec)
+    prefetched = irp.render_outputs(irp.PrefetchedFile(data, str(path)), spec)
+    assert [bytes(output) for output in prefetched] == [bytes(output) for output in from_file]
+    pixels = read_png16(bytes(prefetched[0]))
+    assert np.any(pixels >> 8 != pixels & 255)  # not 8-bit samples widened to 16
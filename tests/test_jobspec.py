@@ -0,0 +1,54 @@
+# Job specs and recipes: saved and loaded as JSON or TOML, validated when built
+import dataclasses
+import pickle
+
+import pytest
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def spec():
+    return irp.JobSpec(
+        rules=(
+            irp.OutputRule(1280, 720, quality=82, suffix='_1280', fit='cover'),
+            irp.OutputRule(640, 640, format_type='WEBP', suffix='_640', keep_aspect=False, target_ssim=0.98),
+            irp.OutputRule(300, 300, format_type='PNG', suffix='_"q"\\', png_palette=True, pad_color='#102030'),
+            irp.OutputRule(4000, 3000, format_type='TIFF', suffix='_16', bit_depth=16, no_upscale=True),
+        ),
+        preserve_meta=False,
+        output_folder='C:\\Exports\\Ünïcode',
+        fsync='batch',
+        workers=3,
+        watermark_text='© 2026 Studio ✓ 📷\ttab\x7f',
+        watermark_position='center',
+        watermark_opacity=0.35,
+    )
+
+
+@pytest.mark.parametrize("name", ["recipe.json", "recipe.toml", "RECIPE.TOML"])
+def test_recipe_round_trip(spec, tmp_path, name):
+    path = str(tmp_path / name)
+    spec.save(path)
+    assert irp.JobSpec.load(path) == spec
+
+
+def test_specs_are_immutable_and_picklable(spec):
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        spec.workers = 1
+    assert pickle.loads(pickle.dumps(spec)) == spec
+
+
+@pytest.mark.parametrize("data, message", [
+    ({}, "no rules"),
+    ({'rules': []}, "no rules"),
+    ({'rules': [{'width': 10}]}, "Invalid recipe"),
+    ({'rules': [{'width': 10, 'height': 10, 'colour': 'red'}]}, "Invalid recipe"),
+    ({'rules': [{'width': 10, 'height': 10}], 'threads': 4}, "Invalid recipe"),
+    ({'rules': [{'width': 0, 'height': 10}]}, "Output size"),
+    ({'rules': [{'width': 10, 'height': 10}, {'width': 20, 'height': 20}]}, "distinct suffixes"),
+    ({'rules': [{'width': 10, 'height': 10}], 'fsync': 'sometimes'}, "fsync"),
+])
+def test_invalid_recipes_are_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        irp.JobSpec.from_dict(data)
@@ -0,0 +1,62 @@
+# Memory-mapped fast path for uncompressed inputs: the mapped view must be the file's own pages
+import mmap
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def bgr_bmp(tmp_path):
+    # 24-bit BMPs are stored bottom-up in BGR order
+    path = tmp_path / "scan.bmp"
+    irp.synthetic_image((301, 203)).save(path)
+    return str(path)
+
+
+def test_bgr_view_shares_file_memory(bgr_bmp):
+    img = Image.open(bgr_bmp)
+    assert irp.tile_rawmode(img) == 'BGR'
+    pixels, order = irp.map_pixels(bgr_bmp, img)
+    assert order == [2, 1, 0]
+    # No copy anywhere: the view's base chain ends at the file mapping
+    base = pixels
+    while isinstance(base, np.ndarray):
+        assert not base.flags.owndata
+        base = base.base
+    assert isinstance(base, mmap.mmap)
+
+
+@pytest.mark.parametrize("rule", [irp.OutputRule(60, 40), irp.OutputRule(250, 180)])
+def test_mapped_copy_matches_decoder(bgr_bmp, rule):
+    img = Image.open(bgr_bmp)
+    mapped = irp.load_mapped(bgr_bmp, img, (rule,))
+    factor = max(1, irp.prereduce_factor(img.size, (rule,)))
+    expected = Image.open(bgr_bmp).convert('RGB')
+    expected = expected.reduce(factor) if factor > 1 else expected
+    assert mapped.mode == 'RGB'
+    assert np.array_equal(np.asarray(mapped), np.asarray(expected))
+
+
+def test_rgba_bmp_keeps_alpha(tmp_path):
+    path = str(tmp_path / "alpha.bmp")
+    source = irp.synthetic_image((64, 48)).convert('RGBA')
+    source.putalpha(128)
+    source.save(path)
+    img = Image.open(path)
+    if irp.map_pixels(path, img) is None:
+        pytest.skip("Pillow does not store this BMP as a raw block")
+    mapped = irp.load_mapped(path, img, (irp.OutputRule(64, 48),))
+    assert np.array_equal(np.asarray(mapped), np.asarray(Image.open(path)))
+
+
+def test_prefetched_bmp_maps_in_place(bgr_bmp):
+    data = open(bgr_bmp, 'rb').read()
+    prefetched = irp.PrefetchedFile(data, bgr_bmp)
+    pixels, order = irp.map_pixels(prefetched, Image.open(prefetched))
+    expected, _ = irp.map_pixels(bgr_bmp, Image.open(bgr_bmp))
+    assert np.array_equal(pixels, expected)
+    assert not pixels.flags.writeable
@@ -0,0 +1,56 @@
+# Metrics: Prometheus text and JSON snapshots from one thread-safe registry
+import json
+import threading
+import urllib.request
+
+import image_resizer_pro as irp
+
+
+def test_counters_are_safe_across_threads():
+    metrics = irp.Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.inc('irp_images_total', status='ok')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.values[('irp_images_total', (('status', 'ok'),))] == 8000
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = irp.Metrics(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        metrics.observe('irp_image_seconds', value)
+    text = metrics.prometheus()
+    assert '# TYPE irp_image_seconds histogram' in text
+    assert 'irp_image_seconds_bucket{le="0.1"} 1' in text
+    assert 'irp_image_seconds_bucket{le="1.0"} 3' in text
+    assert 'irp_image_seconds_bucket{le="+Inf"} 4' in text
+    assert 'irp_image_seconds_count 4' in text
+    assert 'irp_image_seconds_sum 4.05' in text
+
+
+def test_label_values_are_escaped():
+    metrics = irp.Metrics()
+    metrics.inc('irp_failures_total', stage='render', type='Bad "quote"\\\n')
+    assert 'type="Bad \\"quote\\"\\\\\\n"' in metrics.prometheus()
+
+
+def test_exporter_serves_text_and_leaves_a_final_snapshot(tmp_path):
+    metrics = irp.Metrics()
+    path = tmp_path / "metrics.json"
+    exporter = irp.MetricsExporter(metrics, port=0, path=str(path), interval=60)
+    try:
+        metrics.inc('irp_images_total', 3, status='ok')
+        url = f"http://127.0.0.1:{exporter.server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=30) as response:
+            assert response.headers['Content-Type'] == irp.PROMETHEUS_CONTENT_TYPE
+            assert 'irp_images_total{status="ok"} 3' in response.read().decode()
+    finally:
+        exporter.close()
+    snapshot = json.loads(path.read_text())
+    assert snapshot['metrics']['irp_images_total'] == [{'labels': {'status': 'ok'}, 'value': 3}]
@@ -0,0 +1,58 @@
+# Image modes: transparency flattened for JPEG, palettes resampled in colour, palette PNG output
+import io
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+def render(img, rule):
+    [data] = irp.render_image(img, irp.JobSpec(rules=(rule,)))
+    return Image.open(io.BytesIO(data))
+
+
+def half_transparent(mode='RGBA'):
+    img = Image.new(mode, (100, 100), (255, 0, 0, 255) if mode == 'RGBA' else (200, 255))
+    img.paste((0, 0, 0, 0) if mode == 'RGBA' else (0, 0), (50, 0, 100, 100))
+    return img
+
+
+def test_jpeg_flattens_onto_the_rule_background():
+    out = render(half_transparent(), irp.OutputRule(50, 50, background='#0000FF'))
+    assert out.mode == 'RGB'
+    r, g, b = out.getpixel((45, 25))
+    assert b > 200 and r < 40  # the transparent half is the background, not black
+    r, g, b = out.getpixel((5, 25))
+    assert r > 200 and b < 40
+
+
+def test_grey_with_alpha_stays_grey_in_jpeg():
+    out = render(half_transparent('LA'), irp.OutputRule(50, 50, background='#FFFFFF'))
+    assert out.mode == 'L'
+    assert out.getpixel((45, 25)) > 245 and abs(out.getpixel((5, 25)) - 200) < 6
+
+
+@pytest.mark.parametrize("format_type", ['PNG', 'WEBP'])
+def test_transparency_is_kept_where_the_format_allows(format_type):
+    out = render(half_transparent(), irp.OutputRule(50, 50, format_type=format_type))
+    assert out.mode == 'RGBA'
+    assert out.getpixel((45, 25))[3] == 0 and out.getpixel((5, 25))[3] == 255
+
+
+def test_palette_sources_are_resampled_in_colour():
+    # NEAREST on the palette would leave only the two original colours
+    img = Image.new('RGB', (100, 100), '#000000')
+    img.paste('#FFFFFF', (0, 0, 100, 100), Image.linear_gradient('L').resize((100, 100)).point(
+        lambda v: 255 if v // 8 % 2 else 0))
+    palette = img.quantize(2)
+    out = render(palette, irp.OutputRule(30, 30, format_type='PNG'))
+    assert out.mode == 'RGB'
+    assert len(out.getcolors(1024)) > 2
+
+
+def test_palette_png_output_keeps_alpha():
+    out = render(half_transparent(), irp.OutputRule(50, 50, format_type='PNG', png_palette=True))
+    assert out.mode == 'P'
+    rgba = out.convert('RGBA')
+    assert rgba.getpixel((45, 25))[3] == 0 and rgba.getpixel((5, 25))[:3] == (255, 0, 0)
@@ -0,0 +1,49 @@
+# Atomic output writes: a file is either absent or complete, and no temp file is left behind
+import os
+import stat
+
+import pytest
+
+import image_resizer_pro as irp
+
+
+@pytest.mark.parametrize("fsync", irp.OutputWriter.FSYNC_MODES)
+def test_writes_land_complete_with_the_umask_mode(tmp_path, fsync):
+    writer = irp.OutputWriter(fsync=fsync, fsync_batch=3)
+    futures = [writer.submit(bytes([n]) * 1000, str(tmp_path / f"{n}.jpg")) for n in range(7)]
+    writer.close()
+    assert [future.result() for future in futures] == [str(tmp_path / f"{n}.jpg") for n in range(7)]
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{n}.jpg" for n in range(7))
+    for n in range(7):
+        path = tmp_path / f"{n}.jpg"
+        assert path.read_bytes() == bytes([n]) * 1000
+        if os.name == 'posix':
+            assert stat.S_IMODE(os.stat(path).st_mode) == irp.OUTPUT_FILE_MODE
+
+
+def test_replacing_an_existing_output_is_atomic(tmp_path):
+    path = tmp_path / "photo_resized.jpg"
+    path.write_bytes(b"old")
+    assert irp.OutputWriter().write(b"new", str(path)) == str(path)
+    assert path.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["photo_resized.jpg"]
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    # The target is a directory, so the final rename fails after the data is written
+    (tmp_path / "taken.jpg").mkdir()
+    (tmp_path / "taken.jpg" / "keep").write_bytes(b"")
+    writer = irp.OutputWriter()
+    future = writer.submit(b"data", str(tmp_path / "taken.jpg"))
+    writer.close()
+    with pytest.raises(OSError):
+        future.result()
+    assert os.listdir(tmp_path) == ["taken.jpg"]
+
+
+def test_reserved_paths_never_collide(tmp_path):
+    writer = irp.OutputWriter()
+    paths = [writer.reserve_path(str(tmp_path), "scan", "jpg") for _ in range(3)]
+    assert [os.path.basename(path) for path in paths] == ["scan_resized.jpg", "scan_resized_2.jpg",
+                                                          "scan_resized_3.jpg"]
+    writer.close()
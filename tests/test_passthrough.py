@@ -0,0 +1,63 @@
+# Same-size, same-format outputs are copied from the source only when a render would match them
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+def drop_for(path, rule, **options):
+    return irp.passthrough_drop(Image.open(path), rule, irp.JobSpec(rules=(rule,), **options))
+
+
+@pytest.fixture
+def rgb_png(tmp_path):
+    path = tmp_path / "rgb.png"
+    irp.synthetic_image((64, 48)).save(path)
+    return path
+
+
+def test_same_size_png_is_copied(rgb_png):
+    assert drop_for(rgb_png, irp.OutputRule(64, 48, format_type='PNG')) is not None
+
+
+@pytest.mark.parametrize("rule", [
+    irp.OutputRule(32, 24, format_type='PNG'),
+    irp.OutputRule(64, 48, format_type='WEBP'),
+    irp.OutputRule(64, 48, format_type='PNG', png_palette=True),
+    irp.OutputRule(64, 48, format_type='PNG', bit_depth=16),
+])
+def test_rendered_when_the_rule_changes_the_file(rgb_png, rule):
+    assert drop_for(rgb_png, rule) is None
+
+
+def test_watermark_forces_a_render(rgb_png):
+    rule = irp.OutputRule(64, 48, format_type='PNG')
+    assert drop_for(rgb_png, rule, watermark_text="proof") is None
+
+
+def test_16_bit_source_is_not_copied_into_an_8_bit_rule(tmp_path):
+    path = tmp_path / "deep.png"
+    samples = np.random.default_rng(0).integers(0, 65536, (48, 64, 3), dtype=np.uint16)
+    path.write_bytes(irp.encode_png16(samples))
+    rule = irp.OutputRule(64, 48, format_type='PNG')
+    assert drop_for(path, rule) is None
+    spec = irp.JobSpec(rules=(rule,))
+    [output] = irp.render_outputs(str(path), spec)
+    assert not isinstance(output, irp.PassThrough)
+    assert Image.open(irp.io.BytesIO(output)).mode == 'RGB'
+
+
+@pytest.mark.parametrize("palette", [False, True])
+def test_palette_png_is_copied_only_for_palette_rules(tmp_path, palette):
+    path = tmp_path / "indexed.png"
+    irp.synthetic_image((64, 48)).quantize(64).save(path)
+    drop = drop_for(path, irp.OutputRule(64, 48, format_type='PNG', png_palette=palette))
+    assert (drop is not None) == palette
+
+
+def test_cmyk_tiff_is_rendered_to_rgb(tmp_path):
+    path = tmp_path / "print.tif"
+    irp.synthetic_image((64, 48)).convert('CMYK').save(path)
+    assert drop_for(path, irp.OutputRule(64, 48, format_type='TIFF')) is None
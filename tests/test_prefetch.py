@@ -0,0 +1,45 @@
+# Batch read-ahead: every reservation must be handed back, or later files are never prefetched
+import pytest
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for name, size in [("a.jpg", 300), ("b.jpg", 200), ("c.jpg", 100)]:
+        path = tmp_path / name
+        path.write_bytes(bytes([len(paths)]) * size)
+        paths.append(str(path))
+    return paths
+
+
+def drain(prefetcher, count):
+    sources = []
+    for index in range(count):
+        source = prefetcher.take(index)
+        sources.append(source)
+        prefetcher.release(source)
+    prefetcher.close()
+    return sources
+
+
+def test_duplicate_inputs_each_get_their_bytes(files):
+    paths = [files[0], files[1], files[0], files[0], files[2]]
+    prefetcher = irp.Prefetcher(paths, budget=4000, depth=2)
+    sources = drain(prefetcher, len(paths))
+    assert all(isinstance(source, irp.PrefetchedFile) for source in sources)
+    assert [source.name for source in sources] == paths
+    assert [source.getvalue() for source in sources] == [open(path, 'rb').read() for path in paths]
+    assert prefetcher.used == 0
+
+
+def test_budget_is_returned_when_jobs_overtake_the_read_ahead(files):
+    # 300 bytes is over a quarter of the budget, so a.jpg is only hinted; taking jobs faster than
+    # the queue fills must not leave reads behind that nobody claims
+    paths = files + files
+    prefetcher = irp.Prefetcher(paths, budget=1000, depth=1)
+    sources = drain(prefetcher, len(paths))
+    assert [getattr(source, 'name', source) for source in sources] == paths
+    assert prefetcher.used == 0
+    assert not prefetcher.futures
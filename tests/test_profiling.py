@@ -0,0 +1,53 @@
+# Batch profiling: per-image CPU and allocation stats from the workers, merged into one report
+import os
+import pstats
+import tracemalloc
+
+import pytest
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    irp.synthetic_image((160, 120)).save(path)
+    return str(path)
+
+
+def spec(tmp_path):
+    return irp.JobSpec(rules=(irp.OutputRule(40, 30),), output_folder=str(tmp_path / "out"))
+
+
+def test_both_modes_merge_into_one_report(photo, tmp_path):
+    profile = irp.BatchProfile('both', str(tmp_path / "profiles"), top=5)
+    for _ in range(2):
+        outputs, cpu, memory = irp.profiled_render(photo, spec(tmp_path), 'both')
+        assert len(outputs) == 1
+        profile.add(photo, cpu, memory)
+    lines = profile.report()
+    assert lines[0] == "Profile: 2 images profiled (both)"
+    [saved] = os.listdir(tmp_path / "profiles")
+    assert any('render_outputs' in pstats.func_std_string(func)
+               for func in pstats.Stats(str(tmp_path / "profiles" / saved)).stats)
+    assert any(line.startswith("Profile: peak traced Python memory") for line in lines)
+    assert not tracemalloc.is_tracing()
+
+
+def test_cpu_only_has_no_memory_section(photo, tmp_path):
+    outputs, cpu, memory = irp.profiled_render(photo, spec(tmp_path), 'cpu')
+    assert cpu is not None and memory is None
+
+
+def test_failed_render_stops_tracing(tmp_path):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    with pytest.raises(OSError):
+        irp.profiled_render(str(broken), spec(tmp_path), 'memory')
+    assert not tracemalloc.is_tracing()
+
+
+def test_headless_run_prints_the_report(photo, tmp_path, caplog):
+    profile = irp.BatchProfile('cpu', str(tmp_path / "profiles"))
+    assert irp.run_headless(spec(tmp_path), [photo], profile) == 0
+    assert any("Profile: 1 images profiled (cpu)" in record.getMessage() for record in caplog.records)
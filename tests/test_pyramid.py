@@ -0,0 +1,47 @@
+# Deep-zoom tile pyramids: level layout, XYZ edge padding and the tile formats on offer
+import os
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def scan(tmp_path):
+    path = tmp_path / "scan.png"
+    irp.synthetic_image((600, 300)).save(path)
+    return str(path)
+
+
+def test_dzi_levels_and_manifest(scan, tmp_path):
+    out = tmp_path / "dzi"
+    result = irp.build_pyramid(scan, str(out), skip_blank=False, workers=2)
+    # 600x300 halves down to 1x1: levels 0-10, level 10 being the full image
+    assert result['levels'] == len(irp.pyramid_sizes((600, 300))) == 11
+    assert sorted(os.listdir(out / "scan_files" / "10")) == ['0_0.jpg', '0_1.jpg', '1_0.jpg', '1_1.jpg',
+                                                            '2_0.jpg', '2_1.jpg']
+    assert Image.open(out / "scan_files" / "10" / "2_1.jpg").size == (600 - 512, 300 - 256)
+    manifest = (out / "scan.dzi").read_text()
+    assert 'Format="jpg"' in manifest and '<Size Width="600" Height="300"/>' in manifest
+
+
+def test_xyz_edge_tiles_are_full_size(scan, tmp_path):
+    out = tmp_path / "xyz"
+    irp.build_pyramid(scan, str(out), format_type='PNG', layout='xyz', skip_blank=False, workers=2)
+    tiles = [os.path.join(folder, name) for folder, _, names in os.walk(out) for name in names]
+    assert tiles
+    assert {Image.open(tile).size for tile in tiles} == {(256, 256)}
+    assert sorted(os.listdir(out / "scan")) == ['0', '1', '2']
+
+
+def test_tiff_tiles_are_refused(scan, tmp_path):
+    with pytest.raises(ValueError, match="JPEG, PNG or WEBP"):
+        irp.build_pyramid(scan, str(tmp_path), format_type='TIFF')
+
+
+def test_repeated_runs_add_one_log_handler(scan, tmp_path):
+    for run in range(3):
+        assert irp.run_pyramids([scan], str(tmp_path / str(run)), None) == 0
+    handlers = irp.logging.getLogger("image_resizer_pro").handlers
+    assert sum(type(handler) is irp.logging.StreamHandler for handler in handlers) == 1
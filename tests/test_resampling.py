@@ -0,0 +1,93 @@
+# Resampling regression tests: exact output sizes, and every backend against stored golden renders.
+# Regenerate the golden files after an intended change with: PYTHONPATH=. python tests/test_resampling.py
+import hashlib
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import image_resizer_pro as irp
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+MANIFEST = os.path.join(GOLDEN_DIR, "manifest.json")
+
+# Smaller versions of irp.QUALITY_CASES, so the stored renders stay small
+GOLDEN_CASES = {
+    'downscale': ((480, 360), irp.OutputRule(160, 120)),
+    'odd-ratio': ((409, 307), irp.OutputRule(133, 133)),
+    'upscale': ((80, 60), irp.OutputRule(200, 200)),
+    'cover': ((480, 360), irp.OutputRule(120, 120, fit='cover')),
+    'stretch': ((360, 360), irp.OutputRule(256, 80, keep_aspect=False)),
+}
+
+
+def digest(pixels):
+    return hashlib.sha256(np.ascontiguousarray(pixels).tobytes()).hexdigest()
+
+
+def load_manifest():
+    with open(MANIFEST, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def golden(name):
+    src_size, rule = GOLDEN_CASES[name]
+    entry = load_manifest()[name]
+    source = irp.synthetic_image(src_size)
+    if digest(np.asarray(source)) != entry['source']:
+        pytest.skip("synthetic source changed (numpy RNG stream?); regenerate the golden files")
+    with Image.open(os.path.join(GOLDEN_DIR, entry['file'])) as img:
+        reference = np.asarray(img.convert('RGB'), dtype=np.float64)
+    assert digest(reference.astype(np.uint8)) == entry['golden'], f"{entry['file']} was modified"
+    return source, rule, reference
+
+
+@pytest.mark.parametrize("src_size, rule, expected", irp.SIZE_CASES,
+                         ids=[f"{s[0]}x{s[1]}-{r.width}x{r.height}-{r.fit}" for s, r, _ in irp.SIZE_CASES])
+def test_output_size(src_size, rule, expected):
+    assert irp.resize_image(Image.new('RGB', src_size), rule).size == expected
+
+
+@pytest.mark.parametrize("path_name", sorted(irp.resampling_paths()))
+@pytest.mark.parametrize("case_name", sorted(GOLDEN_CASES))
+def test_matches_golden(case_name, path_name):
+    source, rule, reference = golden(case_name)
+    out = np.asarray(irp.resampling_paths()[path_name](source, rule).convert('RGB'), dtype=np.float64)
+    assert out.shape == reference.shape
+    assert irp.psnr(out, reference) >= irp.PSNR_THRESHOLD
+    assert irp.ssim(irp.luminance(out), irp.luminance(reference)) >= irp.SSIM_THRESHOLD
+
+
+def test_golden_matches_float_reference():
+    # The stored renders are the float reference rounded to 8 bits; drift here means the reference moved
+    for case_name, (src_size, rule) in GOLDEN_CASES.items():
+        _, _, stored = golden(case_name)
+        _, reference = irp.reference_case(src_size, rule)
+        assert irp.psnr(stored, reference) >= 50.0, case_name
+
+
+def test_verify_resampling():
+    lines, failures = irp.verify_resampling()
+    assert not failures, "\n".join(failures)
+
+
+def write_golden():
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    manifest = {}
+    for name, (src_size, rule) in GOLDEN_CASES.items():
+        source, reference = irp.reference_case(src_size, rule)
+        pixels = np.clip(reference, 0, 255).round().astype(np.uint8)
+        file_name = f"{name}.png"
+        Image.fromarray(pixels, 'RGB').save(os.path.join(GOLDEN_DIR, file_name), optimize=True)
+        manifest[name] = {'file': file_name, 'source': digest(np.asarray(source)), 'golden': digest(pixels)}
+    with open(MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    write_golden()
+    print(f"Wrote {len(GOLDEN_CASES)} golden renders to {GOLDEN_DIR}")
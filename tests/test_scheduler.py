@@ -0,0 +1,39 @@
+# Shared job slots: previews and single resizes go ahead of batch images, batches fill their cap
+import threading
+import time
+
+import image_resizer_pro as irp
+
+
+def test_batch_fills_its_own_in_flight_cap():
+    scheduler = irp.JobScheduler(slots=2)
+    with scheduler.batch(6):
+        for _ in range(6):
+            scheduler.acquire(irp.PRIORITY_BATCH)  # would block at 2 without the batch's cap
+        assert scheduler.busy == 6
+        for _ in range(6):
+            scheduler.release()
+    assert scheduler.capacity() == 2
+
+
+def test_waiting_preview_takes_the_next_free_slot():
+    scheduler = irp.JobScheduler(slots=1)
+    scheduler.acquire(irp.PRIORITY_BATCH)
+    order = []
+
+    def job(priority, name):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    batch = threading.Thread(target=job, args=(irp.PRIORITY_BATCH, 'batch'))
+    batch.start()
+    while not scheduler.waiting:
+        time.sleep(0.01)
+    preview = threading.Thread(target=job, args=(irp.PRIORITY_PREVIEW, 'preview'))
+    preview.start()
+    while len(scheduler.waiting) < 2:
+        time.sleep(0.01)
+    scheduler.release()
+    batch.join(10)
+    preview.join(10)
+    assert order == ['preview', 'batch']
@@ -0,0 +1,64 @@
+# Local resize service and coordinator: request validation, error replies and bind checks
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    root = tmp_path_factory.mktemp("root")
+    irp.synthetic_image((400, 200)).save(root / "wide.png")
+    (root / "broken.jpg").write_bytes(b"\xff\xd8 not really a JPEG")
+    service = irp.ResizeService(str(root), str(tmp_path_factory.mktemp("cache")), workers=1)
+    handler = type('Handler', (irp.ResizeRequestHandler,), {'service': service})
+    server = irp.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield service, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def fetch(base, path):
+    try:
+        with urllib.request.urlopen(base + path, timeout=60) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_missing_side_follows_the_source_aspect(service):
+    status, data = fetch(service[1], "/img/wide.png?w=100&fmt=png")
+    assert status == 200
+    assert Image.open(irp.io.BytesIO(data)).size == (100, 50)
+
+
+@pytest.mark.parametrize("query", ["w=abc", "fmt=bmp", "w=30000", "h=15000"])
+def test_bad_requests_get_400(service, query):
+    # h=15000 derives a 30000 px width, which is over the limit too
+    assert fetch(service[1], f"/img/wide.png?{query}")[0] == 400
+
+
+def test_render_errors_do_not_leak_details(service, caplog):
+    status, body = fetch(service[1], "/img/broken.jpg?w=50&h=50")
+    assert status == 500
+    assert b"Could not render this image" in body
+    assert service[0].root.encode() not in body and b"broken.jpg" not in body
+    assert any("broken.jpg" in record.getMessage() for record in caplog.records)
+
+
+@pytest.mark.parametrize("bind", ["0.0.0.0", "", "192.0.2.1", "example.org"])
+def test_coordinator_needs_a_token_beyond_loopback(tmp_path, bind):
+    spec = irp.JobSpec(rules=(irp.OutputRule(10, 10),), output_folder=str(tmp_path))
+    with pytest.raises(ValueError, match="--token"):
+        irp.run_coordinator(spec, [str(tmp_path)], port=0, bind=bind)
+
+
+@pytest.mark.parametrize("bind", ["127.0.0.1", "::1", "localhost"])
+def test_loopback_binds_need_no_token(bind):
+    assert irp.is_loopback(bind)
@@ -0,0 +1,22 @@
+# GUI startup: the window paints before icons, hidden tabs, themes and translations are built
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt6.QtWidgets")
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image_resizer_pro.py")
+
+
+def test_first_paint_comes_before_deferred_startup(tmp_path):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', HOME=str(tmp_path), XDG_CONFIG_HOME=str(tmp_path),
+               XDG_DATA_HOME=str(tmp_path))
+    result = subprocess.run([sys.executable, SCRIPT, "--startup-profile"], env=env, capture_output=True,
+                            text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    marks = [line.split()[0] for line in result.stdout.splitlines() if line.strip()]
+    for mark in ("QApplication", "main", "first", "deferred"):
+        assert mark in marks
+    assert marks.index("first") < marks.index("deferred")
@@ -0,0 +1,60 @@
+# Watermarks: placement, opacity, transparency and the per-size overlay cache
+import pytest
+from PIL import Image
+
+import image_resizer_pro as irp
+
+
+@pytest.fixture
+def logo(tmp_path):
+    path = tmp_path / "logo.png"
+    Image.new('RGBA', (40, 20), (255, 0, 0, 255)).save(path)
+    return str(path)
+
+
+def spec(**options):
+    return irp.JobSpec(rules=(irp.OutputRule(200, 100),), **options)
+
+
+@pytest.mark.parametrize("position, box", [
+    # 40x20 logo, margin 2 (a fiftieth of the shorter side)
+    ('bottom-right', (158, 78)), ('bottom-left', (2, 78)), ('top-right', (158, 2)), ('top-left', (2, 2)),
+    ('center', (80, 40)),
+])
+def test_logo_sits_where_requested(logo, position, box):
+    job = spec(watermark=logo, watermark_position=position, watermark_opacity=1.0, watermark_scale=0.2)
+    colour, mask, placed = irp.watermark_overlay(job, (200, 100), 'RGB')
+    assert colour.size == (40, 20) and placed == box
+    out = irp.apply_watermark(Image.new('RGB', (200, 100), '#FFFFFF'), job)
+    x, y = box
+    assert out.getpixel((x, y)) == out.getpixel((x + 39, y + 19)) == (255, 0, 0)
+    assert out.getpixel((x - 1, y)) == out.getpixel((x + 40, y + 20)) == (255, 255, 255)
+
+
+def test_opacity_blends_with_the_image(logo):
+    job = spec(watermark=logo, watermark_position='center', watermark_opacity=0.5)
+    out = irp.apply_watermark(Image.new('RGB', (200, 100), '#FFFFFF'), job)
+    r, g, b = out.getpixel((100, 50))
+    assert r == 255 and 120 <= g <= 135 and g == b
+
+
+def test_transparent_outputs_gain_coverage(logo):
+    job = spec(watermark=logo, watermark_position='center', watermark_opacity=1.0)
+    out = irp.apply_watermark(Image.new('RGBA', (200, 100), (0, 0, 0, 0)), job)
+    assert out.getpixel((100, 50)) == (255, 0, 0, 255)
+    assert out.getpixel((5, 5))[3] == 0
+
+
+def test_text_watermark_fits_small_outputs():
+    job = spec(watermark_text="© A rather long studio name", watermark_scale=1.0)
+    colour, mask, (x, y) = irp.watermark_overlay(job, (60, 40), 'RGB')
+    assert 0 <= x and x + colour.width <= 60 and 0 <= y and y + colour.height <= 40
+    assert mask.getextrema()[1] > 0
+
+
+def test_overlays_are_cached_per_size_and_mode(logo):
+    job = spec(watermark=logo)
+    first = irp.watermark_overlay(job, (200, 100), 'RGB')
+    assert irp.watermark_overlay(job, (200, 100), 'RGB') is first
+    assert irp.watermark_overlay(job, (200, 100), 'L') is not first
+    assert irp.watermark_overlay(job, (300, 100), 'RGB') is not first